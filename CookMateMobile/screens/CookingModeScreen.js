@@ -1,9 +1,9 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { View, Text, TouchableOpacity, StyleSheet, ActivityIndicator, Alert, ScrollView } from 'react-native';
 import { Ionicons } from '@expo/vector-icons';
 import * as Speech from 'expo-speech'; 
 import * as ImagePicker from 'expo-image-picker'; // 🚨 Added back
-import { cookmateAPI } from '../services/api';
+import { cookmateAPI, newIdempotencyKey } from '../services/api';
 
 const COLORS = { 
   primary: '#1A1A1A', 
@@ -14,9 +14,18 @@ const COLORS = {
   danger: '#EF4444'
 };
 
+// "200g Paneer", "1 tbsp Oil": amount first, so the backend deducts it locally without a model call
+const consumedLine = (item) => {
+  if (!item || typeof item !== 'object') return String(item);
+  const amount = item.qty || [item.quantity, item.unit].filter(Boolean).join(' ');
+  return amount ? `${amount} ${item.name}` : item.name;
+};
+
 const CookingModeScreen = ({ navigation, route }) => {
   const { sessionData, userId, recipeSteps, recipeIngredients } = route.params || {};
   const sessionId = sessionData?.session_id || 1;
+  // One key per session: ending it twice (retry, double tap) doesn't award XP twice
+  const endKey = useRef(newIdempotencyKey());
 
   const [stepIndex, setStepIndex] = useState(0);
   const [isVoiceEnabled, setIsVoiceEnabled] = useState(true); 
@@ -116,8 +125,8 @@ const CookingModeScreen = ({ navigation, route }) => {
   const submitSession = async (rating, leftovers) => {
     setLoading(true);
     try {
-      const consumed = recipeIngredients ? recipeIngredients.map(i => (typeof i === 'object' ? i.name : i)) : [];
-      const res = await cookmateAPI.endSession(sessionId, rating, leftovers, consumed);
+      const consumed = recipeIngredients ? recipeIngredients.map(consumedLine) : [];
+      const res = await cookmateAPI.endSession(sessionId, rating, leftovers, consumed, endKey.current);
       navigation.navigate('Home', { userId });
     } catch (error) {
       navigation.navigate('Home', { userId });
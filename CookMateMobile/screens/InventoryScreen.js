@@ -2,7 +2,7 @@ import React, { useState, useCallback } from 'react';
 import { View, Text, FlatList, TouchableOpacity, Modal, TextInput, StyleSheet, ScrollView, Alert, ActivityIndicator } from 'react-native';
 import { Ionicons } from '@expo/vector-icons';
 import { useFocusEffect } from '@react-navigation/native';
-import { cookmateAPI } from '../services/api';
+import { cookmateAPI, newIdempotencyKey } from '../services/api';
 import BottomTabs from '../components/BottomTabs'; // <--- NEW BAR
 
 const COLORS = { primary: '#2D4F38', background: '#F7F3E8', white: '#FFFFFF', accent: '#D4A056', text: '#1F2937' };
@@ -25,6 +25,8 @@ const InventoryScreen = ({ navigation, route }) => {
   const [loading, setLoading] = useState(false);
   const [modalVisible, setModalVisible] = useState(false);
   const [selectedItems, setSelectedItems] = useState({});
+  // Pressing "Add" again with the same selection (e.g. after a timeout) reuses its key
+  const [addKey, setAddKey] = useState(newIdempotencyKey);
 
   // 🔄 AUTO-REFRESH: Fetches fresh data every time you look at the screen
   useFocusEffect(
@@ -48,6 +50,7 @@ const InventoryScreen = ({ navigation, route }) => {
 
   // --- MANUAL ADD LOGIC ---
   const toggleSelection = (name) => {
+    setAddKey(newIdempotencyKey());
     setSelectedItems(prev => {
       const newState = { ...prev };
       if (newState[name]) delete newState[name];
@@ -57,6 +60,7 @@ const InventoryScreen = ({ navigation, route }) => {
   };
 
   const updateQuantity = (name, qty) => {
+    setAddKey(newIdempotencyKey());
     setSelectedItems(prev => ({ ...prev, [name]: qty }));
   };
 
@@ -88,11 +92,12 @@ const InventoryScreen = ({ navigation, route }) => {
 
     try {
       console.log("Sending Manual Items:", itemsToSend);
-      await cookmateAPI.addInventoryItems(userId, itemsToSend);
+      await cookmateAPI.addInventoryItems(userId, itemsToSend, addKey);
       
       Alert.alert("Success", "Items added to pantry!");
       setModalVisible(false);
       setSelectedItems({});
+      setAddKey(newIdempotencyKey());
       fetchInventory(); // 🔄 Instant Refresh
     } catch (error) {
       console.error(error);
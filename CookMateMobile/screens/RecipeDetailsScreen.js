@@ -62,6 +62,10 @@ const RecipeDetailsScreen = ({ navigation, route }) => {
 
   // Get the cleaned steps once
   const finalSteps = getCleanSteps();
+  // duration_seconds per step (0 = unknown), only when it lines up with finalSteps
+  const stepDurations = Array.isArray(recipe.steps) && recipe.steps.length === finalSteps.length
+    ? recipe.steps.map(s => (s && typeof s === 'object' && s.duration_seconds) || 0)
+    : [];
 
   const handleStartCooking = async () => {
     setLoading(true);
@@ -69,12 +73,13 @@ const RecipeDetailsScreen = ({ navigation, route }) => {
       console.log("🚀 Starting Session with steps:", finalSteps);
       
       // Send the CLEAN strings to the backend and cooking mode
-      const response = await cookmateAPI.startSession(userId, recipe.title || "Recipe", finalSteps);
+      const response = await cookmateAPI.startSession(userId, recipe.title || "Recipe", finalSteps, recipe.id || null, stepDurations);
       
       navigation.navigate('CookingMode', { 
         sessionData: response, 
         userId: userId, 
-        recipeSteps: finalSteps 
+        recipeSteps: finalSteps,
+        recipeIngredients: Array.isArray(recipe.ingredients) ? recipe.ingredients : []
       });
     } catch (error) {
       console.error(error);
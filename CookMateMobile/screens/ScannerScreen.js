@@ -2,13 +2,15 @@ import React, { useState } from 'react';
 import { View, Text, Image, TouchableOpacity, Alert, ActivityIndicator, StyleSheet } from 'react-native';
 import * as ImagePicker from 'expo-image-picker';
 import { Ionicons } from '@expo/vector-icons';
-import { cookmateAPI } from '../services/api';
+import { cookmateAPI, newIdempotencyKey } from '../services/api';
 
 const COLORS = { primary: '#2D4F38', background: '#F7F3E8', white: '#FFFFFF', accent: '#D4A056', textSecondary: '#6B7280' };
 
 const ScannerScreen = ({ navigation, route }) => {
   const userId = route.params?.userId || 1;
   const [image, setImage] = useState(null);
+  // Re-uploading the same picked image (e.g. after a timeout) reuses its key
+  const [uploadKey, setUploadKey] = useState(null);
   const [loading, setLoading] = useState(false);
 
   const pickImage = async () => {
@@ -23,6 +25,7 @@ const ScannerScreen = ({ navigation, route }) => {
 
       if (!result.canceled) {
         setImage(result.assets[0].uri);
+        setUploadKey(newIdempotencyKey());
       }
     } catch (error) {
       console.error(error);
@@ -37,7 +40,7 @@ const ScannerScreen = ({ navigation, route }) => {
       console.log(`Uploading bill for User ${userId}...`);
       
       // Call the API (which uses the new 'fetch' fix)
-      const response = await cookmateAPI.scanBill(userId, image);
+      const response = await cookmateAPI.scanBill(userId, image, uploadKey);
       
       Alert.alert(
         "Success! 🥬", 
@@ -2,7 +2,7 @@ import React, { useState, useCallback } from 'react';
 import { View, Text, FlatList, TouchableOpacity, StyleSheet, ActivityIndicator, Alert } from 'react-native';
 import { Ionicons } from '@expo/vector-icons';
 import { useFocusEffect } from '@react-navigation/native';
-import { cookmateAPI } from '../services/api';
+import { cookmateAPI, newIdempotencyKey } from '../services/api';
 import BottomTabs from '../components/BottomTabs';
 
 const COLORS = { primary: '#2D4F38', background: '#F7F3E8', white: '#FFFFFF', accent: '#D4A056', text: '#1F2937', success: '#22C55E' };
@@ -11,6 +11,8 @@ const ShoppingListScreen = ({ navigation, route }) => {
   const userId = route.params?.userId || 1;
   const [list, setList] = useState([]);
   const [selectedItems, setSelectedItems] = useState({}); // Tracks checked items
+  // Retrying the same restock (e.g. after a timeout) reuses its key; a new selection gets a new one
+  const [restockKey, setRestockKey] = useState(newIdempotencyKey);
   const [loading, setLoading] = useState(false);
   const [purchasing, setPurchasing] = useState(false);
 
@@ -26,6 +28,7 @@ const ShoppingListScreen = ({ navigation, route }) => {
       const data = await cookmateAPI.getShoppingList(userId);
       setList(data.shopping_list || []);
       setSelectedItems({}); // Reset selection
+      setRestockKey(newIdempotencyKey());
     } catch (error) {
       console.error(error);
       Alert.alert("Error", "Could not generate list.");
@@ -35,6 +38,7 @@ const ShoppingListScreen = ({ navigation, route }) => {
   };
 
   const toggleSelection = (item) => {
+    setRestockKey(newIdempotencyKey());
     setSelectedItems(prev => {
       const newState = { ...prev };
       if (newState[item.name]) {
@@ -70,7 +74,7 @@ const ShoppingListScreen = ({ navigation, route }) => {
       console.log("Restocking:", payload);
 
       // 2. Call the "Add Manual" API
-      await cookmateAPI.addInventoryItems(userId, payload);
+      await cookmateAPI.addInventoryItems(userId, payload, restockKey);
 
       Alert.alert(
         "Pantry Restocked! 🥬", 
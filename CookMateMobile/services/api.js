@@ -5,12 +5,19 @@ import axios from 'axios';
 // --------------------------------------------------------
 const API_URL = 'http://192.168.5.71:8000'; 
 
+const REQUEST_TIMEOUT_MS = 15000;
+
 const api = axios.create({
   baseURL: API_URL,
-  headers: { 'Content-Type': 'application/json' },
-  timeout: 15000, 
+  // The server budgets its upstream calls against the same deadline
+  headers: { 'Content-Type': 'application/json', 'X-Request-Timeout-Ms': String(REQUEST_TIMEOUT_MS) },
+  timeout: REQUEST_TIMEOUT_MS,
 });
 
+// One key per user action. Sending it again (retry after a timeout, double tap)
+// gets the first response back instead of scanning / adding / awarding XP twice.
+export const newIdempotencyKey = () => `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+
 export const cookmateAPI = {
   // 1. Health Check
   healthCheck: async () => {
@@ -36,7 +43,7 @@ export const cookmateAPI = {
   },
 
   // 2. Upload Bill Image
-  scanBill: async (userId, imageUri) => {
+  scanBill: async (userId, imageUri, idempotencyKey = newIdempotencyKey()) => {
     const formData = new FormData();
     const uri = imageUri.startsWith('file://') ? imageUri : `file://${imageUri}`;
     
@@ -47,7 +54,7 @@ export const cookmateAPI = {
       const response = await fetch(`${API_URL}/inventory/scan-bill`, {
         method: 'POST',
         body: formData,
-        headers: { 'Accept': 'application/json' },
+        headers: { 'Accept': 'application/json', 'Idempotency-Key': idempotencyKey },
       });
       const json = await response.json();
       if (!response.ok) throw new Error(JSON.stringify(json));
@@ -59,12 +66,16 @@ export const cookmateAPI = {
   },
 
   // 3. Start Cooking Session
-  startSession: async (userId, recipeName, recipeSteps) => {
+  startSession: async (userId, recipeName, recipeSteps, recipeId = null, stepDurations = []) => {
     console.log(`Starting session for: ${recipeName}`);
     const response = await api.post('/mentor/start', {
       user_id: parseInt(userId),
       recipe_title: recipeName,
-      steps: recipeSteps || ["Just cook it!"] 
+      // A saved recipe's steps (and durations) are loaded server-side from recipe_id
+      steps: recipeId ? [] : (recipeSteps || ["Just cook it!"]),
+      recipe_id: recipeId,
+      // Server-side step timers (GET /mentor/{id}/events) keep running while the app is backgrounded
+      step_durations: stepDurations
     });
     return response.data;
   },
@@ -96,14 +107,32 @@ export const cookmateAPI = {
 
   // 6. Get Current Inventory
   getInventory: async (userId) => {
-    const response = await api.get(`/inventory/${userId}`);
+    // Server pages with next_cursor; walk the pages so screens still get one array
+    let items = [];
+    let cursor = null;
+    do {
+      const response = await api.get(`/inventory/${userId}`, {
+        params: cursor !== null ? { cursor } : {}
+      });
+      items = items.concat(response.data.items);
+      cursor = response.data.next_cursor;
+    } while (cursor !== null && cursor !== undefined);
+    return items;
+  },
+
+  // 6.5 Cooking History (newest first, one page at a time)
+  getSessionHistory: async (userId, cursor = null) => {
+    const response = await api.get(`/users/${userId}/sessions`, {
+      params: cursor !== null ? { cursor } : {}
+    });
     return response.data;
   },
 
   // 7. Manual Add
-  addInventoryItems: async (userId, items) => {
+  addInventoryItems: async (userId, items, idempotencyKey = newIdempotencyKey()) => {
     const response = await api.post('/inventory/add', items, {
-      params: { user_id: parseInt(userId) } 
+      params: { user_id: parseInt(userId) },
+      headers: { 'Idempotency-Key': idempotencyKey }
     });
     return response.data;
   },
@@ -137,13 +166,13 @@ export const cookmateAPI = {
   },
 
   // 11. End Session (XP + Inventory Update)
-  endSession: async (sessionId, rating, leftovers, ingredientsConsumed) => {
+  endSession: async (sessionId, rating, leftovers, ingredientsConsumed, idempotencyKey = newIdempotencyKey()) => {
     const response = await api.post('/mentor/end', {
       session_id: parseInt(sessionId),
       rating: rating || 5,
       leftovers: leftovers || false,
       ingredients_consumed: ingredientsConsumed || []
-    });
+    }, { headers: { 'Idempotency-Key': idempotencyKey } });
     return response.data;
   },
   
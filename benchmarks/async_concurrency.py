@@ -0,0 +1,115 @@
+"""
+The async routes (AsyncSession, model call in a worker thread) against sync twins of
+the same work on the threadpool (sync Session, model call inline), as every route
+was before the async engine. The model call is stubbed with a fixed sleep.
+
+A burst of N /recipes/generate plus N /users/stats is sent at once. The gain to look
+for is that cheap reads don't queue behind slow model calls for a threadpool slot.
+
+    python benchmarks/async_concurrency.py [--model-ms 1000] [--burst 50 150]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from common import quiet, use_scratch_database
+
+use_scratch_database("async")
+
+import httpx
+from fastapi import Depends, HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import main
+import models
+from database import SessionLocal, get_db
+from services import ai_chef
+
+main.speculative.pregenerate = lambda user_id: None
+
+
+@main.app.get("/bench/sync/users/stats/{user_id}")
+def sync_stats(user_id: int, db: Session = Depends(get_db)):
+    user = db.get(models.UserDB, user_id)
+    if not user: raise HTTPException(status_code=404, detail="User not found")
+    total = db.query(func.count(models.CookingSessionDB.id)).filter(models.CookingSessionDB.user_id == user_id).scalar()
+    fav = (db.query(models.CookingSessionDB.recipe_title, func.count(models.CookingSessionDB.recipe_title))
+           .filter(models.CookingSessionDB.user_id == user_id).group_by(models.CookingSessionDB.recipe_title)
+           .order_by(func.count(models.CookingSessionDB.recipe_title).desc()).first())
+    return {"xp": user.xp_points, "streak": user.current_streak, "most_cooked_recipe": fav[0] if fav else None, "total_sessions": total}
+
+
+@main.app.post("/bench/sync/recipes/generate")
+def sync_generate(req: main.schemas.RecipeRequest, db: Session = Depends(get_db)):
+    user = db.get(models.UserDB, req.user_id)
+    if not user: raise HTTPException(status_code=404, detail="User not found")
+    pantry = [{"name": i.name, "quantity": i.quantity, "category": i.category, "expiry_date": i.expiry_date}
+              for i in db.query(models.InventoryDB).filter(models.InventoryDB.user_id == req.user_id)]
+    recipe = ai_chef.ask_chef_json(ingredients=pantry, expiring_items=[], preferences=user.dietary_preferences,
+                                   dietary_goal=user.health_goal, allergies=user.allergies, meal_type=req.meal_type,
+                                   portion_multiplier=user.portion_multiplier, effort_level=req.effort_level,
+                                   persona=user.persona)
+    row = models.RecipeDB(title=recipe["title"], ingredients_json=recipe.get("ingredients"), steps_json=recipe.get("steps"),
+                          macros_json=recipe.get("macros"), effort_level=recipe.get("effort_level"))
+    db.add(row)
+    db.commit()
+    return {"id": row.id, "title": row.title}
+
+
+async def burst(client, prefix: str, user_id: int, n: int) -> dict:
+    async def timed(coro):
+        began = time.perf_counter()
+        resp = await coro
+        return time.perf_counter() - began, resp.status_code
+
+    body = {"user_id": user_id, "meal_type": "Dinner", "effort_level": "low"}
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(timed(client.post(f"{prefix}/recipes/generate", json=body)) for _ in range(n)),
+        *(timed(client.get(f"{prefix}/users/stats/{user_id}")) for _ in range(n)),
+    )
+    elapsed = time.perf_counter() - started
+    stats = sorted(t for t, _ in results[n:])
+    return {
+        "elapsed": elapsed,
+        "stats_p50": statistics.median(stats) * 1000,
+        "stats_p95": stats[max(0, int(len(stats) * 0.95) - 1)] * 1000,
+        "errors": sum(1 for _, status in results if status >= 400),
+    }
+
+
+async def run(args):
+    def slow_model(**kwargs):
+        time.sleep(args.model_ms / 1000)
+        return ai_chef.get_fallback_recipe()
+    ai_chef.ask_chef_json = slow_model
+
+    # ASGITransport doesn't send lifespan events: apply the app's startup executor sizing by hand
+    await main.configure_blocking_executor()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench") as client:
+        user = (await client.post("/users/onboard", json={
+            "username": f"async_bench_{int(time.time())}", "age": 24, "weight": 80, "height": 180, "gender": "M", "persona": "gym_bro"
+        })).json()
+        await client.post(f"/inventory/add?user_id={user['id']}", json=[{"name": "Rice", "quantity": 1, "unit": "kg"}])
+        print(f"🔹 Model call stubbed at {args.model_ms} ms\n")
+        for n in args.burst:
+            print(f"{n} generate + {n} stats at once:")
+            for label, prefix in (("sync + threadpool", "/bench/sync"), ("async engine", "")):
+                r = await burst(client, prefix, user["id"], n)
+                print(f"   - {label:18} wall {r['elapsed'] * 1000:6.0f} ms, stats p50 {r['stats_p50']:6.1f} ms, "
+                      f"p95 {r['stats_p95']:6.1f} ms, {r['errors']} errors")
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-ms", type=int, default=1000)
+    parser.add_argument("--burst", type=int, nargs="+", default=[50, 150])
+    args = parser.parse_args()
+    quiet()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,117 @@
+"""
+Resolves OCR'd bill lines against a catalog grown to N products (default 50k) the
+way a real one looks: the seed products plus brand lines, flavours and derived
+products that share their words ("Tomato Ketchup", "Potato Chips", "Milk Bread").
+Fails if the hit rate or the p95 lookup latency misses its target.
+
+    python benchmarks/catalog_lookup.py [--products 50000] [--min-hit-rate 0.98] [--max-p95-ms 1]
+"""
+import argparse
+import random
+import sys
+import time
+
+from common import ROOT
+
+if ROOT not in sys.path: sys.path.insert(0, ROOT)
+
+from services import catalog
+
+BRANDS = ["Kissan", "Haldiram", "Nestle", "Heinz", "Del Monte", "Kellogg", "Parle", "Bikaji", "Dabur", "Mapro",
+          "Hershey", "Cadbury", "Lays", "Bingo", "Veeba", "Funfoods", "Sundrop", "Gowardhan", "Milky Mist",
+          "Epigamia", "Akshayakalpa", "Tropicana", "Real", "Paper Boat", "Sleepy Owl", "Yoga Bar", "Ching's",
+          "Knorr", "Eastern", "Aachi", "Shan", "Badshah", "Keya", "Borges", "Figaro", "Disano", "Urban Platter"]
+FORMS = ["Ketchup", "Puree", "Sauce", "Soup", "Chips", "Pickle", "Paste", "Powder", "Juice", "Jam", "Bread",
+         "Biscuits", "Cookies", "Noodles", "Flakes", "Crisps", "Chutney", "Spread", "Masala", "Mix", "Bites",
+         "Candies", "Leaves", "Pieces", "Slices", "Cubes", "Wedges", "Fries", "Rolls", "Cakes", "Pastries",
+         "Drink", "Shake", "Smoothie", "Lassi", "Curry", "Gravy", "Dip", "Dressing", "Seasoning"]
+FLAVOURS = ["Spicy", "Sweet", "Tangy", "Classic", "Masala", "Peri Peri", "Garlic", "Herb", "Smoked", "Roasted",
+            "Salted", "Honey", "Chilli", "Lemon", "Mint", "Cheese", "Tomato", "Onion", "Cream", "Pepper",
+            "Mango", "Strawberry", "Chocolate", "Vanilla", "Butterscotch", "Coconut", "Peanut", "Almond"]
+SYLLABLES = ["ka", "ri", "mo", "sha", "vel", "tan", "du", "ro", "pi", "nak", "sul", "bha", "ge", "lo", "mur", "zen",
+             "ta", "vi", "che", "ram", "on", "ya", "bri", "ko", "dhi", "nu", "pra", "sem", "hal", "fi"]
+PACKS = ["100g", "200 G", "500GM", "1KG", "1 kg", "250ml", "500 ML", "1L", "2 Ltr", "6 pcs", "12 NOS", ""]
+
+
+def build_catalog(size: int, rng: random.Random) -> catalog.TrigramIndex:
+    index = catalog.TrigramIndex(catalog.SEED_PRODUCTS)
+    bases = [name for name, _, _ in catalog.SEED_PRODUCTS]
+    # Regional and private labels: a real catalog has thousands of brands, not a few dozen
+    brands = BRANDS + ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).title() for _ in range(3000)]
+    while len(index.products) < size:
+        base = rng.choice(bases + FLAVOURS)
+        words = [rng.choice(brands)]
+        if rng.random() < 0.5: words.append(rng.choice(FLAVOURS))
+        words += [base, rng.choice(FORMS)]
+        if rng.random() < 0.3: words.append(rng.choice(brands))  # sub-brand / range name
+        index.add(" ".join(words), "pcs", "Packaged")
+    return index
+
+
+def plural(name: str) -> str:
+    word = name.split()[-1]
+    if word.endswith(("s", "a", "i", "u")): return name
+    if word.endswith("o"): return name + "es"
+    if word.endswith("y") and word[-2] not in "aeiou": return name[:-1] + "ies"
+    return name + "s"
+
+
+def bill_lines(rng: random.Random, count: int):
+    """(OCR'd line, expected product name): seed products as printed on a bill."""
+    noise = sorted(catalog.NOISE_WORDS)
+    lines = []
+    for _ in range(count):
+        name, _, _ = rng.choice(catalog.SEED_PRODUCTS)
+        text = plural(name) if rng.random() < 0.4 else name
+        if rng.random() < 0.4: text = f"{rng.choice(noise)} {text}"
+        if rng.random() < 0.5: text = f"{text} {rng.choice(PACKS)}"
+        lines.append((text.upper() if rng.random() < 0.5 else text, name))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=5_000)
+    parser.add_argument("--min-hit-rate", type=float, default=0.98)
+    parser.add_argument("--max-p95-ms", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    index = build_catalog(args.products, rng)
+    print(f"Catalog: {len(index.products)} products, {len(index._postings)} trigrams, "
+          f"built in {time.perf_counter() - started:.1f}s")
+
+    lines = bill_lines(rng, args.queries)
+
+    latencies, hits, misses = [], 0, {}
+    for text, expected in lines:
+        # Same path as catalog.resolve, minus its lru_cache: every lookup is timed cold
+        parsed = catalog.quantity.parse_quantity(text)
+        name = parsed.name if parsed and parsed.name else text
+        began = time.perf_counter()
+        product = index.lookup(name)
+        latencies.append(time.perf_counter() - began)
+        if product and product.name == expected: hits += 1
+        else: misses[text] = product.name if product else None
+
+    latencies.sort()
+    p50, p95 = latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.95)] * 1000
+    hit_rate = hits / len(lines)
+    print(f"Hit rate: {hit_rate:.4f} ({hits}/{len(lines)})   p50 {p50:.3f} ms   p95 {p95:.3f} ms")
+    for text, got in list(misses.items())[:10]:
+        print(f"  miss: {text!r} -> {got!r}")
+
+    failed = []
+    if hit_rate < args.min_hit_rate: failed.append(f"hit rate {hit_rate:.4f} < {args.min_hit_rate}")
+    if p95 > args.max_p95_ms: failed.append(f"p95 {p95:.3f} ms > {args.max_p95_ms} ms")
+    if failed:
+        print("FAIL: " + "; ".join(failed))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
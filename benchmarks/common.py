@@ -0,0 +1,68 @@
+"""Shared setup for the benchmark scripts: a scratch database and an RSS sampler."""
+import os
+import sys
+import logging
+import time
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def use_scratch_database(name: str) -> str:
+    """Points DATABASE_URL at a fresh SQLite file. Call before importing database/models/main."""
+    if "DATABASE_URL" not in os.environ:
+        path = os.path.join(tempfile.mkdtemp(prefix="cookmate-bench-"), f"{name}.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    if ROOT not in sys.path: sys.path.insert(0, ROOT)
+    return os.environ["DATABASE_URL"]
+
+
+def quiet() -> None:
+    """Warnings and errors only: the app and the test client log an INFO line per request."""
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def rss_mb() -> float:
+    """Current resident set size. Linux reads /proc; elsewhere falls back to the peak so far."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+class PeakRSS:
+    """with PeakRSS() as m: ...  then m.baseline / m.peak / m.growth in MB, sampled every `interval` s."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.baseline = self.peak = 0.0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_mb())
+
+    def __enter__(self):
+        self.baseline = self.peak = rss_mb()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_mb())
+
+    @property
+    def growth(self) -> float:
+        return self.peak - self.baseline
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
@@ -0,0 +1,99 @@
+"""
+Exports N cooking sessions for one user (default 1M) through export.stream and
+fails if RSS grows past a fixed ceiling, or if a writer running alongside the
+download ever hits "database is locked".
+
+    python benchmarks/export_memory.py [--rows 1000000] [--ceiling-mb 64] [--gzip]
+"""
+import argparse
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from common import PeakRSS, use_scratch_database
+
+use_scratch_database("export")
+
+import models
+from database import SessionLocal, engine, upgrade_schema
+from services import export
+
+BATCH = 50_000
+
+
+def seed(rows: int) -> int:
+    upgrade_schema(models.Base.metadata)
+    with SessionLocal() as db:
+        user = models.UserDB(username=f"export_bench_{int(time.time())}", persona="gym_bro")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+    start = datetime(2020, 1, 1)
+    table = models.CookingSessionDB.__table__
+    with engine.begin() as conn:
+        for offset in range(0, rows, BATCH):
+            conn.execute(table.insert(), [{
+                "user_id": user_id, "recipe_title": f"Recipe {i}", "status": "completed", "rating": i % 5 + 1,
+                "macros_json": {"calories": 500, "protein": 30, "carbs": 50, "fats": 20},
+                "start_time": start + timedelta(minutes=i), "end_time": start + timedelta(minutes=i + 30),
+            } for i in range(offset, min(offset + BATCH, rows))])
+    return user_id
+
+
+def writer(user_id: int, stop: threading.Event, report: dict):
+    """Keeps committing small writes while the export runs; records the slowest and any failure."""
+    while not stop.is_set():
+        began = time.perf_counter()
+        try:
+            with SessionLocal() as db:
+                db.add(models.InventoryDB(user_id=user_id, name="Bench Rice", quantity=1, unit="kg"))
+                db.commit()
+            report["writes"] += 1
+        except Exception as e:
+            report["errors"].append(str(e))
+        report["slowest"] = max(report["slowest"], time.perf_counter() - began)
+        stop.wait(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--ceiling-mb", type=float, default=64)
+    parser.add_argument("--gzip", action="store_true")
+    args = parser.parse_args()
+
+    print(f"🔹 Seeding {args.rows:,} sessions...")
+    user_id = seed(args.rows)
+
+    print(f"🔹 Exporting sessions as ndjson{' + gzip' if args.gzip else ''}...")
+    stop, report = threading.Event(), {"writes": 0, "errors": [], "slowest": 0.0}
+    thread = threading.Thread(target=writer, args=(user_id, stop, report), daemon=True)
+    started = time.perf_counter()
+    size = chunks = 0
+    with PeakRSS() as rss:
+        thread.start()
+        for chunk in export.stream(user_id, "sessions", "ndjson", args.gzip):
+            size += len(chunk)
+            chunks += 1
+        stop.set()
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    print(f"   - {size / 2**20:.1f} MB in {chunks:,} chunks, {elapsed:.1f} s ({args.rows / elapsed:,.0f} rows/s)")
+    print(f"   - RSS: {rss.baseline:.1f} MB -> peak {rss.peak:.1f} MB (+{rss.growth:.1f} MB, ceiling +{args.ceiling_mb:.0f} MB)")
+    print(f"   - Concurrent writes: {report['writes']} ok, {len(report['errors'])} failed, slowest {report['slowest'] * 1000:.0f} ms")
+
+    failed = False
+    if rss.growth > args.ceiling_mb:
+        print("❌ Export memory grew past the ceiling")
+        failed = True
+    if report["errors"]:
+        print(f"❌ Writers were blocked during the export: {report['errors'][0]}")
+        failed = True
+    if not failed: print("✅ Export memory stayed flat and writers kept going")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
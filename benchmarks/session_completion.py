@@ -0,0 +1,115 @@
+"""
+Concurrent /mentor/end: the write-behind event log against the old inline
+read-modify-write of xp_points / current_streak (re-created below as /bench/legacy-end).
+
+For each path: --completions session completions spread over --users users, --threads
+at a time. Reports throughput and end latency, then checks every user's XP against
+the number of completions (lost updates).
+
+    python benchmarks/session_completion.py [--users 5] [--completions 400] [--threads 16]
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from common import quiet, use_scratch_database
+
+use_scratch_database("sessions")
+
+from fastapi import Depends
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+import main
+import models
+from database import SessionLocal, get_db
+from services import gamification
+
+main.ai_chef.client_main = None
+# Runs after the response has gone out; not part of what the caller waits for
+main.speculative.pregenerate = lambda user_id: None
+
+
+@main.app.post("/bench/legacy-end")
+def legacy_end_session(req: main.schemas.SessionEnd, db: Session = Depends(get_db)):
+    """end_session's XP/streak/badge step as it was before the event log."""
+    data = main.active_sessions.pop(req.session_id)
+    user = db.query(models.UserDB).filter(models.UserDB.id == data["user_id"]).first()
+    db.add(models.CookingSessionDB(
+        user_id=data["user_id"], recipe_title=data["recipe"], start_time=data["start_time"], end_time=datetime.utcnow(),
+        status="completed", rating=req.rating, leftovers=req.leftovers
+    ))
+    user.xp_points += 10
+    user.current_streak += 1
+    earned_badges = []
+    if user.current_streak == 3:
+        db.add(models.UserBadgeDB(user_id=user.id, badge_name="Streak Master", description="Cooked 3 days in a row!"))
+        earned_badges.append("Streak Master")
+    db.commit()
+    return {"status": "Completed", "new_xp": user.xp_points, "badges_earned": earned_badges}
+
+
+def run(client, path: str, user_ids: list, completions: int, threads: int) -> dict:
+    def complete(i):
+        user_id = user_ids[i % len(user_ids)]
+        session = client.post("/mentor/start", json={"user_id": user_id, "recipe_title": "Dal", "steps": ["a"]}).json()
+        began = time.perf_counter()
+        resp = client.post(path, json={"session_id": session["session_id"], "rating": 5, "leftovers": False})
+        return time.perf_counter() - began, resp.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(complete, range(completions)))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(t for t, _ in results)
+    return {
+        "elapsed": elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "errors": sum(1 for _, status in results if status != 200),
+    }
+
+
+def xp_report(user_ids: list, completions: int):
+    with SessionLocal() as db:
+        xp = [db.get(models.UserDB, u).xp_points for u in user_ids]
+    expected = 10 * completions
+    return sum(xp), expected
+
+
+def reset(user_ids: list):
+    with SessionLocal() as db:
+        db.execute(update(models.UserDB).where(models.UserDB.id.in_(user_ids)).values(xp_points=0, current_streak=0))
+        db.commit()
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--completions", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    quiet()
+    client = TestClient(main.app)
+    user_ids = [client.post("/users/onboard", json={
+        "username": f"bench_{i}_{int(time.time())}", "age": 24, "weight": 80, "height": 180, "gender": "M", "persona": "gym_bro"
+    }).json()["id"] for i in range(args.users)]
+    print(f"🔹 {args.completions} completions over {args.users} users, {args.threads} threads\n")
+
+    for label, path in (("inline read-modify-write", "/bench/legacy-end"), ("event log + aggregator", "/mentor/end")):
+        reset(user_ids)
+        stats = run(client, path, user_ids, args.completions, args.threads)
+        applied = gamification.flush_all() if path == "/mentor/end" else None
+        total, expected = xp_report(user_ids, args.completions)
+        print(f"{label}:")
+        print(f"   - {args.completions / stats['elapsed']:.0f} completions/s, end p50 {stats['p50']:.1f} ms, p95 {stats['p95']:.1f} ms, {stats['errors']} errors")
+        if applied is not None: print(f"   - aggregator applied {applied} events in one flush")
+        print(f"   - XP total {total} / expected {expected}" + (f"  ❌ {(expected - total) // 10} updates lost" if total != expected else "  ✅"))
+
+
+if __name__ == "__main__":
+    main_()
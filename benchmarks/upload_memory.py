@@ -0,0 +1,107 @@
+"""
+Peak RSS while N bill photos are uploaded to /inventory/scan-bill at once, for:
+
+- spooled:  the current path (upload spooled to a temp file, base64 streamed into one buffer)
+- buffered: the old path (await file.read(), then base64 + data-URL copies of the bytes)
+
+Each mode runs in its own process so one can't inherit the other's heap. The
+model call is stubbed with a sleep, holding the data URL the way a real call does.
+Request bodies are streamed, so the client side adds next to nothing.
+
+    python benchmarks/upload_memory.py [--uploads 8] [--mb 9] [--model-ms 500]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from common import PeakRSS, quiet, use_scratch_database
+
+BOUNDARY = "cookmatebench"
+CHUNK = b"\xff" * (64 * 1024)
+
+
+def multipart(user_id: int, size: int):
+    """(headers, async body iterator) for a `size`-byte bill photo, without materialising it."""
+    head = (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"user_id\"\r\n\r\n{user_id}\r\n"
+            f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"bill.jpg\"\r\n"
+            f"Content-Type: image/jpeg\r\n\r\n").encode()
+    tail = f"\r\n--{BOUNDARY}--\r\n".encode()
+
+    async def body():
+        yield head
+        left = size
+        while left > 0:
+            yield CHUNK[:min(left, len(CHUNK))]
+            left -= len(CHUNK)
+        yield tail
+
+    headers = {"content-type": f"multipart/form-data; boundary={BOUNDARY}",
+               "content-length": str(len(head) + size + len(tail))}
+    return headers, body()
+
+
+async def child(mode: str, uploads_n: int, size: int, model_ms: int) -> dict:
+    use_scratch_database(f"uploads-{mode}")
+    import httpx
+    import main
+    from services import ai_chef, uploads
+
+    quiet()
+
+    class Completions:
+        def create(self, **kwargs):
+            time.sleep(model_ms / 1000)
+            return type("R", (), {"choices": [type("C", (), {"message": type("M", (), {"content": '{"items": []}'})()})()]})()
+
+    ai_chef.client_main = type("Client", (), {"chat": type("Chat", (), {"completions": Completions()})()})()
+    if mode == "buffered":
+        async def read_all(file, limit=uploads.MAX_UPLOAD_BYTES):
+            return await file.read()
+        uploads.spool_upload = read_all
+
+    await main.configure_blocking_executor()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench", timeout=120) as client:
+        user = (await client.post("/users/onboard", json={
+            "username": f"upload_bench_{int(time.time())}", "age": 24, "weight": 80, "height": 180, "gender": "M", "persona": "gym_bro"
+        })).json()
+        requests = [multipart(user["id"], size) for _ in range(uploads_n)]
+        started = time.perf_counter()
+        with PeakRSS(interval=0.005) as rss:
+            responses = await asyncio.gather(*(
+                client.post("/inventory/scan-bill", headers=headers, content=body) for headers, body in requests
+            ))
+    return {"mode": mode, "baseline": rss.baseline, "peak": rss.peak, "growth": rss.growth,
+            "elapsed": time.perf_counter() - started, "statuses": sorted({r.status_code for r in responses})}
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=8)
+    parser.add_argument("--mb", type=float, default=9)
+    parser.add_argument("--model-ms", type=int, default=500)
+    parser.add_argument("--child", choices=("spooled", "buffered"))
+    args = parser.parse_args()
+    size = int(args.mb * 1024 * 1024)
+
+    if args.child:
+        print(json.dumps(asyncio.run(child(args.child, args.uploads, size, args.model_ms))))
+        return
+
+    print(f"🔹 {args.uploads} concurrent {args.mb:g} MB uploads, model call {args.model_ms} ms\n")
+    for mode in ("buffered", "spooled"):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", mode, "--uploads", str(args.uploads),
+             "--mb", str(args.mb), "--model-ms", str(args.model_ms)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"   - {mode:9} RSS {r['baseline']:6.1f} -> {r['peak']:6.1f} MB (+{r['growth']:6.1f} MB, "
+              f"{r['growth'] / args.uploads:5.1f} MB/upload), {r['elapsed']:.2f} s, status {r['statuses']}")
+
+
+if __name__ == "__main__":
+    main_()
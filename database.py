@@ -1,20 +1,76 @@
-from sqlalchemy import create_engine
+import os
+import logging
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.dialects import postgresql, sqlite
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./cookmate_startup.db"
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./cookmate_startup.db")
 
 # connect_args={"check_same_thread": False} is needed for SQLite + FastAPI
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+connect_args = {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=connect_args)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+logger = logging.getLogger(__name__)
+
+# --- SCHEMA UPGRADE ---
+def upgrade_schema(metadata):
+    """
+    create_all() only creates missing tables; it never ALTERs one that exists.
+    For existing tables, add the columns (nullable: old rows get NULL) and indexes
+    the models gained since the database was created.
+    """
+    metadata.create_all(bind=engine)
+    existing_tables = set(inspect(engine).get_table_names())
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables: continue
+            columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in columns: continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"))
+                logger.info(f"Schema upgrade: added {table.name}.{column.name}")
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
 # Dependency for Main.py
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Counter tables (rollups, spend buckets): INSERT ... ON CONFLICT DO UPDATE SET x = x + excluded.x
+def increment_upsert(table, keys: dict, deltas: dict):
+    """Statement only, so sync and async sessions can both execute it."""
+    insert = postgresql.insert if engine.dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(table).values(**keys, **deltas)
+    return stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={k: getattr(table.c, k) + getattr(stmt.excluded, k) for k in deltas}
+    )
+
+# --- ASYNC ENGINE ---
+# Same database, async driver: aiosqlite for SQLite, asyncpg for Postgres.
+def to_async_url(url: str) -> str:
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:") or url.startswith("postgres:"):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+async_engine = create_async_engine(to_async_url(SQLALCHEMY_DATABASE_URL))
+# expire_on_commit=False: response models read attributes after commit without a lazy reload
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Async dependency for the hot routes
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,21 +1,59 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Body
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Body, Query, Header, BackgroundTasks, Path
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 from typing import List, Dict, Optional
 import os
-from datetime import datetime, timedelta
+import asyncio
+import itertools
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, date
 
 import models, schemas
-from database import SessionLocal, engine, get_db
-from services import ai_chef
+from database import SessionLocal, engine, get_db, get_async_db, upgrade_schema
+from services import ai_chef, budget, catalog, compaction, cook_now, export, gamification, guardian, idempotency, intents, nutrition, profiles, profiling, quantity, recipe_store, resilience, speculative, timers, uploads, vision
 
 # --- SETUP ---
-models.Base.metadata.create_all(bind=engine)
+# Creates missing tables and adds columns/indexes to existing ones (create_all alone never ALTERs)
+upgrade_schema(models.Base.metadata)
 
 app = FastAPI(title="CookMate Lifestyle OS", version="9.0-Platinum")
 
+# Idempotency-Key on a mutating request: a retry replays the stored response, a concurrent
+# duplicate waits for the original. Added before the deadline so a waiting duplicate is bounded by it.
+app.add_middleware(idempotency.IdempotencyMiddleware)
+
+# Reject oversized uploads from the Content-Length header, before the body is read
+# (outside the idempotency middleware, which reads a keyed request's whole body).
+# A batch body holds several pages: it gets the batch total (each page is checked as it spools).
+UPLOAD_LIMITS = {
+    "/inventory/scan-bill": uploads.MAX_UPLOAD_BYTES,
+    "/inventory/scan-bills": uploads.MAX_BATCH_UPLOAD_BYTES,
+    "/mentor/guardian-check": uploads.MAX_UPLOAD_BYTES,
+}
+
+@app.middleware("http")
+async def limit_upload_size(request, call_next):
+    limit = UPLOAD_LIMITS.get(request.url.path)
+    if limit:
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and uploads.too_large(int(length), limit):
+            return JSONResponse(status_code=413, content={"detail": "Upload too large"})
+    return await call_next(request)
+
+# Per-request deadline (X-Request-Timeout-Ms or the default): upstream calls get only
+# what's left of it, and nothing is still answering after the client has given up
+app.add_middleware(resilience.DeadlineMiddleware)
+
+# Opt-in request profiling (PROFILE_SECRET and/or PROFILE_SAMPLE_RATE); not installed at all otherwise
+if profiling.enabled():
+    app.add_middleware(profiling.ProfilingMiddleware)
+
+# Added last, so outermost: 504s, 413s and idempotent replays answered by the middlewares
+# above carry CORS headers too (the last middleware added wraps all the others)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -26,6 +64,26 @@ app.add_middleware(
 
 # In-Memory Session State (For Speed during Demo)
 active_sessions: Dict[int, Dict] = {} 
+# Monotonic ids: len(active_sessions) + 1 reused ids once sessions ended, and raced under load
+session_ids = itertools.count(1)
+
+# Model and OCR calls run through asyncio.to_thread and hold their thread for seconds.
+# The default executor (cpu_count + 4 threads) would let only a handful be in flight at once.
+BLOCKING_CALL_THREADS = int(os.getenv("BLOCKING_CALL_THREADS", "64"))
+
+@app.on_event("startup")
+async def configure_blocking_executor():
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=BLOCKING_CALL_THREADS, thread_name_prefix="blocking")
+    )
+
+@app.on_event("startup")
+async def start_background_jobs():
+    asyncio.create_task(compaction.compaction_loop())
+    asyncio.create_task(gamification.aggregator_loop())
+    asyncio.create_task(timers.scheduler.run())
+    asyncio.create_task(profiles.listen())
+    asyncio.create_task(cook_now.warm())
 
 # ==========================================
 # 1. USER & ONBOARDING (The "Roti Logic")
@@ -63,72 +121,176 @@ def onboard_user(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
         cooking_skill=user_data.cooking_skill
     )
     db.add(new_user)
+    db.flush()
+    version = profiles.bump(db, [new_user.id])[new_user.id]
     db.commit()
     db.refresh(new_user)
+    profiles.put(new_user, version)
     return new_user
 
 @app.post("/users/login")
-def login_user(username: str = Body(..., embed=True), db: Session = Depends(get_db)):
+async def login_user(username: str = Body(..., embed=True), db: AsyncSession = Depends(get_async_db)):
     """Simple Login: Checks if username exists and returns the User ID."""
-    user = db.query(models.UserDB).filter(models.UserDB.username == username).first()
+    user = await profiles.find(db, username)
     if not user:
         raise HTTPException(status_code=404, detail="User not found. Please Register.")
-    return {"id": user.id, "username": user.username, "persona": user.persona}
+    return {"id": user["id"], "username": user["username"], "persona": user["persona"]}
 
 @app.get("/users/stats/{user_id}")
-def get_user_stats(user_id: int, db: Session = Depends(get_db)):
+async def get_user_stats(user_id: int, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
     """
     Returns Home Page Stats.
     - XP, Streak
     - Most Cooked Recipe
     - TOTAL Sessions (Fixed to count all rows)
     """
-    user = db.query(models.UserDB).filter(models.UserDB.id == user_id).first()
+    user = await profiles.get(db, user_id)
     if not user: 
         raise HTTPException(status_code=404, detail="User not found")
     
     # 1. Calculate TOTAL Sessions (The fix for your "Meal Cooked" number)
-    total_count = db.query(models.CookingSessionDB).filter(
-        models.CookingSessionDB.user_id == user_id
-    ).count()
+    total_count = await db.scalar(
+        select(func.count(models.CookingSessionDB.id)).where(models.CookingSessionDB.user_id == user_id)
+    )
 
     # 2. Calculate Most Cooked Recipe (The "Fav" recipe)
-    fav_query = db.query(
-        models.CookingSessionDB.recipe_title, 
-        func.count(models.CookingSessionDB.recipe_title)
-    ).filter(models.CookingSessionDB.user_id == user_id)\
-     .group_by(models.CookingSessionDB.recipe_title)\
-     .order_by(func.count(models.CookingSessionDB.recipe_title).desc()).first()
-
+    fav_query = (await db.execute(
+        select(models.CookingSessionDB.recipe_title, func.count(models.CookingSessionDB.recipe_title))
+        .where(models.CookingSessionDB.user_id == user_id)
+        .group_by(models.CookingSessionDB.recipe_title)
+        .order_by(func.count(models.CookingSessionDB.recipe_title).desc())
+        .limit(1)
+    )).first()
+
+    # Home screen open: a good moment to warm up their next meal
+    background_tasks.add_task(speculative.pregenerate, user_id)
     return {
-        "xp": user.xp_points,
-        "streak": user.current_streak,
+        "xp": user["xp_points"],
+        "streak": user["current_streak"],
         "most_cooked_recipe": fav_query[0] if fav_query else "Nothing yet!",
         "total_sessions": total_count  # <--- Now returns the actual total
     }
 
 @app.get("/users/{user_id}", response_model=schemas.UserResponse)
-def get_user_profile(user_id: int, db: Session = Depends(get_db)):
-    """Fetches full profile details (Age, Weight, Skill, etc.)"""
-    user = db.query(models.UserDB).filter(models.UserDB.id == user_id).first()
+async def get_user_profile(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Fetches full profile details (Age, Weight, Skill, etc.), badges included, from the profile cache."""
+    user = await profiles.get(db, user_id)
     if not user: raise HTTPException(status_code=404, detail="User not found")
     return user
 
+@app.get("/users/{user_id}/sessions", response_model=schemas.SessionHistoryPage)
+async def get_session_history(
+    user_id: int,
+    cursor: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Cooking history, newest first. Keyset paginated on id: pass next_cursor back as `cursor`."""
+    q = select(models.CookingSessionDB).where(models.CookingSessionDB.user_id == user_id)
+    if cursor is not None: q = q.where(models.CookingSessionDB.id < cursor)
+    if since is not None: q = q.where(models.CookingSessionDB.start_time >= since)
+    if until is not None: q = q.where(models.CookingSessionDB.start_time < until)
+
+    rows = (await db.scalars(q.order_by(models.CookingSessionDB.id.desc()).limit(limit + 1))).all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return {"items": rows[:limit], "next_cursor": next_cursor}
+
+@app.get("/users/{user_id}/nutrition", response_model=schemas.NutritionResponse)
+async def get_nutrition(
+    user_id: int,
+    period: str = Query("day", pattern="^(day|week)$"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Macro totals per day or ISO week, read straight from the rollup table:
+    one indexed range scan, independent of how many sessions the user has.
+    Defaults to the last 7 days / 8 weeks.
+    """
+    end = end or datetime.utcnow().date()
+    if not start:
+        start = end - timedelta(days=6) if period == "day" else nutrition.week_start(end) - timedelta(weeks=7)
+    rows = (await db.scalars(
+        select(models.NutritionRollupDB).where(
+            models.NutritionRollupDB.user_id == user_id,
+            models.NutritionRollupDB.period == period,
+            models.NutritionRollupDB.period_start >= start,
+            models.NutritionRollupDB.period_start <= end
+        ).order_by(models.NutritionRollupDB.period_start)
+    )).all()
+    totals = {k: round(sum(getattr(r, k) or 0.0 for r in rows), 1) for k in nutrition.MACRO_KEYS}
+    return {"period": period, "buckets": rows, "totals": totals}
+
+@app.get("/users/{user_id}/budget", response_model=schemas.BudgetResponse)
+async def get_budget(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Rolling 7-day and month-to-date grocery spend against weekly_budget, from the spend buckets."""
+    user = await db.get(models.UserDB, user_id)
+    if not user: raise HTTPException(status_code=404, detail="User not found")
+    today = datetime.utcnow().date()
+    buckets = (await db.scalars(budget.summary_query(user_id, today))).all()
+    return budget.summarize(buckets, user.weekly_budget, today)
+
+@app.get("/users/{user_id}/export/{dataset}")
+def export_user_data(
+    user_id: int,
+    dataset: str = Path(..., pattern="^(inventory|sessions|badges|all)$"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Streams a user's data as NDJSON or CSV (optionally gzipped), a keyset page at
+    a time: memory stays flat however long the history is.
+    `all` is NDJSON only, one typed record per line.
+    """
+    if dataset == "all" and format == "csv":
+        raise HTTPException(status_code=400, detail="CSV export is per dataset; use ndjson for 'all'")
+    if not db.query(models.UserDB.id).filter(models.UserDB.id == user_id).first():
+        raise HTTPException(status_code=404, detail="User not found")
+
+    filename = f"cookmate-{user_id}-{dataset}.{format}" + (".gz" if gzip else "")
+    media_type = "application/gzip" if gzip else ("text/csv" if format == "csv" else "application/x-ndjson")
+    return StreamingResponse(
+        export.stream(user_id, dataset, format, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @app.put("/users/{user_id}/skill")
 def update_cooking_skill(user_id: int, skill_level: int = Body(..., embed=True), db: Session = Depends(get_db)):
     """Updates just the cooking skill (1-10)."""
     user = db.query(models.UserDB).filter(models.UserDB.id == user_id).first()
     if not user: raise HTTPException(status_code=404)
     user.cooking_skill = skill_level
+    version = profiles.bump(db, [user_id])[user_id]
     db.commit()
+    profiles.update(user_id, version, cooking_skill=skill_level)
+    speculative.invalidate(user_id)
     return {"status": "Updated", "new_skill": skill_level}
 
 # ==========================================
 # 2. INTELLIGENT INVENTORY (Vision & Math)
 # ==========================================
 
+def apply_deductions(inventory: List[models.InventoryDB], ingredients: List[str]) -> List[str]:
+    """Subtracts recipe quantities from pantry rows, converting units locally. Returns touched names."""
+    by_id = {item.id: item for item in inventory}
+    snapshot = [{"id": i.id, "name": i.name, "quantity": i.quantity, "unit": i.unit} for i in inventory]
+    updated = []
+    for d in ai_chef.calculate_deductions(ingredients, snapshot):
+        item = by_id.get(d.get("inventory_id"))
+        if not item: continue
+        item.quantity = max(0.0, (item.quantity or 0.0) - float(d.get("decrement_amount", 0)))
+        if item.quantity <= 0:
+            item.is_exhausted = True
+        updated.append(item.name)
+    return updated
+
 @app.post("/inventory/add")
-def add_items(user_id: int, items: List[schemas.InventoryCreate], db: Session = Depends(get_db)):
+def add_items(user_id: int, items: List[schemas.InventoryCreate], background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """Manual Entry: Adds items to pantry."""
     for item in items:
         exists = db.query(models.InventoryDB).filter(
@@ -140,18 +302,43 @@ def add_items(user_id: int, items: List[schemas.InventoryCreate], db: Session =
         else:
             new_item = models.InventoryDB(**item.dict(), user_id=user_id)
             db.add(new_item)
+    rows, bumps = budget.ledger_writes(user_id, [(i.name, i.price_per_unit * i.quantity) for i in items], "manual")
+    db.add_all(rows)
+    for stmt in bumps: db.execute(stmt)
     db.commit()
+    speculative.invalidate(user_id)
+    background_tasks.add_task(speculative.pregenerate, user_id)
     return {"status": "Updated"}
 
-@app.post("/inventory/scan-bill")
-async def scan_bill(user_id: int = Body(...), file: UploadFile = File(...), db: Session = Depends(get_db)):
-    """AI OCR: Scans a grocery bill and estimates expiry."""
-    image_bytes = await file.read()
-    parsed_items = ai_chef.parse_grocery_bill(image_bytes)
-    
-    added_items = []
+async def merge_bill_items(db: AsyncSession, user_id: int, parsed_items: List[Dict]):
+    """Merges canonicalized bill items into the pantry and spend ledger (no commit). Returns (added, merged) rows."""
+    # Merge into existing rows so the same product scanned twice stays one row
+    existing = defaultdict(list)
+    for i in (await db.scalars(select(models.InventoryDB).where(models.InventoryDB.user_id == user_id))).all():
+        existing[catalog.canonical_name(i.name).lower()].append(i)
+    added_items, merged_items = [], []
     for item in parsed_items:
         expiry = datetime.utcnow() + timedelta(days=item.get("expiry_days", 7))
+        # Only a row whose unit the scanned amount converts to: 500 g never lands on a "pcs" row
+        row, qty = None, None
+        for candidate in existing[item["name"].lower()]:
+            qty = quantity.convert_units(item["quantity"], item.get("unit"), candidate.unit)
+            if qty is not None:
+                row = candidate
+                break
+        if row:
+            # Old stock still expires first, unless it was already used up
+            if row.is_exhausted or (row.quantity or 0) <= 0:
+                row.expiry_date = expiry
+                row.quantity = 0.0
+            elif not row.expiry_date:
+                row.expiry_date = expiry
+            row.quantity += qty
+            row.is_exhausted = False
+            if item.get("price"): row.price_per_unit = item["price"]
+            merged_items.append(row)
+            continue
+
         db_item = models.InventoryDB(
             user_id=user_id,
             name=item["name"],
@@ -162,31 +349,117 @@ async def scan_bill(user_id: int = Body(...), file: UploadFile = File(...), db:
             expiry_date=expiry
         )
         db.add(db_item)
+        existing[db_item.name.lower()].append(db_item)
         added_items.append(db_item)
-    
-    db.commit()
-    return {"status": "Success", "items_added": len(added_items), "details": parsed_items}
 
-@app.get("/inventory/{user_id}", response_model=List[schemas.InventoryResponse])
-def get_inventory(user_id: int, db: Session = Depends(get_db)):
-    """Fetches user's current pantry."""
-    return db.query(models.InventoryDB).filter(models.InventoryDB.user_id == user_id).all()
+    # Bill prices are line totals
+    rows, bumps = budget.ledger_writes(user_id, [(i["name"], i.get("price") or 0.0) for i in parsed_items], "scan")
+    db.add_all(rows)
+    for stmt in bumps: await db.execute(stmt)
+    return added_items, merged_items
+
+@app.post("/inventory/scan-bill")
+async def scan_bill(background_tasks: BackgroundTasks, user_id: int = Body(...), file: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)):
+    """AI OCR: Scans a grocery bill and estimates expiry."""
+    image = await uploads.spool_upload(file)
+    # The OpenAI client is blocking: keep it off the event loop
+    bill_items = await asyncio.to_thread(ai_chef.parse_grocery_bill, image)
+    parsed_items = [catalog.canonicalize_item(i) for i in bill_items]
+
+    added_items, merged_items = await merge_bill_items(db, user_id, parsed_items)
+    await db.commit()
+    speculative.invalidate(user_id)
+    background_tasks.add_task(speculative.pregenerate, user_id)
+    return {"status": "Success", "items_added": len(added_items), "items_merged": len(merged_items), "details": parsed_items}
+
+# Pages of one batch OCR'd at the same time; more just queues up at Azure
+MAX_PARALLEL_PAGES = int(os.getenv("MAX_PARALLEL_BILL_PAGES", "4"))
+
+def dedupe_bill_pages(pages: List[List[Dict]]) -> List[Dict]:
+    """
+    Overlapping photos of one long receipt repeat the lines at the seams.
+    An identical line (name, qty, unit, price) counts as many times as it
+    appears on any single page, not the sum over pages.
+    """
+    kept, best_count = {}, {}
+    for page in pages:
+        counts = {}
+        for item in page:
+            key = (item["name"].lower(), item.get("quantity"), item.get("unit"), item.get("price"))
+            counts[key] = counts.get(key, 0) + 1
+            kept.setdefault(key, item)
+        for key, n in counts.items():
+            best_count[key] = max(best_count.get(key, 0), n)
+    return [kept[key] for key, n in best_count.items() for _ in range(n)]
+
+@app.post("/inventory/scan-bills")
+async def scan_bills(
+    background_tasks: BackgroundTasks,
+    user_id: int = Body(...),
+    files: List[UploadFile] = File(...),
+    overlapping: bool = Body(True),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Batch OCR: several photos of one long receipt (overlapping=True) or several
+    separate receipts (overlapping=False). Pages are read concurrently and all
+    rows land in one transaction.
+    """
+    images = await uploads.spool_batch(files)
+    gate = asyncio.Semaphore(MAX_PARALLEL_PAGES)
+
+    async def read_page(image):
+        async with gate:
+            return await asyncio.to_thread(ai_chef.parse_grocery_bill, image)
+
+    # Wall time ~ the slowest page, not the sum of pages
+    pages = await asyncio.gather(*(read_page(img) for img in images))
+    pages = [[catalog.canonicalize_item(i) for i in page] for page in pages]
+    parsed_items = dedupe_bill_pages(pages) if overlapping else [i for page in pages for i in page]
+
+    added_items, merged_items = await merge_bill_items(db, user_id, parsed_items)
+    await db.commit()
+    speculative.invalidate(user_id)
+    background_tasks.add_task(speculative.pregenerate, user_id)
+    return {
+        "status": "Success", "pages": len(images), "items_added": len(added_items),
+        "items_merged": len(merged_items), "details": parsed_items
+    }
+
+@app.get("/inventory/{user_id}", response_model=schemas.InventoryPage)
+async def get_inventory(
+    user_id: int,
+    cursor: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=500),
+    category: Optional[str] = None,
+    is_exhausted: Optional[bool] = None,
+    expires_after: Optional[datetime] = None,
+    expires_before: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Fetches user's current pantry, one keyset page at a time (ordered by id).
+    Pass the returned next_cursor back as `cursor` for the following page.
+    """
+    q = select(models.InventoryDB).where(models.InventoryDB.user_id == user_id)
+    if cursor is not None: q = q.where(models.InventoryDB.id > cursor)
+    if category is not None: q = q.where(models.InventoryDB.category == category)
+    if is_exhausted is not None: q = q.where(models.InventoryDB.is_exhausted == is_exhausted)
+    if expires_after is not None: q = q.where(models.InventoryDB.expiry_date >= expires_after)
+    if expires_before is not None: q = q.where(models.InventoryDB.expiry_date < expires_before)
+
+    # One extra row tells us whether another page exists without a COUNT(*)
+    rows = (await db.scalars(q.order_by(models.InventoryDB.id).limit(limit + 1))).all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return {"items": rows[:limit], "next_cursor": next_cursor}
 
 @app.post("/inventory/consume")
 def consume_inventory(request: schemas.ConsumeRequest, db: Session = Depends(get_db)):
     """Manual deduction endpoint."""
     user_inventory = db.query(models.InventoryDB).filter(models.InventoryDB.user_id == request.user_id).all()
-    updated_items = []
-    for recipe_item in request.ingredients:
-        clean_recipe_item = recipe_item.lower()
-        for db_item in user_inventory:
-            if db_item.name.lower() in clean_recipe_item:
-                db_item.quantity -= 1.0 
-                updated_items.append(db_item.name)
-                if db_item.quantity <= 0:
-                    db_item.is_exhausted = True
-                break 
+    updated_items = apply_deductions(user_inventory, request.ingredients)
     db.commit()
+    speculative.invalidate(request.user_id)
     return {"status": "success", "deducted": updated_items}
 
 @app.get("/inventory/shopping-list/{user_id}", response_model=schemas.ShoppingListResponse)
@@ -202,144 +475,254 @@ def generate_shopping_list(user_id: int, db: Session = Depends(get_db)):
     ).all()
     
     list_items = [schemas.ShoppingItem(name=i.name, suggested_qty=1, reason="Running Low") for i in low_stock]
-    
+
+    today = datetime.utcnow().date()
+    spend = budget.summarize(db.scalars(budget.summary_query(user_id, today)).all(), user.weekly_budget, today)
+    headroom = spend["headroom"]
+    # Weekly budget already spent: restock only, no extras
+    if headroom is not None and headroom <= 0:
+        return {"shopping_list": list_items, "budget_headroom": headroom}
+
     if user.persona == "gym_bro":
         list_items.append(schemas.ShoppingItem(name="Chicken Breast", suggested_qty=1, reason="Core Protein Source"))
         list_items.append(schemas.ShoppingItem(name="Whey Protein", suggested_qty=1, reason="Post-Workout Essential"))
     elif user.persona == "indian_mom":
         list_items.append(schemas.ShoppingItem(name="Ghee", suggested_qty=0.5, reason="Flavor Essential"))
         
-    return {"shopping_list": list_items}
+    return {"shopping_list": list_items, "budget_headroom": headroom}
 
 # ==========================================
 # 3. RECIPES & PLANNING
 # ==========================================
 
 @app.post("/recipes/generate", response_model=schemas.RecipeResponse)
-def generate_recipe(req: schemas.RecipeRequest, db: Session = Depends(get_db)):
-    user = db.query(models.UserDB).filter(models.UserDB.id == req.user_id).first()
-    pantry_items = [i.name for i in user.inventory if not i.is_exhausted]
-    expiring = pantry_items[:2] if len(pantry_items) > 5 else []
-
-    recipe_json = ai_chef.ask_chef_json(
-        ingredients=pantry_items,
-        expiring_items=expiring,
-        preferences=user.dietary_preferences,
-        dietary_goal=user.health_goal,
-        allergies=user.allergies,
-        meal_type=req.meal_type,
-        portion_multiplier=user.portion_multiplier, 
-        effort_level=req.effort_level,
-        persona=user.persona
+async def generate_recipe(req: schemas.RecipeRequest, db: AsyncSession = Depends(get_async_db)):
+    speculative.note_request(req.user_id, req.meal_type, req.effort_level)
+    # Pre-generated in the background for exactly this meal? Serve it instantly.
+    if not req.craving:
+        warm = await speculative.take(db, req.user_id, req.meal_type, req.effort_level)
+        if warm: return await recipe_store.save(db, warm)
+
+    user, inputs = await speculative.load_recipe_inputs(db, req.user_id)
+    if not user: raise HTTPException(status_code=404, detail="User not found")
+    # Hand the connection back to the pool while the model thinks
+    await db.close()
+
+    recipe_json = await asyncio.to_thread(
+        ai_chef.ask_chef_json, meal_type=req.meal_type, effort_level=req.effort_level, **inputs
     )
-    return recipe_json
+    return await recipe_store.save(db, recipe_json)
+
+@app.get("/recipes/cook-now/{user_id}", response_model=List[schemas.CookNowItem])
+async def cook_now_ranking(user_id: int, k: int = Query(10, ge=1, le=100), db: AsyncSession = Depends(get_async_db)):
+    """Stored recipes ranked by how much of them the pantry already covers. No model call."""
+    await cook_now.refresh()
+    pantry = (await db.execute(
+        select(models.InventoryDB.name, models.InventoryDB.expiry_date)
+        .where(models.InventoryDB.user_id == user_id, models.InventoryDB.is_exhausted == False, models.InventoryDB.quantity > 0)
+    )).all()
+    return cook_now.INDEX.rank(pantry, k)
+
+@app.get("/recipes/{recipe_id}", response_model=schemas.RecipeResponse)
+async def get_recipe(recipe_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Saved recipes never change, so they are served from the in-process LRU after the first read."""
+    recipe = await recipe_store.get(db, recipe_id)
+    if not recipe: raise HTTPException(status_code=404, detail="Recipe not found")
+    return recipe
+
+def pantry_names(db: Session, user_id: int) -> List[str]:
+    return [name for (name,) in db.query(models.InventoryDB.name).filter(models.InventoryDB.user_id == user_id)]
 
 @app.post("/recipes/search")
 def search_smart(request: schemas.SearchRequest, db: Session = Depends(get_db)):
-    user = db.query(models.UserDB).filter(models.UserDB.id == request.user_id).first()
-    pantry = [i.name for i in user.inventory]
+    if not profiles.get_sync(db, request.user_id): raise HTTPException(status_code=404, detail="User not found")
+    pantry = pantry_names(db, request.user_id)
     return ai_chef.search_recipes_smart(request.query, pantry)
 
 @app.post("/generate-day-plan")
 def daily_plan(user_id: int = Body(..., embed=True), db: Session = Depends(get_db)):
-    user = db.query(models.UserDB).filter(models.UserDB.id == user_id).first()
-    pantry = [i.name for i in user.inventory]
-    return ai_chef.generate_daily_plan(pantry, user.dietary_preferences, user.health_goal)
+    user = profiles.get_sync(db, user_id)
+    if not user: raise HTTPException(status_code=404, detail="User not found")
+    return ai_chef.generate_daily_plan(pantry_names(db, user_id), user["dietary_preferences"], user["health_goal"])
 
 # ==========================================
 # 4. MENTOR LOOP (The "Cook With Me" Mode)
 # ==========================================
 
+def start_step_timer(session: Dict) -> None:
+    """Arms the timer for whichever step is current now (replacing the previous step's)."""
+    if not session["steps"]: return
+    idx = session["current_step_index"]
+    timers.scheduler.start_step(session["id"], idx, intents.step_seconds(session), session["steps"][idx])
+
 @app.post("/mentor/start")
-def start_session(req: schemas.SessionStart):
-    session_id = len(active_sessions) + 1
+async def start_session(req: schemas.SessionStart, db: AsyncSession = Depends(get_async_db)):
+    """Pass recipe_id (from /recipes/generate) instead of resending the title and steps."""
+    title, steps, durations = req.recipe_title, req.steps, req.step_durations
+    if req.recipe_id is not None:
+        recipe = await recipe_store.get(db, req.recipe_id)
+        if not recipe: raise HTTPException(status_code=404, detail="Recipe not found")
+        title = title or recipe["title"]
+        if not steps:
+            steps = [s.get("instruction", "") if isinstance(s, dict) else str(s) for s in recipe["steps"]]
+            durations = [s.get("duration_seconds", 0) if isinstance(s, dict) else 0 for s in recipe["steps"]]
+    title = title or "Recipe"
+
+    session_id = next(session_ids)
     active_sessions[session_id] = {
+        "id": session_id,
         "user_id": req.user_id,
-        "recipe": req.recipe_title,
-        "steps": req.steps, 
+        "recipe": title,
+        "recipe_id": req.recipe_id,
+        "steps": steps, 
+        "durations": durations,
         "current_step_index": 0,
         "start_time": datetime.utcnow()
     }
-    first_instruction = req.steps[0] if req.steps else "Ready to cook!"
-    return {"session_id": session_id, "message": first_instruction, "audio_intro": f"Starting {req.recipe_title}. {first_instruction}"}
+    start_step_timer(active_sessions[session_id])
+    first_instruction = steps[0] if steps else "Ready to cook!"
+    return {"session_id": session_id, "message": first_instruction, "audio_intro": f"Starting {title}. {first_instruction}", "steps": steps}
 
 @app.post("/mentor/chat")
-def chat_with_mentor(user_id: int = Body(...), message: str = Body(...), audio_url: Optional[str] = Body(None)):
+def chat_with_mentor(
+    user_id: int = Body(...),
+    message: str = Body(...),
+    audio_url: Optional[str] = Body(None),
+    stream: bool = Body(False)
+):
+    """
+    Navigation, timers, amounts, swaps and safety are answered locally by the intent
+    router. Anything else goes to the model; stream=true sends its words as they come.
+    """
     session = next((s for s in active_sessions.values() if s["user_id"] == user_id), None)
-    msg = message.lower()
-    
-    if session:
-        steps = session["steps"]
-        idx = session["current_step_index"]
-        if "next" in msg or "done" in msg:
-            if idx < len(steps) - 1:
-                session["current_step_index"] += 1
-                return {"reply": steps[session["current_step_index"]]}
-            return {"reply": "You have finished all steps! Enjoy your meal."}
-        elif "previous" in msg or "back" in msg:
-            if idx > 0:
-                session["current_step_index"] -= 1
-                return {"reply": steps[session["current_step_index"]]}
-    
-    # Advanced Contextual AI logic
-    if "salt" in msg: return {"reply": "Add about 1 teaspoon of salt, or to taste."}
-    if "substitute" in msg: return {"reply": "You can use butter instead of oil if you prefer."}
-    if "burnt" in msg: return {"reply": "Turn off heat immediately and move to a cool burner!"}
-    
-    return {"reply": f"I'm listening. The current recipe is {session['recipe'] if session else 'not started'}."}
+    step_before = session["current_step_index"] if session else None
+    routed = intents.route(message, session)
+    if routed and routed.reply:
+        if session and session["current_step_index"] != step_before: start_step_timer(session)
+        return {"reply": routed.reply, "intent": routed.intent}
+
+    step = session["steps"][session["current_step_index"]] if session and session["steps"] else None
+    chunks = ai_chef.stream_mentor_reply(
+        message, session["recipe"] if session else None, step, routed.intent if routed else None
+    )
+    if stream: return StreamingResponse(chunks, media_type="text/plain; charset=utf-8")
+    return {"reply": "".join(chunks), "intent": routed.intent if routed else "open_question"}
+
+@app.get("/mentor/{session_id}/events")
+async def session_events(session_id: int, last_event_id: int = Header(0, alias="Last-Event-ID")):
+    """
+    Server-Sent Events: step_due when the current step's duration_seconds runs out,
+    timer_due for timers set in chat, session_ended at /mentor/end. Reconnect with
+    Last-Event-ID to get what fired while the app was in the background.
+    """
+    if session_id not in active_sessions: raise HTTPException(status_code=404, detail="Session not active")
+    return StreamingResponse(
+        timers.scheduler.events(session_id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-@app.post("/mentor/guardian-check")
+@app.post("/mentor/guardian-check", response_model=schemas.GuardianCheckResponse)
 async def guardian_check(session_id: int = Body(...), instruction: str = Body(...), file: UploadFile = File(...)):
-    img_bytes = await file.read()
-    base64_img = ai_chef.encode_image(img_bytes)
-    return {"analysis": ai_chef.analyze_cooking_progress(base64_img, instruction)}
+    image = await uploads.spool_upload(file)
+    # Local pixel heuristics first; only ambiguous frames pay for GPT-4o
+    result = await asyncio.to_thread(guardian.analyze_frame, image, instruction, session_id)
+    source = "local"
+    if result is None:
+        result = await vision.check_cooking_progress(image, instruction)
+        source = "model"
+    return {"analysis": result.get("message", ""), "status": result.get("status", "error"),
+            "correction": result.get("correction", "None"), "source": source}
 
 @app.post("/mentor/end")
-def end_session(req: schemas.SessionEnd, db: Session = Depends(get_db)):
+def end_session(req: schemas.SessionEnd, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     if req.session_id not in active_sessions:
         return {"status": "Completed", "new_xp": 0}
 
     data = active_sessions.pop(req.session_id)
+    timers.scheduler.end_session(req.session_id)
     user = db.query(models.UserDB).filter(models.UserDB.id == data["user_id"]).first()
     
     # 1. INVENTORY DEDUCTION (The Supply Chain)
     updates_made = 0
     if req.ingredients_consumed:
-        for ing in req.ingredients_consumed:
-            for item in user.inventory:
-                if item.name.lower() in ing.lower():
-                    item.quantity -= 1.0
-                    if item.quantity <= 0:
-                        item.quantity = 0
-                        item.is_exhausted = True
-                    updates_made += 1
-                    break
+        updates_made = len(apply_deductions(user.inventory, req.ingredients_consumed))
     
     # 2. PORTION SELF-CORRECTION (The Learning Loop)
+    # They ate the portion they cooked; the correction is for next time
+    eaten_multiplier = user.portion_multiplier
     if req.leftovers:
         user.portion_multiplier = max(0.5, user.portion_multiplier * 0.9)
     elif req.rating < 3:
         user.portion_multiplier = min(3.0, user.portion_multiplier * 1.05)
 
-    # 3. SAVE SESSION & XP
+    # 3. NUTRITION: stored macros are per standard portion (the prompt asks for 1x), scaled to what was eaten
+    recipe_id = data.get("recipe_id")
+    recipe = recipe_store.cached(recipe_id) if recipe_id else None
+    if recipe_id and not recipe:
+        row = db.get(models.RecipeDB, recipe_id)
+        recipe = recipe_store.as_response(row) if row else None
+    macros = nutrition.scale_macros(recipe["macros"], eaten_multiplier) if recipe else None
+
+    # 4. SAVE SESSION & XP (XP, streak, badges and nutrition rollups are applied write-behind by the aggregator)
+    now = datetime.utcnow()
     db_session = models.CookingSessionDB(
         user_id=data["user_id"], recipe_title=data["recipe"], 
-        start_time=data["start_time"], end_time=datetime.utcnow(), 
+        recipe_id=recipe["id"] if recipe else None, macros_json=macros,
+        start_time=data["start_time"], end_time=now, 
         status="completed", rating=req.rating, leftovers=req.leftovers
     )
-    user.xp_points += 10
-    user.current_streak += 1
-    
-    # 4. BADGES
-    earned_badges = []
-    if user.current_streak == 3:
-        db.add(models.UserBadgeDB(user_id=user.id, badge_name="Streak Master", description="Cooked 3 days in a row!"))
-        earned_badges.append("Streak Master")
-
     db.add(db_session)
+    gamification.record_session_completed(db, user.id, now, macros)
+    progress = gamification.project_progress(user, now)
+    version = profiles.bump(db, [user.id])[user.id]
+    portion_multiplier = user.portion_multiplier
     db.commit()
+    profiles.update(user.id, version, portion_multiplier=portion_multiplier)
+    # Pantry and portion size just changed; next meal gets a fresh speculative recipe
+    speculative.invalidate(user.id)
+    background_tasks.add_task(speculative.pregenerate, user.id)
     
-    return {"status": "Completed", "new_xp": user.xp_points, "badges_earned": earned_badges}
+    return {"status": "Completed", "new_xp": progress["xp"], "inventory_updates": updates_made, "badges_earned": progress["badges"]}
+
+# ==========================================
+# 5. MAINTENANCE
+# ==========================================
+
+@app.post("/admin/compact-inventory")
+def compact_inventory(retention_days: int = compaction.RETENTION_DAYS):
+    """Runs one compaction pass now and reports rows reclaimed and time spent."""
+    return compaction.run_compaction(retention_days)
+
+@app.get("/admin/circuits")
+def circuit_status():
+    """State of each upstream circuit breaker in this worker."""
+    return {name: b.snapshot() for name, b in resilience.breakers.items()}
+
+@app.get("/admin/caches")
+def cache_status():
+    return {"recipes": recipe_store.stats(), "profiles": profiles.stats(), "cook_now": cook_now.INDEX.stats()}
+
+@app.get("/admin/idempotency")
+def idempotency_status():
+    return idempotency.stats()
+
+@app.get("/admin/timers")
+def timer_status():
+    return timers.scheduler.stats()
+
+@app.get("/admin/profiles")
+def list_profiles():
+    """Most recent request profiles first (metadata only)."""
+    return [profiling.summary(p) for p in reversed(profiling.recent)]
+
+@app.get("/admin/profiles/{profile_id}")
+def get_profile(profile_id: int, format: str = Query("speedscope", pattern="^(speedscope|collapsed)$")):
+    """One profile as speedscope JSON (open in speedscope.app) or folded stacks for flamegraph.pl."""
+    profile = profiling.get(profile_id)
+    if not profile: raise HTTPException(status_code=404, detail="Profile not found (evicted or never taken)")
+    if format == "collapsed": return PlainTextResponse(profiling.collapsed(profile))
+    return profiling.speedscope(profile)
 
 @app.get("/")
 def health_check():
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, JSON, Text
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Date, Boolean, JSON, Text, LargeBinary, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -38,6 +38,7 @@ class UserDB(Base):
     # --- GAMIFICATION ---
     xp_points = Column(Integer, default=0)
     current_streak = Column(Integer, default=0)
+    last_cooked_on = Column(Date, nullable=True)
     
     # --- RELATIONSHIPS (The Fix is Here) ---
     # These strings MUST match the property names in the other classes exactly.
@@ -48,9 +49,13 @@ class UserDB(Base):
 
 class InventoryDB(Base):
     __tablename__ = "inventory"
+    __table_args__ = (
+        Index("ix_inventory_user_category", "user_id", "category"),
+        Index("ix_inventory_user_expiry", "user_id", "expiry_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     
     name = Column(String, index=True)
     quantity = Column(Float)
@@ -59,12 +64,30 @@ class InventoryDB(Base):
     
     price_per_unit = Column(Float, default=0.0)
     expiry_date = Column(DateTime, nullable=True)
-    is_exhausted = Column(Boolean, default=False)
+    is_exhausted = Column(Boolean, default=False, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # MATCHING RELATIONSHIP
     user = relationship("UserDB", back_populates="inventory")
 
 
+class InventoryArchiveDB(Base):
+    """Exhausted pantry rows moved out of the hot table by the compaction job."""
+    __tablename__ = "inventory_archive"
+
+    id = Column(Integer, primary_key=True, index=True)
+    original_id = Column(Integer)
+    user_id = Column(Integer, index=True)
+    name = Column(String)
+    quantity = Column(Float)
+    unit = Column(String)
+    category = Column(String)
+    price_per_unit = Column(Float)
+    expiry_date = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
 class UserBadgeDB(Base):
     __tablename__ = "user_badges"
     
@@ -80,10 +103,16 @@ class UserBadgeDB(Base):
 
 class CookingSessionDB(Base):
     __tablename__ = "sessions"
+    __table_args__ = (
+        Index("ix_sessions_user_start", "user_id", "start_time"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     recipe_title = Column(String)
+    recipe_id = Column(Integer, ForeignKey("recipes.id"), nullable=True)
+    # Recipe macros x the user's portion_multiplier at the time they cooked it
+    macros_json = Column(JSON, nullable=True)
     
     start_time = Column(DateTime, default=datetime.utcnow)
     end_time = Column(DateTime, nullable=True)
@@ -98,15 +127,94 @@ class CookingSessionDB(Base):
     # MATCHING RELATIONSHIP
     user = relationship("UserDB", back_populates="sessions")
 
+class GamificationEventDB(Base):
+    """Append-only XP/streak log. Written by /mentor/end, folded into users by the aggregator."""
+    __tablename__ = "gamification_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    event_type = Column(String)
+    xp_delta = Column(Integer, default=0)
+    cooked_on = Column(Date)
+    macros_json = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    applied_at = Column(DateTime, nullable=True, index=True)
+
+class NutritionRollupDB(Base):
+    """Per-user macro totals per day and per ISO week, kept up to date by the gamification aggregator."""
+    __tablename__ = "nutrition_rollups"
+    __table_args__ = (
+        UniqueConstraint("user_id", "period", "period_start", name="uq_rollup_user_period"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    period = Column(String)  # "day" | "week"
+    period_start = Column(Date)
+    protein = Column(Float, default=0.0)
+    carbs = Column(Float, default=0.0)
+    fats = Column(Float, default=0.0)
+    sessions = Column(Integer, default=0)
+
+class SpendLedgerDB(Base):
+    """Append-only grocery spend, one row per purchased line."""
+    __tablename__ = "spend_ledger"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    item_name = Column(String)
+    amount = Column(Float)
+    source = Column(String)  # "manual" | "scan"
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class SpendBucketDB(Base):
+    """Spend counters per user per day and per month, bumped as ledger rows are written."""
+    __tablename__ = "spend_buckets"
+    __table_args__ = (
+        UniqueConstraint("user_id", "period", "period_start", name="uq_spend_user_period"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    period = Column(String)  # "day" | "month"
+    period_start = Column(Date)
+    total = Column(Float, default=0.0)
+
 # (Note: RecipeDB doesn't need relationships for now as it's standalone)
 class RecipeDB(Base):
     __tablename__ = "recipes"
     
     id = Column(Integer, primary_key=True, index=True)
+    # sha256 of the canonical recipe JSON: identical generations share one row
+    content_hash = Column(String(64), unique=True, index=True, nullable=True)
     title = Column(String)
     ingredients_json = Column(JSON) 
     steps_json = Column(JSON) 
     macros_json = Column(JSON) 
+    chef_comment = Column(Text, nullable=True)
     effort_level = Column(String) 
     image_url = Column(String, nullable=True) 
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class IdempotencyKeyDB(Base):
+    """One row per Idempotency-Key: claimed when the original request starts, filled with its response when it completes."""
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String, primary_key=True)  # "METHOD /path <header value>"
+    status_code = Column(Integer, nullable=True)  # None while the original is still in flight
+    headers_json = Column(JSON, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    request_hash = Column(String, nullable=True)  # sha256 of query string + body: the key is bound to this request
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=True, index=True)
+
+
+class ProfileInvalidationDB(Base):
+    """Cross-worker channel for the profile cache: one row per profile write, its id is the profile's new version."""
+    __tablename__ = "profile_invalidations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+from datetime import datetime, date
 from enum import Enum
 
 # --- ENUMS ---
@@ -66,6 +66,10 @@ class InventoryResponse(InventoryCreate):
     class Config:
         from_attributes = True
 
+class InventoryPage(BaseModel):
+    items: List[InventoryResponse]
+    next_cursor: Optional[int] = None
+
 class ShoppingItem(BaseModel):
     name: str
     suggested_qty: float
@@ -73,6 +77,7 @@ class ShoppingItem(BaseModel):
 
 class ShoppingListResponse(BaseModel):
     shopping_list: List[ShoppingItem]
+    budget_headroom: Optional[float] = None  # None when no weekly_budget is set
 
 # 🚨 ADDED THIS CLASS TO FIX YOUR ERROR
 class ConsumeRequest(BaseModel):
@@ -104,6 +109,15 @@ class RecipeResponse(BaseModel):
     effort_level: str
     image_prompt: Optional[str] = None
 
+class CookNowItem(BaseModel):
+    recipe_id: int
+    title: str
+    coverage: float           # share of the recipe's ingredients already in the pantry (staples excluded)
+    missing_count: int
+    missing: List[str]
+    expiring_used: int        # pantry items expiring soon that the recipe would use up
+    ingredient_count: int
+
 class SearchRequest(BaseModel):
     user_id: int
     query: str
@@ -121,8 +135,10 @@ class DayPlanRequest(BaseModel):
 # ==========================================
 class SessionStart(BaseModel):
     user_id: int
-    recipe_title: str
+    recipe_title: Optional[str] = None
     steps: List[str] = []
+    recipe_id: Optional[int] = None  # Saved recipe: title, steps and durations are loaded from it
+    step_durations: List[int] = []  # CookingStep.duration_seconds, aligned with steps (0 = unknown)
 
 class SessionEnd(BaseModel):
     session_id: int
@@ -130,6 +146,51 @@ class SessionEnd(BaseModel):
     leftovers: bool 
     ingredients_consumed: List[str] = [] 
 
+class SessionHistoryItem(BaseModel):
+    id: int
+    recipe_title: Optional[str] = None
+    recipe_id: Optional[int] = None
+    macros_json: Optional[Dict[str, float]] = None
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    status: str
+    rating: Optional[int] = None
+    leftovers: bool = False
+
+    class Config:
+        from_attributes = True
+
+class SessionHistoryPage(BaseModel):
+    items: List[SessionHistoryItem]
+    next_cursor: Optional[int] = None
+
+class NutritionBucket(BaseModel):
+    period_start: date
+    protein: float
+    carbs: float
+    fats: float
+    sessions: int
+
+    class Config:
+        from_attributes = True
+
+class NutritionResponse(BaseModel):
+    period: str
+    buckets: List[NutritionBucket]
+    totals: Dict[str, float]
+
+class SpendDay(BaseModel):
+    day: date
+    total: float
+
+class BudgetResponse(BaseModel):
+    weekly_budget: float
+    spent_7d: float
+    spent_month: float
+    headroom: Optional[float] = None  # weekly_budget - spent_7d; None when no budget is set
+    month_start: date
+    days: List[SpendDay]
+
 class SubstituteRequest(BaseModel):
     user_id: int
     ingredient: str
@@ -137,4 +198,6 @@ class SubstituteRequest(BaseModel):
 
 class GuardianCheckResponse(BaseModel):
     analysis: str
-    status: str
\ No newline at end of file
+    status: str
+    correction: str = "None"
+    source: str = "model"  # "local" when the CPU pre-filter was decisive
\ No newline at end of file
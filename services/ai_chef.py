@@ -6,6 +6,8 @@ from pathlib import Path
 from openai import AzureOpenAI
 from dotenv import load_dotenv
 
+from services import prompt_builder, quantity, resilience, uploads
+
 # --- CONFIGURATION ---
 env_path = Path(__file__).resolve().parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
@@ -14,17 +16,23 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # --- CLIENT INITIALIZATION ---
+DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
 try:
     client_main = AzureOpenAI(
         azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
         api_key=os.getenv("AZURE_OPENAI_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview"),
+        # A retry after a timeout would run past the request deadline; the breakers handle outages
+        max_retries=0
     )
-    DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
 except Exception as e:
     logger.error(f"Azure Client Init Failed: {e}")
     client_main = None
 
+def chat_completion(operation: str, **kwargs):
+    """client_main.chat.completions.create behind `operation`'s circuit breaker, bounded by the request deadline."""
+    return resilience.call(operation, client_main.chat.completions.create, model=DEPLOYMENT_NAME, **kwargs)
+
 def encode_image(image_bytes: bytes) -> str:
     return base64.b64encode(image_bytes).decode('utf-8')
 
@@ -38,10 +46,11 @@ def get_persona_prompt(persona: str) -> str:
     return p_map.get(persona, "ROLE: Helpful Chef.")
 
 # --- 1. BILL SCANNER (OCR) ---
-def parse_grocery_bill(image_bytes: bytes):
+def parse_grocery_bill(image):
+    """image: raw bytes or a (spooled) file object."""
     if not client_main: return []
     try:
-        base64_img = encode_image(image_bytes)
+        image_url = uploads.image_data_url(image)
         system_msg = "You are an Inventory Clerk. Extract grocery items from this receipt image."
         user_msg = """
         Analyze this bill. Return a JSON list of items.
@@ -49,13 +58,13 @@ def parse_grocery_bill(image_bytes: bytes):
         RETURN JSON FORMAT:
         { "items": [ {"name": "Milk", "quantity": 1, "unit": "Litre", "price": 45.0, "expiry_days": 3, "category": "Dairy"} ] }
         """
-        response = client_main.chat.completions.create(
-            model=DEPLOYMENT_NAME,
+        response = chat_completion(
+            "bill_scan",
             messages=[
                 {"role": "system", "content": system_msg},
                 {"role": "user", "content": [
                     {"type": "text", "text": user_msg},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_img}"}}
+                    {"type": "image_url", "image_url": {"url": image_url}}
                 ]}
             ],
             response_format={"type": "json_object"}
@@ -68,6 +77,23 @@ def parse_grocery_bill(image_bytes: bytes):
 
 # --- 2. INVENTORY DEDUCTION ---
 def calculate_deductions(recipe_ingredients: list, current_inventory: list):
+    """
+    Local unit engine first; only strings it can't parse go to the LLM.
+    current_inventory: [{"id", "name", "quantity", "unit"}]
+    """
+    deductions, unresolved = quantity.local_deductions(recipe_ingredients, current_inventory)
+    if not unresolved: return deductions
+
+    llm_deductions = _llm_deductions([ing for ing, _ in unresolved], [item for _, item in unresolved])
+    deductions.extend(llm_deductions)
+
+    # No parsable amount and no LLM answer ("Salt to taste"): leave the stock alone rather than guess
+    covered = {d.get("inventory_id") for d in llm_deductions}
+    skipped = [ing for ing, item in unresolved if item["id"] not in covered]
+    if skipped: logger.warning(f"Deduction skipped, no amount for: {skipped}")
+    return deductions
+
+def _llm_deductions(recipe_ingredients: list, current_inventory: list):
     if not client_main: return []
     try:
         prompt = f"""
@@ -76,8 +102,8 @@ def calculate_deductions(recipe_ingredients: list, current_inventory: list):
         Task: Match ingredients and calculate how much to SUBTRACT from the inventory.
         Return a JSON list: {{ "deductions": [{{"inventory_id": 12, "decrement_amount": 2}}] }}
         """
-        response = client_main.chat.completions.create(
-            model=DEPLOYMENT_NAME,
+        response = chat_completion(
+            "deductions",
             messages=[{"role": "system", "content": "You are a Supply Chain Algorithm. JSON Output."}, {"role": "user", "content": prompt}],
             response_format={"type": "json_object"}
         )
@@ -86,38 +112,22 @@ def calculate_deductions(recipe_ingredients: list, current_inventory: list):
         return []
 
 # --- 3. RECIPE GENERATION ---
-def ask_chef_json(ingredients: list, expiring_items: list, preferences: list, dietary_goal: str, allergies: list, meal_type: str, portion_multiplier: float, effort_level: str, persona: str):
+def ask_chef_json(ingredients: list, expiring_items: list, preferences: list, dietary_goal: str, allergies: list, meal_type: str, portion_multiplier: float, effort_level: str, persona: str, spend_headroom: float = None):
     if not client_main: return get_fallback_recipe()
 
     try:
         system_msg = f"{get_persona_prompt(persona)}. You output ONLY valid JSON."
-        user_prompt = f"""
-        Generate a {meal_type} recipe.
-        - Inventory: {', '.join(ingredients)}
-        - Goal: {dietary_goal}
-        - Scale: {portion_multiplier}x portion.
-        - Effort: {effort_level}
-
-        RETURN JSON EXACTLY LIKE THIS:
-        {{
-            "title": "Dish Name",
-            "chef_comment": "Intro",
-            "ingredients": [{{"name": "Item", "qty": "Amount"}}],
-            "macros": {{"protein": 0, "carbs": 0, "fats": 0}},
-            "effort_level": "{effort_level}",
-            "steps": [
-                {{
-                    "step_number": 1,
-                    "instruction": "Do X",
-                    "duration_seconds": 60,
-                    "requires_visual_check": false
-                }}
-            ]
-        }}
-        """
+        user_prompt, stats = prompt_builder.build_recipe_prompt(
+            ingredients, expiring_items, preferences, dietary_goal, allergies,
+            meal_type, portion_multiplier, effort_level, persona, spend_headroom=spend_headroom
+        )
+        logger.info(
+            f"Recipe prompt: {stats['tokens']} tokens ({stats['saved_tokens']} saved vs full pantry), "
+            f"{stats['items_used']}/{stats['items_total']} pantry items"
+        )
 
-        response = client_main.chat.completions.create(
-            model=DEPLOYMENT_NAME,
+        response = chat_completion(
+            "recipe",
             messages=[{"role": "system", "content": system_msg}, {"role": "user", "content": user_prompt}],
             temperature=0.7,
             response_format={"type": "json_object"}
@@ -133,8 +143,8 @@ def get_substitute_suggestion(missing_item: str, dish_context: str):
     if not client_main: return {"substitute": "Water", "advice": "AI Offline"}
     try:
         prompt = f"Substitute for {missing_item} in {dish_context}? Return JSON {{'substitute': '...', 'advice': '...'}}"
-        response = client_main.chat.completions.create(
-            model=DEPLOYMENT_NAME,
+        response = chat_completion(
+            "substitute",
             messages=[{"role": "user", "content": prompt}],
             response_format={"type": "json_object"}
         )
@@ -142,6 +152,35 @@ def get_substitute_suggestion(missing_item: str, dish_context: str):
     except Exception:
         return {"substitute": "Skip it", "advice": "Just omit this ingredient."}
 
+MENTOR_OFFLINE_REPLY = "I can't think that one through right now. Keep following the current step and trust your eyes and nose."
+
+def stream_mentor_reply(message: str, recipe: str = None, step: str = None, intent: str = None):
+    """Yields the mentor's answer as the model writes it, for open-ended questions the intent router can't answer."""
+    if not client_main:
+        yield MENTOR_OFFLINE_REPLY
+        return
+    context = f"Cooking: {recipe or 'nothing yet'}. Current step: {step or 'none'}."
+    if intent: context += f" The user is asking about: {intent.replace('_', ' ')}."
+    sent = False
+    try:
+        stream = chat_completion(
+            "mentor",
+            messages=[
+                {"role": "system", "content": f"You are a friendly cooking mentor. Answer in 1-3 short spoken sentences. {context}"},
+                {"role": "user", "content": message}
+            ],
+            max_tokens=150,
+            temperature=0.6,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                sent = True
+                yield chunk.choices[0].delta.content
+    except Exception as e:
+        logger.error(f"Mentor Chat Failed: {e}")
+        if not sent: yield MENTOR_OFFLINE_REPLY
+
 def get_fallback_recipe():
     return {
         "title": "Emergency Pasta (AI Offline)",
@@ -163,7 +202,7 @@ async def analyze_pantry_vision_api(image_bytes: bytes):
     
     async with httpx.AsyncClient() as client:
         try:
-            response = await client.post(url, headers=headers, content=image_bytes)
+            response = await resilience.call_async("pantry_vision", client.post, url, headers=headers, content=image_bytes)
             if response.status_code == 200:
                 data = response.json()
                 return [t["name"] for t in data.get("tagsResult", {}).get("values", []) if t["confidence"] > 0.5]
@@ -171,9 +210,6 @@ async def analyze_pantry_vision_api(image_bytes: bytes):
             pass
     return ["Mock Item"] 
 
-def analyze_cooking_progress(image_base64: str, instruction: str):
-    return "Safe to proceed. Looks delicious."
-
 def search_recipes_smart(query: str, inventory: list):
     return [{"title": "Pantry Special", "match_score": 90}]
 
@@ -0,0 +1,66 @@
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select, and_, or_
+
+import models
+from database import increment_upsert
+
+# --- CONFIGURATION ---
+ROLLING_DAYS = 7
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+# --- WRITE SIDE ---
+def ledger_writes(user_id: int, lines: list, source: str, when: datetime = None):
+    """
+    Append-only spend for one purchase: (ledger rows, bucket upserts).
+    `lines` are (item_name, amount); zero-priced lines are skipped. The caller
+    adds the rows and executes the upserts in its own transaction, so the
+    counters move with the pantry write (sync or async session alike).
+    """
+    when = when or datetime.utcnow()
+    rows = [
+        models.SpendLedgerDB(user_id=user_id, item_name=name, amount=round(amount, 2), source=source, created_at=when)
+        for name, amount in lines if amount and amount > 0
+    ]
+    if not rows: return [], []
+    total = round(sum(r.amount for r in rows), 2)
+    table = models.SpendBucketDB.__table__
+    day = when.date()
+    bumps = [
+        increment_upsert(table, {"user_id": user_id, "period": "day", "period_start": day}, {"total": total}),
+        increment_upsert(table, {"user_id": user_id, "period": "month", "period_start": month_start(day)}, {"total": total}),
+    ]
+    return rows, bumps
+
+
+# --- READ SIDE ---
+def summary_query(user_id: int, today: date):
+    """At most ROLLING_DAYS + 1 bucket rows, however long the ledger gets."""
+    b = models.SpendBucketDB
+    return select(b).where(
+        b.user_id == user_id,
+        or_(
+            and_(b.period == "day", b.period_start > today - timedelta(days=ROLLING_DAYS), b.period_start <= today),
+            and_(b.period == "month", b.period_start == month_start(today)),
+        )
+    )
+
+
+def summarize(buckets, weekly_budget: float, today: date) -> dict:
+    days = sorted((b for b in buckets if b.period == "day"), key=lambda b: b.period_start)
+    spent_7d = round(sum(b.total or 0.0 for b in days), 2)
+    spent_month = round(sum(b.total or 0.0 for b in buckets if b.period == "month"), 2)
+    # 0 is the "never set" default: no budget means no headroom to report
+    headroom = round(weekly_budget - spent_7d, 2) if weekly_budget else None
+    return {
+        "weekly_budget": weekly_budget or 0.0,
+        "spent_7d": spent_7d,
+        "spent_month": spent_month,
+        "headroom": headroom,
+        "month_start": month_start(today),
+        "days": [{"day": b.period_start, "total": round(b.total or 0.0, 2)} for b in days],
+    }
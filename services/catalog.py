@@ -0,0 +1,220 @@
+import re
+import math
+from collections import defaultdict
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from services import quantity
+
+# --- CANONICAL PRODUCTS ---
+# (name, stock unit, category). Scanned bill lines get folded onto these.
+SEED_PRODUCTS = [
+    ("Milk", "liter", "Dairy"), ("Curd", "g", "Dairy"), ("Paneer", "g", "Dairy"),
+    ("Butter", "g", "Dairy"), ("Ghee", "liter", "Dairy"), ("Cheese", "g", "Dairy"),
+    ("Buttermilk", "liter", "Dairy"), ("Cream", "ml", "Dairy"),
+    ("Eggs", "pcs", "Protein"), ("Chicken Breast", "kg", "Protein"), ("Chicken", "kg", "Protein"),
+    ("Mutton", "kg", "Protein"), ("Fish", "kg", "Protein"), ("Tofu", "g", "Protein"),
+    ("Whey Protein", "kg", "Protein"), ("Soya Chunks", "g", "Protein"),
+    ("Rice", "kg", "Grains"), ("Basmati Rice", "kg", "Grains"), ("Atta", "kg", "Grains"),
+    ("Maida", "kg", "Grains"), ("Oats", "g", "Grains"), ("Poha", "g", "Grains"),
+    ("Bread", "pcs", "Bakery"), ("Pasta", "g", "Grains"), ("Noodles", "g", "Grains"),
+    ("Toor Dal", "kg", "Pulses"), ("Moong Dal", "kg", "Pulses"), ("Chana Dal", "kg", "Pulses"),
+    ("Masoor Dal", "kg", "Pulses"), ("Rajma", "kg", "Pulses"), ("Chickpeas", "kg", "Pulses"),
+    ("Onion", "kg", "Vegetables"), ("Tomato", "kg", "Vegetables"), ("Potato", "kg", "Vegetables"),
+    ("Garlic", "g", "Vegetables"), ("Ginger", "g", "Vegetables"), ("Green Chilli", "g", "Vegetables"),
+    ("Spinach", "g", "Vegetables"), ("Cauliflower", "pcs", "Vegetables"), ("Capsicum", "g", "Vegetables"),
+    ("Carrot", "kg", "Vegetables"), ("Peas", "g", "Vegetables"), ("Coriander", "g", "Vegetables"),
+    ("Lemon", "pcs", "Fruits"), ("Banana", "pcs", "Fruits"), ("Apple", "kg", "Fruits"),
+    ("Sunflower Oil", "liter", "Oils"), ("Mustard Oil", "liter", "Oils"), ("Olive Oil", "liter", "Oils"),
+    ("Salt", "kg", "Spices"), ("Sugar", "kg", "Spices"), ("Turmeric", "g", "Spices"),
+    ("Red Chilli Powder", "g", "Spices"), ("Garam Masala", "g", "Spices"), ("Cumin", "g", "Spices"),
+    ("Coriander Powder", "g", "Spices"), ("Tea", "g", "Beverages"), ("Coffee", "g", "Beverages"),
+]
+
+# Brand names and pack words that carry no product identity
+NOISE_WORDS = {
+    "amul", "taaza", "gold", "mother", "dairy", "nandini", "fortune", "tata", "aashirvaad",
+    "saffola", "patanjali", "britannia", "everest", "mdh", "catch", "maggi", "fresh", "pack",
+    "pouch", "packet", "pkt", "bottle", "box", "loose", "premium", "organic", "pure", "select",
+}
+
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+class Product(NamedTuple):
+    name: str
+    unit: str
+    category: str
+
+
+def _words(text: str) -> list:
+    return [w for w in _WORD_RE.findall(text.lower()) if w not in NOISE_WORDS]
+
+
+def _word_trigrams(word: str) -> frozenset:
+    padded = f" {word} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def trigrams(text: str) -> frozenset:
+    """Character trigrams per word, padded so short names ('tea') still index."""
+    grams = set()
+    for word in _words(text):
+        grams.update(_word_trigrams(word))
+    return frozenset(grams)
+
+
+def _dice(a: frozenset, b: frozenset) -> float:
+    return 2.0 * len(a & b) / (len(a) + len(b))
+
+
+def _match(words: list, product_words: list, min_score: float) -> Optional[float]:
+    """Mean best Dice of every word, both ways; None as soon as one word matches nothing."""
+    rows, backward = [], []
+    for p in product_words:
+        row = [_dice(p, w) for w in words]
+        best = max(row)
+        if best < min_score: return None  # usually the brand word: stop before scoring the rest
+        rows.append(row)
+        backward.append(best)
+    forward = [max(column) for column in zip(*rows)]
+    if min(forward) < min_score: return None
+    return (sum(forward) + sum(backward)) / (len(forward) + len(backward))
+
+
+class TrigramIndex:
+    """
+    Inverted index trigram -> product ids, with a prefix filter on top.
+
+    A product word p matching query word w (Dice >= m) shares at least
+    k = ceil(m * |w| / (2 - m)) of w's trigrams, so the product is on one of w's
+    n - k + 1 rarest posting lists. That is exact, unlike skipping long lists:
+    "Tomatoes" can't lose Tomato because "tom" is common. Candidates are on those
+    lists for every query word; the CANDIDATES best by overlap per name length get
+    the exact per-word score, so plain "Tomato" ranks above "Kissan Tomato
+    Ketchup" (which would fail it anyway).
+    """
+
+    CANDIDATES = 64
+
+    def __init__(self, products=()):
+        self.products = []
+        self._words = []
+        self._postings = defaultdict(list)
+        self._arrays = {}        # trigram -> posting list as an array, rebuilt after add()
+        self._sizes = []         # product -> distinct trigrams in its name
+        self._size_array = None
+        for product in products:
+            self.add(*product)
+
+    def add(self, name: str, unit: str, category: str = "General") -> int:
+        pid = len(self.products)
+        words = [_word_trigrams(w) for w in _words(name)]
+        grams = frozenset().union(*words)
+        self.products.append(Product(name, unit, category))
+        self._words.append(words)
+        self._sizes.append(len(grams))
+        for g in grams:
+            self._postings[g].append(pid)
+            self._arrays.pop(g, None)
+        self._size_array = None
+        return pid
+
+    def _posting(self, gram: str) -> np.ndarray:
+        array = self._arrays.get(gram)
+        if array is None: array = self._arrays[gram] = np.asarray(self._postings[gram], dtype=np.int64)
+        return array
+
+    def _prefix_lists(self, word: frozenset, min_score: float) -> list:
+        # The epsilon keeps float error from rounding an exact k up (which would drop real matches)
+        shared = math.ceil(min_score * len(word) / (2 - min_score) - 1e-9)
+        rarest = sorted(word, key=lambda g: len(self._postings.get(g, ())))[:len(word) - shared + 1]
+        return [self._posting(g) for g in rarest if g in self._postings]
+
+    def _candidates(self, words: list, min_score: float) -> np.ndarray:
+        filters = sorted((self._prefix_lists(w, min_score) for w in words), key=lambda lists: sum(map(len, lists)))
+        if not filters[0]: return np.zeros(0, dtype=np.int64)
+        pids, overlap = np.unique(np.concatenate(filters[0]), return_counts=True)
+        for lists in filters[1:]:
+            if len(pids) <= self.CANDIDATES: break
+            listed = np.zeros(len(self.products), dtype=bool)
+            for plist in lists: listed[plist] = True
+            keep = listed[pids]
+            pids, overlap = pids[keep], overlap[keep]
+        if len(pids) <= self.CANDIDATES: return pids
+        if self._size_array is None or len(self._size_array) != len(self._sizes):
+            self._size_array = np.asarray(self._sizes, dtype=np.int64)
+        rough = overlap / (len(filters[0]) + self._size_array[pids])
+        return pids[np.argpartition(-rough, self.CANDIDATES)[:self.CANDIDATES]]
+
+    def lookup(self, text: str, min_score: float = 0.55) -> Optional[Product]:
+        """
+        Match is symmetric and per word: every query word must match a word of the
+        product AND every product word a query word (trigram Dice >= min_score, which
+        tolerates plurals like "Tomatoes"). So "Milk Chocolate" is neither Milk nor
+        anything else, and "Milk" isn't "Buttermilk".
+        """
+        words = [_word_trigrams(w) for w in _words(text)]
+        if not words: return None
+
+        best_pid, best_score = None, 0.0
+        for pid in self._candidates(words, min_score).tolist():
+            score = _match(words, self._words[pid], min_score)
+            if score is not None and score > best_score:
+                best_pid, best_score = pid, score
+        return self.products[best_pid] if best_pid is not None else None
+
+
+CATALOG = TrigramIndex(SEED_PRODUCTS)
+
+
+def register_product(name: str, unit: str, category: str = "General") -> int:
+    """Adds a product to the live catalog and drops stale cached resolutions."""
+    pid = CATALOG.add(name, unit, category)
+    resolve.cache_clear()
+    return pid
+
+
+@lru_cache(maxsize=4096)
+def resolve(ocr_name: str) -> Optional[Product]:
+    """Maps an OCR'd bill line ('AMUL TAAZA MILK 500ML') to its canonical product."""
+    parsed = quantity.parse_quantity(ocr_name)
+    name = parsed.name if parsed and parsed.name else ocr_name
+    return CATALOG.lookup(name)
+
+
+def canonical_name(name: str) -> str:
+    product = resolve(name)
+    return product.name if product else name
+
+
+def _is_count(unit) -> bool:
+    """Missing, "pcs"-like or unknown ("packet") units count packs rather than measure an amount."""
+    normalized = quantity.normalize_unit(unit)
+    return normalized is None or quantity.UNITS[normalized][0] == "count"
+
+
+def canonicalize_item(item: dict) -> dict:
+    """
+    Rewrites a parsed bill item onto the catalog: canonical name, category and
+    stock unit, with the quantity converted when the units are compatible.
+    Unknown products pass through with their OCR'd name.
+    """
+    product = resolve(item["name"])
+    if not product: return item
+
+    qty = float(item.get("quantity") or 1)
+    unit = item.get("unit")
+    # Pack size printed in the name ("Milk 500ML") turns a count of packs into an amount.
+    # If the item already has a real unit ("500 ml"), its quantity is the amount itself.
+    parsed = quantity.parse_quantity(item["name"])
+    if parsed and parsed.unit and _is_count(unit):
+        qty, unit = qty * parsed.amount, parsed.unit
+
+    converted = quantity.convert(qty, quantity.normalize_unit(unit), quantity.normalize_unit(product.unit))
+    if converted is not None:
+        qty, unit = converted, product.unit
+
+    return {**item, "name": product.name, "quantity": round(qty, 4), "unit": unit, "category": product.category}
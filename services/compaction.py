@@ -0,0 +1,134 @@
+import os
+import time
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import models
+from database import SessionLocal
+from services import catalog, idempotency, profiles, quantity
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+RETENTION_DAYS = int(os.getenv("COMPACTION_RETENTION_DAYS", "14"))
+BATCH_SIZE = int(os.getenv("COMPACTION_BATCH_SIZE", "200"))
+INTERVAL_SECONDS = int(os.getenv("COMPACTION_INTERVAL_SECONDS", "3600"))
+# Pause between batches so request handlers can grab the SQLite write lock
+BATCH_PAUSE_SECONDS = 0.05
+
+
+def _merge_key(name: str) -> str:
+    """Exact identity only: the catalog product (a symmetric match) or else the name itself."""
+    product = catalog.resolve(name or "")
+    return product.name if product else (name or "").strip().lower()
+
+
+def merge_duplicates(db, user_ids) -> int:
+    """Folds rows of the same product into the oldest one. Returns rows removed."""
+    rows = db.query(models.InventoryDB).filter(
+        models.InventoryDB.user_id.in_(user_ids)
+    ).order_by(models.InventoryDB.id).all()
+
+    groups = defaultdict(list)
+    for row in rows:
+        groups[(row.user_id, _merge_key(row.name))].append(row)
+
+    removed = 0
+    for dupes in groups.values():
+        if len(dupes) < 2: continue
+        keep = dupes[0]
+        # Rows in a unit that doesn't convert to the kept row's are left alone, not summed
+        group = [r for r in dupes if quantity.convert_units(1.0, r.unit, keep.unit) is not None]
+        if len(group) < 2: continue
+        live = [r for r in group if not r.is_exhausted and (r.quantity or 0) > 0]
+        total = sum(quantity.convert_units(r.quantity, r.unit, keep.unit) for r in live)
+        expiries = [r.expiry_date for r in live if r.expiry_date]
+
+        keep.quantity = total
+        keep.is_exhausted = total <= 0
+        keep.expiry_date = min(expiries) if expiries else keep.expiry_date
+        for row in group[1:]:
+            db.delete(row)
+            removed += 1
+    return removed
+
+
+def archive_exhausted(db, cutoff: datetime) -> int:
+    """Moves one batch of long-exhausted rows into inventory_archive. Returns rows moved."""
+    rows = db.query(models.InventoryDB).filter(
+        (models.InventoryDB.is_exhausted == True) | (models.InventoryDB.quantity <= 0),
+        # Rows from before updated_at existed have NULL there: they are old by definition
+        (models.InventoryDB.updated_at < cutoff) | (models.InventoryDB.updated_at == None)
+    ).limit(BATCH_SIZE).all()
+
+    for row in rows:
+        db.add(models.InventoryArchiveDB(
+            original_id=row.id, user_id=row.user_id, name=row.name, quantity=row.quantity,
+            unit=row.unit, category=row.category, price_per_unit=row.price_per_unit,
+            expiry_date=row.expiry_date, updated_at=row.updated_at
+        ))
+        db.delete(row)
+    return len(rows)
+
+
+def run_compaction(retention_days: int = RETENTION_DAYS) -> dict:
+    """
+    One full pass: duplicate merge per batch of users, then archival in batches.
+    Every batch is its own short transaction.
+    """
+    started = time.perf_counter()
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    merged = archived = purged = invalidations = batches = 0
+
+    db = SessionLocal()
+    try:
+        last_user_id = 0
+        while True:
+            user_ids = [uid for (uid,) in db.query(models.UserDB.id).filter(
+                models.UserDB.id > last_user_id
+            ).order_by(models.UserDB.id).limit(BATCH_SIZE).all()]
+            if not user_ids: break
+            merged += merge_duplicates(db, user_ids)
+            db.commit()
+            batches += 1
+            last_user_id = user_ids[-1]
+            time.sleep(BATCH_PAUSE_SECONDS)
+
+        while True:
+            moved = archive_exhausted(db, cutoff)
+            db.commit()
+            batches += 1
+            archived += moved
+            if moved < BATCH_SIZE: break
+            time.sleep(BATCH_PAUSE_SECONDS)
+
+        purged = idempotency.purge_expired(db)
+        invalidations = profiles.purge_invalidations(db)
+        db.commit()
+        batches += 1
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Compaction Failed: {e}")
+    finally:
+        db.close()
+
+    report = {
+        "duplicates_merged": merged,
+        "rows_archived": archived,
+        "rows_reclaimed": merged + archived,
+        "idempotency_keys_purged": purged,
+        "profile_invalidations_purged": invalidations,
+        "batches": batches,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+    logger.info(f"Inventory compaction: {report}")
+    return report
+
+
+async def compaction_loop(interval: int = INTERVAL_SECONDS):
+    """Background task: runs a pass off the event loop every `interval` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(run_compaction)
@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select
+
+import models
+from database import SessionLocal
+from services import catalog
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+EXPIRING_DAYS = 2
+# Things nobody shops for before cooking: never counted as missing
+STAPLES = {"salt", "water", "oil", "pepper", "sugar", "ice"}
+# Each expiring pantry item a recipe uses is worth this much coverage
+EXPIRING_BONUS = 0.1
+# Ids are handed out before commit: on Postgres a recipe can commit after higher ids already
+# loaded. Every refresh re-checks this many ids below the watermark for ones it never saw.
+LATE_COMMIT_WINDOW = 1000
+
+
+def ingredient_key(name: str) -> str:
+    return catalog.canonical_name(name or "").strip().lower()
+
+
+# --- RECIPE x INGREDIENT MATRIX ---
+class CookNowIndex:
+    """
+    Stored recipes as a sparse 0/1 matrix (row = recipe, col = canonical ingredient)
+    in growable numpy arrays, without scipy:
+
+    - COO triplets appended in row order, so row r's ingredients are the slice
+      starting at row_start[r] (CSR for free);
+    - a column-sorted copy (CSC) of everything up to `_base_nnz`, so a pantry only
+      touches the postings of its own ~100 ingredients instead of every non-zero.
+
+    Scoring is the product of that matrix with the pantry vector: a bincount over
+    the pantry's postings, plus one masked pass over the short unsorted tail of
+    recently added rows. The tail is folded into the CSC copy once it grows past
+    TAIL_FRACTION of the base, so appends stay cheap and rank stays in milliseconds.
+
+    Rows are never rewritten (stored recipes are immutable), so a refresh only
+    reads recipes with an id above the last one loaded, plus any late commits
+    below it: recipes saved by any worker show up on the next request.
+
+    Loading runs in a worker thread while rank() runs on the event loop: the
+    slow part (canonicalizing names) happens outside `_lock`, which only covers
+    publishing new rows and each rank().
+    """
+    TAIL_FRACTION = 8
+    MIN_TAIL = 4096
+
+    def __init__(self):
+        self.vocab = {}                                  # ingredient key -> column
+        self.names = []                                  # column -> display name
+        self.recipe_ids = np.zeros(0, dtype=np.int64)    # row -> RecipeDB.id
+        self.titles = []
+        self.sizes = np.zeros(0, dtype=np.int32)         # non-staple ingredients per recipe
+        self.row_start = np.zeros(0, dtype=np.int64)
+        self._rows = np.zeros(1024, dtype=np.int32)
+        self._cols = np.zeros(1024, dtype=np.int32)
+        self.nnz = 0
+        self.watermark = 0
+        self.recent_ids = set()                          # ids seen within LATE_COMMIT_WINDOW of the watermark
+        self._lock = threading.Lock()
+        # CSC copy of the first _base_nnz non-zeros
+        self._base_nnz = 0
+        self._colptr = np.zeros(1, dtype=np.int64)
+        self._csc_rows = np.zeros(0, dtype=np.int32)
+
+    @property
+    def n_recipes(self) -> int:
+        return len(self.titles)
+
+    def _column(self, key: str, name: str) -> int:
+        col = self.vocab.get(key)
+        if col is None:
+            col = self.vocab[key] = len(self.names)
+            self.names.append(name)
+        return col
+
+    def add_many(self, recipes) -> int:
+        """recipes: iterable of (id, title, ingredients). Returns rows added. One writer at a time."""
+        parsed = []
+        for recipe_id, title, ingredients in recipes:
+            keys = {}
+            for ing in ingredients or []:
+                name = ing.get("name") if isinstance(ing, dict) else str(ing)
+                key = ingredient_key(name)
+                if key and key not in STAPLES: keys.setdefault(key, name)
+            parsed.append((recipe_id, title, keys))
+        with self._lock:
+            added = self._publish(parsed)
+            fold = self.nnz - self._base_nnz > max(self.MIN_TAIL, self._base_nnz // self.TAIL_FRACTION)
+        if fold: self._fold_tail()
+        return added
+
+    def _publish(self, parsed) -> int:
+        rows, cols, ids, titles, sizes = [], [], [], [], []
+        row = self.n_recipes
+        for recipe_id, title, keys in parsed:
+            self.watermark = max(self.watermark, recipe_id)
+            self.recent_ids.add(recipe_id)
+            if not keys: continue
+            for key, name in keys.items():
+                rows.append(row)
+                cols.append(self._column(key, name))
+            ids.append(recipe_id)
+            titles.append(title)
+            sizes.append(len(keys))
+            row += 1
+        if len(self.recent_ids) > 2 * LATE_COMMIT_WINDOW:
+            self.recent_ids = {i for i in self.recent_ids if i > self.watermark - LATE_COMMIT_WINDOW}
+        if not ids: return 0
+
+        # Amortized growth: doubling keeps appends O(1) per non-zero
+        needed = self.nnz + len(rows)
+        if needed > len(self._rows):
+            capacity = max(needed, 2 * len(self._rows))
+            self._rows = np.resize(self._rows, capacity)
+            self._cols = np.resize(self._cols, capacity)
+        self._rows[self.nnz:needed] = rows
+        self._cols[self.nnz:needed] = cols
+        sizes = np.asarray(sizes, dtype=np.int32)
+        self.row_start = np.concatenate([self.row_start, self.nnz + np.cumsum(sizes) - sizes])
+        self.nnz = needed
+        self.recipe_ids = np.concatenate([self.recipe_ids, np.asarray(ids, dtype=np.int64)])
+        self.sizes = np.concatenate([self.sizes, sizes])
+        self.titles.extend(titles)
+        return len(ids)
+
+    def _fold_tail(self) -> None:
+        # Sorted outside the lock: only the writer changes these, and rank keeps using the old copy meanwhile
+        nnz, n_cols = self.nnz, len(self.names)
+        cols = self._cols[:nnz]
+        order = np.argsort(cols, kind="stable")
+        csc_rows = self._rows[:nnz][order]
+        colptr = np.concatenate([[0], np.cumsum(np.bincount(cols, minlength=n_cols))])
+        with self._lock:
+            self._csc_rows, self._colptr, self._base_nnz = csc_rows, colptr, nnz
+
+    def _count(self, pantry_cols, mask) -> np.ndarray:
+        """Recipe-wise count of ingredients in pantry_cols: A @ pantry_vector."""
+        n = self.n_recipes
+        base_cols = [c for c in pantry_cols if c + 1 < len(self._colptr)]
+        postings = [self._csc_rows[self._colptr[c]:self._colptr[c + 1]] for c in base_cols]
+        counts = np.bincount(np.concatenate(postings), minlength=n) if postings else np.zeros(n, dtype=np.int64)
+        if self.nnz > self._base_nnz:
+            tail_rows = self._rows[self._base_nnz:self.nnz]
+            tail_cols = self._cols[self._base_nnz:self.nnz]
+            counts += np.bincount(tail_rows[mask[tail_cols]], minlength=n)
+        return counts
+
+    def rank(self, pantry, k: int = 10):
+        """pantry: iterable of (name, expiry_date). Top-k stored recipes, best first."""
+        with self._lock:
+            return self._rank(pantry, k)
+
+    def _rank(self, pantry, k: int):
+        if not self.n_recipes: return []
+        have = np.zeros(len(self.names), dtype=bool)
+        expiring = np.zeros(len(self.names), dtype=bool)
+        soon = datetime.utcnow() + timedelta(days=EXPIRING_DAYS)
+        for name, expiry in pantry:
+            col = self.vocab.get(ingredient_key(name))
+            if col is None: continue
+            have[col] = True
+            if expiry and expiry <= soon: expiring[col] = True
+
+        matched = self._count(np.flatnonzero(have), have)
+        uses_expiring = self._count(np.flatnonzero(expiring), expiring)
+        coverage = matched / self.sizes
+        missing = self.sizes - matched
+        score = coverage + EXPIRING_BONUS * uses_expiring
+
+        k = min(k, self.n_recipes)
+        top = np.argpartition(-score, k - 1)[:k]
+        # Best score first; fewer missing items breaks ties
+        top = top[np.lexsort((missing[top], -score[top]))]
+
+        results = []
+        for r in top:
+            cols = self._cols[self.row_start[r]:self.row_start[r] + self.sizes[r]]
+            results.append({
+                "recipe_id": int(self.recipe_ids[r]),
+                "title": self.titles[r],
+                "coverage": round(float(coverage[r]), 3),
+                "missing_count": int(missing[r]),
+                "missing": [self.names[c] for c in cols if not have[c]],
+                "expiring_used": int(uses_expiring[r]),
+                "ingredient_count": int(self.sizes[r]),
+            })
+        return results
+
+    def stats(self) -> dict:
+        return {"recipes": self.n_recipes, "ingredients": len(self.names), "nnz": self.nnz,
+                "unsorted_tail": self.nnz - self._base_nnz, "watermark": self.watermark}
+
+
+INDEX = CookNowIndex()
+# Two requests refreshing from the same watermark would append the same rows twice
+_refresh_lock = None
+
+
+async def refresh(index: CookNowIndex = INDEX) -> int:
+    """
+    Loads recipes saved since the last refresh. Returns recipes added. Runs in a
+    worker thread: a cold build (100k recipes: seconds) must not stall the loop.
+    """
+    global _refresh_lock
+    if _refresh_lock is None: _refresh_lock = asyncio.Lock()  # created on the serving loop (3.9 binds at construction)
+    async with _refresh_lock:
+        return await asyncio.to_thread(_load_new, index)
+
+
+async def warm():
+    """Startup task: build the index before the first cook-now request has to wait for it."""
+    try:
+        await refresh()
+    except Exception as e:
+        logger.error(f"Cook-now Warm-up Failed: {e}")
+
+
+def _load_new(index: CookNowIndex) -> int:
+    query = select(models.RecipeDB.id, models.RecipeDB.title, models.RecipeDB.ingredients_json)
+    added = 0
+    with SessionLocal() as db:
+        if index.watermark:
+            window = db.scalars(select(models.RecipeDB.id).where(
+                models.RecipeDB.id > index.watermark - LATE_COMMIT_WINDOW, models.RecipeDB.id <= index.watermark
+            )).all()
+            late = [i for i in window if i not in index.recent_ids]
+            if late: added += index.add_many(db.execute(query.where(models.RecipeDB.id.in_(late))).all())
+        # Modest batches: the driver fills a whole batch without letting the event loop's thread run
+        result = db.execute(
+            query.where(models.RecipeDB.id > index.watermark)
+            .order_by(models.RecipeDB.id)
+            .execution_options(yield_per=1000)
+        )
+        for batch in result.partitions():
+            added += index.add_many(batch)
+    if added: logger.info(f"Cook-now index: +{added} recipes ({index.n_recipes} total, {len(index.names)} ingredients)")
+    return added
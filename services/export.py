@@ -0,0 +1,125 @@
+import io
+import csv
+import json
+import zlib
+from datetime import date, datetime
+
+from sqlalchemy import select
+
+import models
+from database import SessionLocal
+
+# --- CONFIGURATION ---
+# Rows per page. Each page is its own short read transaction: a download that takes
+# minutes must not pin a snapshot (SQLite without WAL would lock every writer out)
+PAGE_SIZE = 1000
+# Lines are joined into chunks of about this size before they are sent (or compressed)
+CHUNK_BYTES = 64 * 1024
+
+# dataset -> (model, exported columns); user_id is implied by the URL
+DATASETS = {
+    "inventory": (models.InventoryDB, ("id", "name", "quantity", "unit", "category", "price_per_unit",
+                                       "expiry_date", "is_exhausted", "updated_at")),
+    "sessions": (models.CookingSessionDB, ("id", "recipe_title", "recipe_id", "macros_json", "start_time",
+                                           "end_time", "status", "rating", "leftovers")),
+    "badges": (models.UserBadgeDB, ("id", "badge_name", "description", "earned_at")),
+}
+# "type" of each record in the whole-user stream
+RECORD_TYPES = {"inventory": "inventory", "sessions": "session", "badges": "badge"}
+USER_COLUMNS = ("id", "username", "persona", "age", "weight", "height", "gender", "health_goal",
+                "rotis_per_meal", "portion_multiplier", "cooking_skill", "xp_points", "current_streak",
+                "weekly_budget", "allergies", "dietary_preferences", "medical_conditions")
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)): return value.isoformat()
+    return str(value)
+
+
+def _rows(dataset: str, user_id: int):
+    """
+    Plain tuples (no ORM objects), paged by keyset on id: each page is a fresh
+    session and transaction, closed before its rows are handed on.
+    """
+    model, columns = DATASETS[dataset]
+    query = select(*(getattr(model, c) for c in columns)).where(model.user_id == user_id).order_by(model.id).limit(PAGE_SIZE)
+    last_id = None
+    while True:
+        with SessionLocal() as db:
+            page = db.execute(query if last_id is None else query.where(model.id > last_id)).all()
+        yield from page
+        if len(page) < PAGE_SIZE: return
+        last_id = page[-1][0]  # "id" leads every column list
+
+
+# --- ENCODERS (one line of text per row) ---
+def _ndjson_lines(dataset: str, rows, record_type: str = None):
+    _, columns = DATASETS[dataset]
+    for row in rows:
+        record = dict(zip(columns, row))
+        if record_type: record = {"type": record_type, **record}
+        yield json.dumps(record, default=_json_default) + "\n"
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)): return json.dumps(value)
+    if isinstance(value, (datetime, date)): return value.isoformat()
+    return value
+
+
+def _csv_lines(dataset: str, rows):
+    _, columns = DATASETS[dataset]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue()
+
+    yield line(columns)
+    for row in rows:
+        yield line([_csv_value(v) for v in row])
+
+
+# --- FRAMING ---
+def _chunked(lines):
+    parts, size = [], 0
+    for text in lines:
+        parts.append(text)
+        size += len(text)
+        if size >= CHUNK_BYTES:
+            yield "".join(parts).encode()
+            parts, size = [], 0
+    if parts: yield "".join(parts).encode()
+
+
+def _gzipped(chunks):
+    # wbits=31: gzip container, so the download opens with gunzip / any archive tool
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out: yield out
+    yield compressor.flush()
+
+
+def stream(user_id: int, dataset: str, fmt: str = "ndjson", gzip: bool = False):
+    """
+    Generator of response bytes. Reads through its own short-lived sessions: the
+    request's session is closed before a StreamingResponse starts iterating.
+    """
+    def lines():
+        if dataset != "all":
+            rows = _rows(dataset, user_id)
+            yield from _csv_lines(dataset, rows) if fmt == "csv" else _ndjson_lines(dataset, rows)
+            return
+        # Whole user: one NDJSON stream of typed records
+        with SessionLocal() as db:
+            user = db.execute(select(*(getattr(models.UserDB, c) for c in USER_COLUMNS)).where(models.UserDB.id == user_id)).first()
+        if user: yield json.dumps({"type": "user", **dict(zip(USER_COLUMNS, user))}, default=_json_default) + "\n"
+        for name in DATASETS:
+            yield from _ndjson_lines(name, _rows(name, user_id), record_type=RECORD_TYPES[name])
+
+    chunks = _chunked(lines())
+    yield from _gzipped(chunks) if gzip else chunks
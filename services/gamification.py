@@ -0,0 +1,148 @@
+import os
+import time
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import update, case
+
+import models
+from database import SessionLocal
+from services import nutrition, profiles
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+XP_PER_SESSION = 10
+STREAK_BADGE_DAYS = 3
+FLUSH_INTERVAL_SECONDS = float(os.getenv("GAMIFICATION_FLUSH_SECONDS", "2"))
+BATCH_SIZE = int(os.getenv("GAMIFICATION_BATCH_SIZE", "500"))
+
+
+# --- WRITE SIDE (request path) ---
+def record_session_completed(db, user_id: int, when: datetime = None, macros: dict = None):
+    """The only gamification cost of /mentor/end: one event row in the caller's transaction."""
+    when = when or datetime.utcnow()
+    db.add(models.GamificationEventDB(
+        user_id=user_id, event_type="session_completed",
+        xp_delta=XP_PER_SESSION, cooked_on=when.date(), created_at=when, macros_json=macros
+    ))
+
+
+def project_progress(user: models.UserDB, when: datetime = None) -> dict:
+    """What the aggregator will make of one more session today, for the immediate response."""
+    today = (when or datetime.utcnow()).date()
+    last = user.last_cooked_on
+    if last == today:
+        streak = user.current_streak
+    elif last == today - timedelta(days=1):
+        streak = user.current_streak + 1
+    else:
+        streak = 1
+    badges = ["Streak Master"] if streak == STREAK_BADGE_DAYS and last != today else []
+    return {"xp": user.xp_points + XP_PER_SESSION, "streak": streak, "badges": badges}
+
+
+# --- AGGREGATOR (background) ---
+def _apply_streak_day(db, user_id: int, day) -> None:
+    """Atomic streak step for one calendar day; replays of an older day are no-ops."""
+    db.execute(
+        update(models.UserDB)
+        .where(models.UserDB.id == user_id)
+        .where((models.UserDB.last_cooked_on == None) | (models.UserDB.last_cooked_on < day))
+        .values(
+            current_streak=case(
+                (models.UserDB.last_cooked_on == day - timedelta(days=1), models.UserDB.current_streak + 1),
+                else_=1
+            ),
+            last_cooked_on=day
+        )
+    )
+
+
+def apply_pending_events(batch_size: int = BATCH_SIZE) -> int:
+    """Folds one batch of unapplied events into users with SQL-side increments. Returns events applied."""
+    db = SessionLocal()
+    try:
+        events = db.query(models.GamificationEventDB).filter(
+            models.GamificationEventDB.applied_at == None
+        ).order_by(models.GamificationEventDB.id).limit(batch_size).all()
+        if not events: return 0
+
+        # Claim the batch; another worker that got here first leaves us with a short count
+        ids = [e.id for e in events]
+        claimed = db.execute(
+            update(models.GamificationEventDB)
+            .where(models.GamificationEventDB.id.in_(ids))
+            .where(models.GamificationEventDB.applied_at == None)
+            .values(applied_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if claimed != len(ids):
+            db.rollback()
+            return 0
+
+        xp_by_user = defaultdict(int)
+        days_by_user = defaultdict(set)
+        for e in events:
+            xp_by_user[e.user_id] += e.xp_delta or 0
+            if e.event_type == "session_completed":
+                days_by_user[e.user_id].add(e.cooked_on)
+
+        for user_id, xp in xp_by_user.items():
+            db.execute(
+                update(models.UserDB)
+                .where(models.UserDB.id == user_id)
+                .values(xp_points=models.UserDB.xp_points + xp)
+            )
+
+        for user_id, days in days_by_user.items():
+            for day in sorted(days):
+                _apply_streak_day(db, user_id, day)
+            _award_streak_badge(db, user_id)
+
+        # Same batch feeds the daily/weekly nutrition rollups
+        nutrition.apply_rollup_deltas(db, nutrition.rollup_deltas(events))
+
+        # XP, streak and badges changed behind the profile cache's back
+        versions = profiles.bump(db, set(xp_by_user) | set(days_by_user))
+        db.commit()
+        for user_id, version in versions.items():
+            profiles.forget(user_id, version)
+        return len(events)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Gamification Aggregator Failed: {e}")
+        return 0
+    finally:
+        db.close()
+
+
+def _award_streak_badge(db, user_id: int) -> None:
+    streak = db.query(models.UserDB.current_streak).filter(models.UserDB.id == user_id).scalar()
+    if not streak or streak < STREAK_BADGE_DAYS: return
+    has_badge = db.query(models.UserBadgeDB.id).filter(
+        models.UserBadgeDB.user_id == user_id,
+        models.UserBadgeDB.badge_name == "Streak Master"
+    ).first()
+    if not has_badge:
+        db.add(models.UserBadgeDB(user_id=user_id, badge_name="Streak Master", description="Cooked 3 days in a row!"))
+
+
+def flush_all() -> int:
+    """Drains the event table. Returns events applied."""
+    total = 0
+    while True:
+        applied = apply_pending_events()
+        total += applied
+        if applied < BATCH_SIZE: return total
+
+
+async def aggregator_loop(interval: float = FLUSH_INTERVAL_SECONDS):
+    while True:
+        await asyncio.sleep(interval)
+        started = time.perf_counter()
+        applied = await asyncio.to_thread(flush_all)
+        if applied:
+            logger.info(f"Gamification: applied {applied} events in {(time.perf_counter() - started) * 1000:.1f} ms")
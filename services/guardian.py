@@ -0,0 +1,118 @@
+import io
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# --- LOCAL GUARDIAN (CPU pre-filter) ---
+# Cheap pixel statistics settle the obvious frames (clearly fine, clearly burning)
+# in a few milliseconds; everything else still goes to the vision model.
+
+FRAME_SIZE = 96           # Longest side after downsampling
+# Dark pans, cast iron and dim kitchens read as "char" from the first photo, so burning
+# is only ever a rise: against the session's first photo, or a jump since the last one.
+# With no baseline yet (first photo, no session) a charred-looking frame goes to the model.
+CHAR_RISING = 0.12        # At least this share of near-black pixels...
+CHAR_BURNING_RISE = 0.2   # ...that grew this much since the session's first photo
+CHAR_JUMP = 0.08          # ...or this much since the last photo
+CHAR_CLEAN = 0.03         # Below this there is no char worth mentioning
+BROWNING_TARGET_WORDS = ("brown", "golden", "crisp", "sear", "roast", "caramel", "char", "toast")
+
+# Per session: first and last frame stats, for char/brightness deltas
+_frames = OrderedDict()
+_MAX_SESSIONS = 2048
+
+
+def _load_frame(image):
+    import numpy as np
+    from PIL import Image
+
+    # Pillow reads file objects directly; only wrap raw bytes
+    img = Image.open(io.BytesIO(image) if isinstance(image, (bytes, bytearray)) else image)
+    # JPEG draft mode decodes at 1/2..1/8 scale directly: most of the speed comes from here
+    img.draft("RGB", (FRAME_SIZE * 2, FRAME_SIZE * 2))
+    img = img.convert("RGB")
+    img.thumbnail((FRAME_SIZE, FRAME_SIZE))
+    return np.asarray(img, dtype=np.float32) / 255.0
+
+
+def frame_stats(image) -> dict:
+    """Vectorized colour statistics over the downsampled frame (bytes or file object)."""
+    import numpy as np
+
+    rgb = _load_frame(image).reshape(-1, 3)
+    r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+    v = rgb.max(axis=1)
+    c = v - rgb.min(axis=1)
+    s = np.divide(c, v, out=np.zeros_like(c), where=v > 0)
+
+    # Hue in degrees, computed branch-free
+    safe_c = np.where(c > 0, c, 1.0)
+    hue = np.select(
+        [v == r, v == g],
+        [((g - b) / safe_c) % 6, (b - r) / safe_c + 2],
+        (r - g) / safe_c + 4
+    ) * 60.0
+    hue = np.where(c > 0, hue, 0.0)
+
+    char = (v < 0.18) | ((v < 0.3) & (s < 0.25))
+    browning = (hue >= 15) & (hue <= 45) & (s > 0.35) & (v >= 0.2) & (v <= 0.7)
+    hist, _ = np.histogram(hue[s > 0.15], bins=12, range=(0, 360))
+    total = max(1, hist.sum())
+
+    return {
+        "char_ratio": float(char.mean()),
+        "browning_ratio": float(browning.mean()),
+        "saturation": float(s.mean()),
+        "brightness": float(v.mean()),
+        "hue_histogram": [round(float(h) / total, 3) for h in hist],
+    }
+
+
+def _remember(session_id, stats: dict):
+    """Returns (baseline, previous) frame stats for the session, both None on its first photo."""
+    seen = _frames.pop(session_id, None)
+    _frames[session_id] = {"baseline": seen["baseline"] if seen else stats, "last": stats}
+    if len(_frames) > _MAX_SESSIONS:
+        _frames.popitem(last=False)
+    return (seen["baseline"], seen["last"]) if seen else (None, None)
+
+
+def analyze_frame(image, instruction: str, session_id=None):
+    """
+    Returns {"status", "message", "correction"} when the frame is obvious,
+    or None when it is ambiguous (or the image can't be decoded) and needs the model.
+    """
+    try:
+        stats = frame_stats(image)
+    except Exception as e:
+        logger.info(f"Local guardian skipped: {e}")
+        return None
+    finally:
+        if hasattr(image, "seek"): image.seek(0)
+
+    baseline, previous = _remember(session_id, stats) if session_id is not None else (None, None)
+    char = stats["char_ratio"]
+
+    # 1. Obviously burning: char that wasn't there before
+    if previous and char >= CHAR_RISING and (
+            char - baseline["char_ratio"] >= CHAR_BURNING_RISE
+            or char - previous["char_ratio"] >= CHAR_JUMP
+            or previous["brightness"] - stats["brightness"] >= 0.15):
+        return {
+            "status": "risk",
+            "message": "Large dark, charred patches - this is burning.",
+            "correction": "Lower heat immediately!",
+        }
+
+    # 2. Obviously fine: no char, normal exposure, colourful food in frame.
+    # Steps that aim for browning are left to the model: "not brown yet" is a judgement call.
+    wants_browning = any(w in instruction.lower() for w in BROWNING_TARGET_WORDS)
+    if (char < CHAR_CLEAN and not wants_browning and stats["saturation"] > 0.15
+            and 0.3 <= stats["brightness"] <= 0.85 and stats["browning_ratio"] < 0.35):
+        return {
+            "status": "on_track",
+            "message": "Looks good - no signs of burning. Keep following the step.",
+            "correction": "None",
+        }
+    return None
@@ -0,0 +1,308 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from starlette.datastructures import Headers
+
+import models
+from database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+HEADER = "idempotency-key"
+REPLAY_HEADER = b"idempotent-replayed"
+TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+# An unfinished claim older than this belongs to a worker that died: the next retry takes it over
+LEASE_SECONDS = int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "120"))
+# How often a duplicate checks on an original running in another worker
+POLL_SECONDS = 0.25
+MAX_KEY_LENGTH = 255
+# Larger responses (exports, streams) aren't kept: a retry just runs again
+MAX_STORED_BYTES = 1024 * 1024
+METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+# The body is read up front to fingerprint it, and replayed to the app from here
+SPOOL_MEMORY_BYTES = 1024 * 1024
+CHUNK_BYTES = 64 * 1024
+# Describe the original response, not the replay
+_SKIP_HEADERS = {"content-length", "date", "server", "x-profile-id"}
+
+CLAIMED, DONE, BUSY, UNTRACKED, MISMATCH = "claimed", "done", "busy", "untracked", "mismatch"
+MISMATCH_DETAIL = "Idempotency-Key was already used for a different request"
+
+# store key -> (Future of the stored response (None if the original failed and gave the key back),
+# the original's request fingerprint). Duplicates in the same worker wait on it instead of polling the table.
+_inflight = {}
+# Handlers still running after their request was answered with a 504 (see __call__)
+_detached = set()
+replayed = waited = late = mismatched = 0
+
+
+def _stored(row) -> dict:
+    return {"status": row.status_code, "headers": row.headers_json or [], "body": row.body or b""}
+
+
+# --- REQUEST FINGERPRINT ---
+def _boundary(scope) -> bytes:
+    """The multipart boundary: random per encoding, so a client's retry of the same upload has a new one."""
+    content_type = Headers(scope=scope).get("content-type", "")
+    if not content_type.lower().startswith("multipart/"): return b""
+    for param in content_type.split(";")[1:]:
+        name, _, value = param.strip().partition("=")
+        if name.lower() == "boundary": return value.strip('"').encode("latin-1")
+    return b""
+
+
+async def _read_body(scope, receive):
+    """
+    Reads the whole body once. Returns (fingerprint, receive that replays the body to
+    the app, spool to close). The fingerprint covers the query string and the body,
+    with any multipart boundary left out.
+    """
+    digest = hashlib.sha256(scope.get("query_string", b"") + b"\n")
+    boundary = _boundary(scope)
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    pending, disconnected = b"", False
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            disconnected = True
+            break
+        chunk = message.get("body", b"")
+        spool.write(chunk)
+        if boundary:
+            # Keep a tail that may be the start of a boundary split across chunks
+            pending = (pending + chunk).replace(boundary, b"")
+            cut = max(0, len(pending) - len(boundary) + 1)
+            digest.update(pending[:cut])
+            pending = pending[cut:]
+        else:
+            digest.update(chunk)
+        if not message.get("more_body", False): break
+    digest.update(pending)
+    size = spool.tell()
+    spool.seek(0)
+
+    started = False
+
+    async def replay():
+        nonlocal started
+        if disconnected: return {"type": "http.disconnect"}
+        if not started or spool.tell() < size:
+            started = True
+            chunk = spool.read(CHUNK_BYTES)
+            return {"type": "http.request", "body": chunk, "more_body": spool.tell() < size}
+        return await receive()  # body done: only http.disconnect is left to wait for
+
+    return digest.hexdigest(), replay, spool
+
+
+# --- STORE ---
+async def _claim(key: str, fingerprint: str):
+    """Inserts the claim row. Returns (CLAIMED | DONE | BUSY | MISMATCH | UNTRACKED, stored response or None)."""
+    now = datetime.utcnow()
+    try:
+        async with AsyncSessionLocal() as db:
+            db.add(models.IdempotencyKeyDB(key=key, request_hash=fingerprint, created_at=now))
+            try:
+                await db.commit()
+                return CLAIMED, None
+            except IntegrityError:
+                await db.rollback()
+
+            row = await db.get(models.IdempotencyKeyDB, key)
+            if row is None: return BUSY, None  # given back in between: the next try claims it
+            done = row.status_code is not None and row.expires_at and row.expires_at > now
+            running = row.status_code is None and row.created_at > now - timedelta(seconds=LEASE_SECONDS)
+            # Rows from before fingerprints were stored match anything
+            if (done or running) and row.request_hash and row.request_hash != fingerprint: return MISMATCH, None
+            if done: return DONE, _stored(row)
+            if running: return BUSY, None
+            # Expired response or abandoned claim: drop it (only if nobody beat us to it) and claim afresh
+            await db.execute(delete(models.IdempotencyKeyDB).where(
+                models.IdempotencyKeyDB.key == key, models.IdempotencyKeyDB.created_at == row.created_at
+            ))
+            await db.commit()
+        return await _claim(key, fingerprint)
+    except Exception as e:
+        # The store being down shouldn't take the endpoint down with it
+        logger.error(f"Idempotency Claim Failed: {e}")
+        return UNTRACKED, None
+
+
+async def _finish(key: str, stored) -> None:
+    """Saves the response against the key, or gives the key back so a retry runs again."""
+    try:
+        async with AsyncSessionLocal() as db:
+            if stored is None:
+                await db.execute(delete(models.IdempotencyKeyDB).where(models.IdempotencyKeyDB.key == key))
+            else:
+                await db.execute(update(models.IdempotencyKeyDB).where(models.IdempotencyKeyDB.key == key).values(
+                    status_code=stored["status"], headers_json=stored["headers"], body=stored["body"],
+                    expires_at=datetime.utcnow() + timedelta(seconds=TTL_SECONDS)
+                ))
+            await db.commit()
+    except Exception as e:
+        logger.error(f"Idempotency Save Failed: {e}")
+
+
+def purge_expired(db) -> int:
+    """Sync; called by the compaction pass. Returns rows deleted."""
+    now = datetime.utcnow()
+    result = db.execute(delete(models.IdempotencyKeyDB).where(
+        ((models.IdempotencyKeyDB.status_code != None) & (models.IdempotencyKeyDB.expires_at < now)) |
+        ((models.IdempotencyKeyDB.status_code == None) & (models.IdempotencyKeyDB.created_at < now - timedelta(seconds=LEASE_SECONDS)))
+    ))
+    return result.rowcount or 0
+
+
+# --- MIDDLEWARE ---
+async def _send_stored(send, stored: dict) -> None:
+    headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in stored["headers"]]
+    headers += [(b"content-length", str(len(stored["body"])).encode()), (REPLAY_HEADER, b"true")]
+    await send({"type": "http.response.start", "status": stored["status"], "headers": headers})
+    await send({"type": "http.response.body", "body": stored["body"]})
+
+
+async def _send_error(send, status: int, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await _send_stored(send, {"status": status, "headers": [("content-type", "application/json")], "body": body})
+
+
+class IdempotencyMiddleware:
+    """
+    Mutating requests that carry an Idempotency-Key run once per (method, path, key):
+
+    - a retry of a completed request gets the stored response back (with
+      `Idempotent-Replayed: true`) and nothing runs again;
+    - a duplicate arriving while the original is still running waits for it,
+      on a Future in the same worker or by polling the table across workers.
+
+    Only successful (< 400) responses are kept; an error gives the key back, so
+    the client's retry does the work for real.
+
+    The key is bound to the request it was first used with (query string and body,
+    fingerprinted): reusing it for a different request is a client bug, answered
+    with 422 rather than a replay of the other request's response.
+
+    The handler runs in its own task and is not cancelled at the deadline. A sync
+    route's thread can't be stopped anyway: it would commit and its response would be
+    lost, and a retry would then run the work a second time. So the client gets its 504,
+    the handler finishes, and its response is stored for the retry (which waits for
+    it if it arrives first). Upstream calls inside it still stop at the deadline.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in METHODS: return await self.app(scope, receive, send)
+        value = Headers(scope=scope).get(HEADER)
+        if value is None: return await self.app(scope, receive, send)
+        if not value or len(value) > MAX_KEY_LENGTH:
+            return await _send_error(send, 400, f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+
+        global replayed, waited, late, mismatched
+        key = f"{scope['method']} {scope['path']} {value}"
+        fingerprint, receive, spool = await _read_body(scope, receive)
+        handler = None
+        try:
+            duplicate = False
+            while True:
+                pending = _inflight.get(key)
+                if pending is not None:
+                    pending_future, pending_fingerprint = pending
+                    if pending_fingerprint != fingerprint:
+                        mismatched += 1
+                        return await _send_error(send, 422, MISMATCH_DETAIL)
+                    if not duplicate: waited += 1
+                    duplicate = True
+                    # shield: this duplicate timing out must not cancel the original's Future
+                    stored = await asyncio.shield(pending_future)
+                    if stored is None: continue  # original failed: try to claim the key ourselves
+                    replayed += 1
+                    return await _send_stored(send, stored)
+
+                future = asyncio.get_running_loop().create_future()
+                _inflight[key] = (future, fingerprint)
+                try:
+                    state, stored = await _claim(key, fingerprint)
+                except BaseException:
+                    _release(key, future, None)
+                    raise
+                if state in (CLAIMED, UNTRACKED): break
+                _release(key, future, stored)
+                if state == MISMATCH:
+                    mismatched += 1
+                    return await _send_error(send, 422, MISMATCH_DETAIL)
+                if state == DONE:
+                    replayed += 1
+                    return await _send_stored(send, stored)
+                # BUSY: the original is running in another worker
+                if not duplicate: waited += 1
+                duplicate = True
+                await asyncio.sleep(POLL_SECONDS)
+
+            status, headers, chunks, size = None, [], [], 0
+            answered = False  # the client already has its 504: keep the response for the retry only
+
+            async def send_wrapper(message):
+                nonlocal status, headers, size
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    headers = [(k.decode("latin-1"), v.decode("latin-1")) for k, v in message.get("headers", [])
+                               if k.decode("latin-1").lower() not in _SKIP_HEADERS]
+                elif message["type"] == "http.response.body":
+                    size += len(message.get("body", b""))
+                    if size <= MAX_STORED_BYTES: chunks.append(message.get("body", b""))
+                if not answered: await send(message)
+
+            async def run():
+                stored = None
+                try:
+                    await self.app(scope, receive, send_wrapper)
+                    if status is not None and status < 400 and size <= MAX_STORED_BYTES:
+                        stored = {"status": status, "headers": headers, "body": b"".join(chunks)}
+                finally:
+                    spool.close()
+                    # Local duplicates first: nothing below may leave them waiting
+                    _release(key, future, stored)
+                    if state == CLAIMED: await _finish(key, stored)
+
+            handler = asyncio.ensure_future(run())
+            try:
+                await asyncio.shield(handler)
+            except asyncio.CancelledError:
+                if handler.done(): raise
+                # Deadline: the outer middleware answers 504 while the handler runs on to store its response
+                late += 1
+                answered = True
+                _detached.add(handler)
+                handler.add_done_callback(_settle_detached)
+                raise
+        finally:
+            # Once the handler has started, it owns the body (it may outlive this request)
+            if handler is None: spool.close()
+
+
+def _settle_detached(handler) -> None:
+    _detached.discard(handler)
+    # Nobody awaits it any more: surface a failure here rather than as "exception never retrieved"
+    if not handler.cancelled() and handler.exception():
+        logger.error(f"Idempotent Request Failed After Deadline: {handler.exception()}")
+
+
+def _release(key: str, future, stored) -> None:
+    if _inflight.get(key, (None,))[0] is future: del _inflight[key]
+    if not future.done(): future.set_result(stored)
+
+
+def stats() -> dict:
+    return {"in_flight": len(_inflight), "replayed": replayed, "waited": waited, "mismatched": mismatched,
+            "finished_after_deadline": late, "running_after_deadline": len(_detached)}
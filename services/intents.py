@@ -0,0 +1,302 @@
+import re
+from typing import NamedTuple, Optional
+
+from services import quantity, timers
+
+# --- LOCAL INTENT ROUTER ---
+# Mentor chat messages are short and repetitive ("next", "how long?", "no butter").
+# A phrase trie scores every intent in one pass over the tokens; only messages
+# nothing claims go to the model.
+
+THRESHOLD = 1.0
+# Ties go to the first intent listed: safety before anything else
+PRIORITY = ("safety", "set_timer", "step_duration", "quantity", "substitute", "previous_step", "repeat_step", "next_step")
+
+# intent -> {phrase: weight}. Matching is longest-phrase-first, so a longer phrase
+# can cancel a shorter one it contains ("done with salt" is not "done").
+PHRASES = {
+    "next_step": {
+        # "Is this done?", "next time I'll use less salt": alone these only hint (see COMMANDS)
+        "next": 0.3, "done": 0.3, "finished": 0.3,
+        "continue": 1.0, "move on": 1.0, "what now": 1.0, "go ahead": 1.0,
+        "next step": 1.5, "what's next": 1.5, "go to the next step": 1.5, "that's done": 1.5,
+        "done with": 0.0, "done with this": 1.5, "done with that": 1.5, "done with the step": 1.5, "done with step": 1.5,
+        "not done": -1.0, "not finished": -1.0, "almost done": -1.0, "not yet": -1.0, "when is it done": 0.0,
+        "next time": 0.0, "next one": 0.0,
+    },
+    "previous_step": {
+        "previous": 1.0, "step back": 1.5, "last step": 1.5, "previous step": 1.5,
+        # "go back to the store later" isn't navigation: on their own these are only a hint (see COMMANDS)
+        "back": 0.3, "go back": 0.6, "take me back": 1.5,
+        "go back a step": 1.5, "go back one step": 1.5, "back a step": 1.5, "back one step": 1.5, "one step back": 1.5,
+        "go back to the previous step": 1.5, "go back to the last step": 1.5,
+        "put it back": 0.0, "back in": 0.0,
+    },
+    "repeat_step": {
+        "repeat": 1.0, "again": 0.6, "say that again": 1.5, "what was that": 1.5, "current step": 1.5,
+        "what do i do": 1.5, "what should i do": 1.5, "which step": 1.5,
+    },
+    "set_timer": {
+        "timer": 1.0, "set a timer": 1.5, "start a timer": 1.5, "remind me": 1.0, "alarm": 1.0,
+    },
+    "step_duration": {
+        "how long": 1.5, "how many minutes": 1.5, "how much time": 1.5, "when is it done": 1.5, "how long until": 1.5,
+    },
+    "quantity": {
+        "how much": 1.5, "how many": 1.0, "quantity": 1.0, "amount": 0.8, "how much time": 0.0, "how many minutes": 0.0,
+    },
+    "substitute": {
+        "substitute": 1.5, "instead of": 1.5, "instead": 1.0, "replace": 1.0, "swap": 1.0, "alternative": 1.0,
+        "don't have": 1.2, "dont have": 1.2, "do not have": 1.2, "out of": 1.0, "ran out": 1.5, "run out": 1.5,
+        "no": 0.3, "i have no": 1.2, "there's no": 1.2, "no more": 1.0,
+        "no idea": 0.0, "i have no idea": 0.0,
+    },
+    "safety": {
+        "burning": 2.0, "burnt": 2.0, "burned": 2.0, "burn": 1.5, "smoke": 1.5, "smoking": 1.5,
+        "fire": 2.0, "flames": 2.0, "on fire": 2.5, "cut myself": 2.5, "cut my": 2.0, "bleeding": 2.5,
+        "splashing": 1.5, "spattering": 1.5, "scalded": 2.0,
+    },
+}
+
+# Whole messages that are a command by themselves, though their words are too common to score high
+COMMANDS = {
+    "back": "previous_step", "go back": "previous_step",
+    "next": "next_step", "done": "next_step", "all done": "next_step",
+    "i'm done": "next_step", "im done": "next_step", "i am done": "next_step", "done next": "next_step",
+    "finished": "next_step", "i'm finished": "next_step", "i am finished": "next_step",
+}
+# Ignored when matching a message against COMMANDS ("ok go back please")
+FILLER = {"ok", "okay", "please", "wait", "now", "um", "uh", "yes", "yeah", "alright"}
+
+_TOKEN_RE = re.compile(r"[a-z]+(?:'[a-z]+)?|\d+(?:\.\d+)?")
+_END = object()
+
+
+def tokenize(text: str) -> list:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class IntentRouter:
+    def __init__(self, phrases: dict, commands: dict = None):
+        self.commands = {tuple(tokenize(command)): intent for command, intent in (commands or {}).items()}
+        self.root = {}
+        for intent, table in phrases.items():
+            for phrase, weight in table.items():
+                node = self.root
+                for token in tokenize(phrase):
+                    node = node.setdefault(token, {})
+                node.setdefault(_END, []).append((intent, weight))
+
+    def scores(self, tokens: list) -> dict:
+        """One left-to-right pass; at each position the longest phrase wins and its tokens are consumed."""
+        totals = {}
+        i = 0
+        while i < len(tokens):
+            node, hit, end = self.root, None, i
+            for j in range(i, len(tokens)):
+                node = node.get(tokens[j])
+                if node is None: break
+                if _END in node: hit, end = node[_END], j + 1
+            if hit:
+                for intent, weight in hit:
+                    totals[intent] = totals.get(intent, 0.0) + weight
+                i = end
+            else:
+                i += 1
+        return totals
+
+    def classify(self, tokens: list):
+        command = self.commands.get(tuple(t for t in tokens if t not in FILLER))
+        if command: return command, THRESHOLD
+        totals = self.scores(tokens)
+        best = max(PRIORITY, key=lambda name: (totals.get(name, 0.0), -PRIORITY.index(name)))
+        return (best, totals[best]) if totals.get(best, 0.0) >= THRESHOLD else (None, 0.0)
+
+
+ROUTER = IntentRouter(PHRASES, COMMANDS)
+
+# Words that never name an ingredient
+_VOCAB = {t for table in PHRASES.values() for phrase in table for t in tokenize(phrase)}
+_STOPWORDS = _VOCAB | {
+    "i", "i'm", "im", "a", "an", "the", "of", "for", "to", "is", "it", "it's", "my", "me", "do", "can", "use",
+    "should", "add", "put", "with", "some", "any", "we", "you", "this", "that", "there", "what", "in", "and",
+    "or", "please", "need", "have", "left", "more", "much", "many", "does", "did", "i've", "ive", "got", "about",
+}
+
+
+# --- SLOTS ---
+_WORD_NUMBERS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+                 "eight": 8, "nine": 9, "ten": 10, "fifteen": 15, "twenty": 20, "thirty": 30, "forty": 40}
+_DURATION_RE = re.compile(
+    r"(?P<half>half an? hour)|(?P<n>\d+(?:\.\d+)?|" + "|".join(_WORD_NUMBERS) + r")"
+    r"(?:\s*(?:-|to)\s*(?P<upper>\d+(?:\.\d+)?))?\s*(?P<unit>seconds?|secs?|minutes?|mins?|hours?|hrs?)\b",
+    re.I,
+)
+_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(text: str) -> Optional[int]:
+    """Seconds for the first duration in `text` ('5 minutes', '8-10 mins', 'half an hour'); ranges take the upper end."""
+    match = _DURATION_RE.search(text or "")
+    if not match: return None
+    if match.group("half"): return 1800
+    raw = match.group("upper") or match.group("n")
+    amount = _WORD_NUMBERS.get(raw.lower()) or float(raw)
+    return int(amount * _UNIT_SECONDS[match.group("unit")[0].lower()])
+
+
+def format_duration(seconds: int) -> str:
+    if seconds >= 3600:
+        h, m = divmod(seconds // 60, 60)
+        return f"{h} hour{'s' if h > 1 else ''}" + (f" {m} minutes" if m else "")
+    if seconds >= 60:
+        m, s = divmod(seconds, 60)
+        return f"{m} minute{'s' if m > 1 else ''}" + (f" {s} seconds" if s else "")
+    return f"{seconds} second{'s' if seconds != 1 else ''}"
+
+
+def _subject(tokens: list) -> Optional[str]:
+    """The ingredient the user is asking about: what's left once intent words and filler are gone."""
+    words = [t for t in tokens if t not in _STOPWORDS and not t[0].isdigit()]
+    return " ".join(words) if words else None
+
+
+def _singular(word: str) -> str:
+    if word.endswith("oes"): return word[:-2]
+    if word.endswith("s") and not word.endswith("ss"): return word[:-1]
+    return word
+
+
+# --- LOCAL ANSWERS ---
+SUBSTITUTES = {
+    "butter": "ghee or oil (about 3/4 the amount of oil)",
+    "ghee": "butter or any neutral oil",
+    "oil": "butter or ghee",
+    "cream": "milk with a spoon of butter, or thick curd added off the heat",
+    "milk": "water with a little cream, or any plant milk",
+    "curd": "buttermilk or sour cream", "yogurt": "buttermilk or sour cream",
+    "lemon": "vinegar (half the amount) or a pinch of amchur",
+    "vinegar": "lemon juice",
+    "egg": "1 tbsp ground flaxseed in 3 tbsp water, or half a mashed banana when baking",
+    "sugar": "honey or jaggery, slightly less of it",
+    "paneer": "tofu or cottage cheese",
+    "onion": "shallots or spring onion whites",
+    "garlic": "garlic powder, about 1/8 tsp per clove",
+    "tomato": "tomato puree or a spoon of ketchup",
+    "cornflour": "all-purpose flour, twice the amount", "cornstarch": "all-purpose flour, twice the amount",
+    "breadcrumb": "crushed crackers or rolled oats",
+    "chicken": "paneer or tofu (shorter cooking time)",
+}
+
+SAFETY = {
+    "fire": "Turn off the heat and cover the pan with a lid or a baking tray. Never pour water on an oil fire!",
+    "cut": "Stop and rinse the cut under cold water, then press a clean cloth on it. If it won't stop bleeding, get help.",
+    "skin": "Hold the burn under cool running water for 20 minutes. No ice, no butter.",
+    "food": "Turn off heat immediately and move to a cool burner!",
+}
+
+
+class Routed(NamedTuple):
+    intent: str
+    reply: Optional[str]  # None: recognised, but needs the model after all
+
+
+def _current_step(session) -> Optional[str]:
+    if not session or not session["steps"]: return None
+    return session["steps"][session["current_step_index"]]
+
+
+def _navigate(session, delta: int) -> str:
+    steps = session["steps"]
+    idx = session["current_step_index"] + delta
+    if idx >= len(steps): return "You have finished all steps! Enjoy your meal."
+    if idx < 0: return f"You're on the first step. {steps[0]}"
+    session["current_step_index"] = idx
+    return steps[idx]
+
+
+# "My pan is burning" is about the pan: cookware and food are checked before body parts
+_COOKWARE = {"pan", "pot", "kadai", "kadhai", "tawa", "cooker", "oil", "ghee", "food", "smoke", "smoking", "stove", "oven"}
+_BODY = {"myself", "hand", "hands", "finger", "fingers", "arm", "skin", "thumb", "wrist", "scalded"}
+
+
+def _safety(tokens: list) -> str:
+    words = set(tokens)
+    if words & {"fire", "flames"}: return SAFETY["fire"]
+    if words & {"cut", "bleeding"}: return SAFETY["cut"]
+    if words & _COOKWARE: return SAFETY["food"]
+    if words & _BODY: return SAFETY["skin"]
+    return SAFETY["food"]
+
+
+def step_seconds(session) -> Optional[int]:
+    """The current step's duration: the recipe's duration_seconds when known, else read from the text."""
+    if not session or not session["steps"]: return None
+    idx = session["current_step_index"]
+    durations = session.get("durations") or []
+    if idx < len(durations) and durations[idx]: return durations[idx]
+    return parse_duration(session["steps"][idx])
+
+
+def _set_timer(text: str, session) -> str:
+    seconds = parse_duration(text) or step_seconds(session)
+    if not seconds: return "How long should I set it for?"
+    if session is not None and "id" in session:
+        timers.scheduler.add_timer(session["id"], seconds, _current_step(session))
+    return f"Timer set for {format_duration(seconds)}."
+
+
+def _step_duration(session) -> Optional[str]:
+    seconds = step_seconds(session)
+    if seconds: return f"About {format_duration(seconds)} for this step."
+    return None
+
+
+def _quantity(tokens: list, session) -> Optional[str]:
+    step, subject = _current_step(session), _subject(tokens)
+    if not step or not subject: return None
+    wanted = [_singular(w) for w in subject.split()]
+    # "Add 1 tsp salt, 2 cups water and stir": the clause naming the ingredient carries its amount
+    for clause in re.split(r",|;|\band\b|\bthen\b", step):
+        lowered = clause.lower()
+        if not any(w in lowered for w in wanted): continue
+        start = re.search(r"[\d½⅓⅔¼¾⅛]", clause)
+        parsed = quantity.parse_quantity(clause[start.start():]) if start else None
+        if parsed:
+            amount = f"{parsed.amount:g}"
+            return f"{amount} {parsed.unit + ' ' if parsed.unit else ''}{parsed.name}".strip() + "."
+    return None
+
+
+def _substitute(tokens: list) -> Optional[str]:
+    subject = _subject(tokens)
+    if not subject: return None
+    for word in subject.split():
+        sub = SUBSTITUTES.get(_singular(word))
+        if sub: return f"No {word}? Use {sub}."
+    return None
+
+
+def route(message: str, session=None) -> Optional[Routed]:
+    """
+    Answers the message locally when an intent clears THRESHOLD.
+    Returns None for open-ended messages; Routed(intent, None) when the intent is
+    clear but the answer isn't in the session (the model gets it, with the intent).
+    Navigation moves session["current_step_index"].
+    """
+    tokens = tokenize(message)
+    intent, _ = ROUTER.classify(tokens)
+    if not intent: return None
+
+    if intent == "safety": return Routed(intent, _safety(tokens))
+    if intent == "substitute": return Routed(intent, _substitute(tokens))
+    if intent == "set_timer": return Routed(intent, _set_timer(message, session))
+
+    if not session or not session["steps"]:
+        return Routed(intent, "No recipe in progress. Start one and I'll walk you through it.")
+    if intent == "next_step": return Routed(intent, _navigate(session, 1))
+    if intent == "previous_step": return Routed(intent, _navigate(session, -1))
+    if intent == "repeat_step": return Routed(intent, _current_step(session))
+    if intent == "step_duration": return Routed(intent, _step_duration(session))
+    if intent == "quantity": return Routed(intent, _quantity(tokens, session))
+    return None
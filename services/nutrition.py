@@ -0,0 +1,43 @@
+from collections import defaultdict
+from datetime import date, timedelta
+
+import models
+from database import increment_upsert
+
+MACRO_KEYS = ("protein", "carbs", "fats")
+
+
+def scale_macros(macros: dict, multiplier: float) -> dict:
+    """Recipe macros for one standard portion -> what this user actually ate."""
+    if not macros: return None
+    scaled = {}
+    for key in MACRO_KEYS:
+        try:
+            scaled[key] = round(float(macros.get(key, 0) or 0) * (multiplier or 1.0), 1)
+        except (TypeError, ValueError):
+            scaled[key] = 0.0
+    return scaled
+
+
+def week_start(day: date) -> date:
+    """ISO week bucket: the Monday on or before `day`."""
+    return day - timedelta(days=day.weekday())
+
+
+def rollup_deltas(events) -> dict:
+    """(user_id, period, period_start) -> summed macros and session count for a batch of events."""
+    totals = defaultdict(lambda: {"protein": 0.0, "carbs": 0.0, "fats": 0.0, "sessions": 0})
+    for e in events:
+        if e.event_type != "session_completed" or not e.cooked_on: continue
+        for key in ((e.user_id, "day", e.cooked_on), (e.user_id, "week", week_start(e.cooked_on))):
+            bucket = totals[key]
+            bucket["sessions"] += 1
+            for m in MACRO_KEYS:
+                bucket[m] += (e.macros_json or {}).get(m, 0.0)
+    return totals
+
+
+def apply_rollup_deltas(db, totals: dict) -> None:
+    table = models.NutritionRollupDB.__table__
+    for (user_id, period, start), delta in totals.items():
+        db.execute(increment_upsert(table, {"user_id": user_id, "period": period, "period_start": start}, delta))
@@ -0,0 +1,264 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import select, func, delete
+
+import models
+from database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "2048"))
+# How often each worker reads other workers' writes off the invalidation table
+POLL_SECONDS = float(os.getenv("PROFILE_INVALIDATION_POLL_SECONDS", "1"))
+# Upper bound on staleness should an invalidation ever be missed
+MAX_AGE_SECONDS = float(os.getenv("PROFILE_CACHE_MAX_AGE_SECONDS", "300"))
+# Every worker has long seen invalidation rows this old; compaction deletes them
+RETENTION_SECONDS = 3600
+# Ids are handed out before commit, so a lower id can commit after a higher one was read.
+# Ids skipped over are re-polled this long (longer than any request transaction)...
+GAP_SECONDS = 120
+# ...up to this many per jump in the sequence
+MAX_GAP = 1000
+
+# UserResponse minus badges
+FIELDS = ("id", "username", "age", "weight", "height", "gender", "persona", "health_goal", "rotis_per_meal",
+          "cooking_skill", "medical_conditions", "allergies", "dietary_preferences", "spice_tolerance",
+          "fav_cuisine", "weekly_budget", "portion_multiplier", "xp_points", "current_streak")
+
+
+# --- IN-PROCESS LRU ---
+# Stamps are positions in this worker's own order of applying changes (`_applied`), not
+# invalidation ids: ids don't arrive in commit order. A read is stamped when it starts;
+# if a change to that user was applied after that, the read may be stale and isn't cached.
+# Each invalidation is applied once, and drops the entry unless it is one of the entry's
+# `own` versions (this worker's writes, already written through).
+_cache = OrderedDict()
+_ids_by_username = {}       # usernames never change, so this only follows evictions
+_changed = OrderedDict()    # user_id -> position of the last change applied to it here
+_floor = 0                  # newest position evicted from _changed
+_applied = 0                # changes applied here so far
+_seen = None                # highest invalidation id read; None until the listener has started
+_gaps = {}                  # invalidation ids skipped over, maybe not committed yet -> monotonic time noticed
+_lock = threading.Lock()    # sync routes and the aggregator touch it from threads
+hits = misses = invalidations = 0
+
+
+def _note_change(user_id: int) -> int:
+    global _applied, _floor
+    _applied += 1
+    _changed[user_id] = _applied
+    _changed.move_to_end(user_id)
+    while len(_changed) > 4 * CACHE_SIZE:
+        _, evicted = _changed.popitem(last=False)
+        _floor = max(_floor, evicted)
+    return _applied
+
+
+def _stamp() -> Optional[int]:
+    """Position a read starts at; None while there is no listener (other workers' writes would go unseen)."""
+    with _lock:
+        return _applied if _seen is not None else None
+
+
+def _store(profile: Dict, stamp: int, own=()) -> None:
+    user_id = profile["id"]
+    _cache[user_id] = {"profile": profile, "stamp": stamp, "own": set(own), "filled_at": time.monotonic()}
+    _cache.move_to_end(user_id)
+    _ids_by_username[profile["username"]] = user_id
+    while len(_cache) > CACHE_SIZE:
+        _, evicted = _cache.popitem(last=False)
+        _ids_by_username.pop(evicted["profile"]["username"], None)
+
+
+def _drop(user_id: int) -> None:
+    entry = _cache.pop(user_id, None)
+    if entry: _ids_by_username.pop(entry["profile"]["username"], None)
+
+
+def _lookup(user_id: int) -> Optional[Dict]:
+    global hits, misses
+    with _lock:
+        entry = _cache.get(user_id)
+        if entry and time.monotonic() - entry["filled_at"] > MAX_AGE_SECONDS:
+            _drop(user_id)
+            entry = None
+        if entry is None:
+            misses += 1
+            return None
+        hits += 1
+        _cache.move_to_end(user_id)
+        return entry["profile"]
+
+
+def _fill(profile: Dict, stamp: Optional[int]) -> None:
+    """Caches a profile read from the DB, unless a change was applied after the read started."""
+    if stamp is None: return
+    with _lock:
+        user_id = profile["id"]
+        if _changed.get(user_id, _floor) > stamp: return
+        entry = _cache.get(user_id)
+        if entry and entry["stamp"] > stamp: return
+        _store(profile, stamp)
+
+
+# --- READ SIDE ---
+def _profile_query(clause):
+    return select(*(getattr(models.UserDB, f) for f in FIELDS)).where(clause)
+
+
+def _badges_query(user_id: int):
+    return select(
+        models.UserBadgeDB.badge_name, models.UserBadgeDB.description, models.UserBadgeDB.earned_at
+    ).where(models.UserBadgeDB.user_id == user_id).order_by(models.UserBadgeDB.id)
+
+
+def _snapshot(row, badges) -> Dict:
+    return {**dict(zip(FIELDS, row)), "badges": [b._asdict() for b in badges]}
+
+
+async def get(db, user_id: int) -> Optional[Dict]:
+    """UserResponse-shaped dict, or None if there is no such user. Shared: treat it as read-only."""
+    profile = _lookup(user_id)
+    if profile: return profile
+    stamp = _stamp()
+    row = (await db.execute(_profile_query(models.UserDB.id == user_id))).first()
+    if not row: return None
+    profile = _snapshot(row, (await db.execute(_badges_query(user_id))).all())
+    _fill(profile, stamp)
+    return profile
+
+
+async def find(db, username: str) -> Optional[Dict]:
+    with _lock:
+        user_id = _ids_by_username.get(username)
+    if user_id is not None:
+        profile = _lookup(user_id)
+        if profile: return profile
+    stamp = _stamp()
+    row = (await db.execute(_profile_query(models.UserDB.username == username))).first()
+    if not row: return None
+    profile = _snapshot(row, (await db.execute(_badges_query(row.id))).all())
+    _fill(profile, stamp)
+    return profile
+
+
+def get_sync(db, user_id: int) -> Optional[Dict]:
+    """get() for the sync routes."""
+    profile = _lookup(user_id)
+    if profile: return profile
+    stamp = _stamp()
+    row = db.execute(_profile_query(models.UserDB.id == user_id)).first()
+    if not row: return None
+    profile = _snapshot(row, db.execute(_badges_query(user_id)).all())
+    _fill(profile, stamp)
+    return profile
+
+
+# --- WRITE SIDE ---
+def bump(db, user_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    Adds one invalidation row per user to the caller's transaction and returns
+    user_id -> new version. After the commit, hand the version to put()/update()
+    so this worker's copy is written through instead of dropped.
+    """
+    rows = {user_id: models.ProfileInvalidationDB(user_id=user_id) for user_id in set(user_ids)}
+    if not rows: return {}
+    db.add_all(rows.values())
+    db.flush()
+    return {user_id: row.id for user_id, row in rows.items()}
+
+
+def put(user: models.UserDB, version: int, badges=()) -> None:
+    """Write-through of a whole profile (a freshly created user)."""
+    profile = {**{f: getattr(user, f) for f in FIELDS}, "badges": list(badges)}
+    with _lock:
+        stamp = _note_change(user.id)
+        if _seen is not None: _store(profile, stamp, own=(version,))
+
+
+def update(user_id: int, version: int, **fields) -> None:
+    """Write-through of changed fields onto the cached copy, if there is one."""
+    with _lock:
+        _note_change(user_id)
+        entry = _cache.get(user_id)
+        if not entry: return
+        # Copy, not mutate: a request may still be reading the old dict
+        entry["profile"] = {**entry["profile"], **fields}
+        entry["own"].add(version)
+
+
+def forget(user_id: int, version: int) -> None:
+    """Another writer (worker or aggregator) changed the row at `version`."""
+    global invalidations
+    with _lock:
+        _note_change(user_id)
+        entry = _cache.get(user_id)
+        if entry and version not in entry["own"]:
+            _drop(user_id)
+            invalidations += 1
+
+
+# --- CROSS-WORKER CHANNEL ---
+async def listen(interval: float = POLL_SECONDS):
+    """Background task: applies invalidations written by any worker. Caching starts once it runs."""
+    global _seen
+    table = models.ProfileInvalidationDB
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                if _seen is None:
+                    high = (await db.scalar(select(func.max(table.id)))) or 0
+                    # Ids below the start that aren't there yet may still commit: watch them too
+                    present = set((await db.scalars(select(table.id).where(table.id > high - MAX_GAP))).all())
+                    _note_gaps(set(range(max(1, high - MAX_GAP + 1), high)) - present)
+                    _seen = high
+                    logger.info(f"Profile cache: listening from invalidation {_seen}")
+                clause = table.id > _seen
+                if _gaps: clause = clause | table.id.in_(list(_gaps))
+                rows = (await db.execute(select(table.id, table.user_id).where(clause).order_by(table.id))).all()
+            _apply(rows)
+        except Exception as e:
+            logger.error(f"Profile Invalidation Poll Failed: {e}")
+        await asyncio.sleep(interval)
+
+
+def _note_gaps(ids) -> None:
+    now = time.monotonic()
+    for gap in ids: _gaps.setdefault(gap, now)
+
+
+def _apply(rows) -> None:
+    """Applies each polled invalidation once; ids skipped over are polled again until GAP_SECONDS pass."""
+    global _seen
+    for version, user_id in rows:
+        if version > _seen:
+            _note_gaps(range(max(_seen + 1, version - MAX_GAP), version))
+            _seen = version
+        elif _gaps.pop(version, None) is None:
+            continue
+        forget(user_id, version)
+    cutoff = time.monotonic() - GAP_SECONDS
+    for gap in [g for g, noticed in _gaps.items() if noticed < cutoff]:
+        del _gaps[gap]
+
+
+def purge_invalidations(db) -> int:
+    """Sync; called by the compaction pass. Returns rows deleted."""
+    cutoff = datetime.utcnow() - timedelta(seconds=RETENTION_SECONDS)
+    result = db.execute(delete(models.ProfileInvalidationDB).where(models.ProfileInvalidationDB.created_at < cutoff))
+    return result.rowcount or 0
+
+
+def stats() -> Dict:
+    total = hits + misses
+    return {"size": len(_cache), "capacity": CACHE_SIZE, "hits": hits, "misses": misses,
+            "hit_rate": round(hits / total, 3) if total else None,
+            "invalidations": invalidations, "listening_from": _seen, "open_gaps": len(_gaps)}
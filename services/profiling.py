@@ -0,0 +1,212 @@
+import os
+import sys
+import hmac
+import time
+import random
+import hashlib
+import logging
+import threading
+import itertools
+from collections import Counter, deque
+from datetime import datetime
+
+from starlette.datastructures import Headers, MutableHeaders
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+# Both off by default; with neither set the middleware isn't even installed
+PROFILE_SECRET = os.getenv("PROFILE_SECRET", "")
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_MS", "1")) / 1000.0
+RING_SIZE = int(os.getenv("PROFILE_RING_SIZE", "20"))
+# Where .collapsed files go; empty keeps profiles in memory only
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+TOKEN_HEADER = "x-profile-token"
+
+# Stacks whose leaf is in here are threads waiting in Python code (event loop select, locks)
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py")
+
+# --- STATE ---
+recent = deque(maxlen=RING_SIZE)
+_ids = itertools.count(1)
+# One profile at a time: concurrent samplers would only profile each other
+_busy = threading.Lock()
+
+
+def enabled() -> bool:
+    return bool(PROFILE_SECRET) or SAMPLE_RATE > 0
+
+
+# --- TRIGGER ---
+def sign_token(ttl_seconds: int = 300, secret: str = None) -> str:
+    """X-Profile-Token value: '<expires unix>.<hmac-sha256 hex>'."""
+    expires = str(int(time.time()) + ttl_seconds)
+    sig = hmac.new((secret or PROFILE_SECRET).encode(), expires.encode(), hashlib.sha256).hexdigest()
+    return f"{expires}.{sig}"
+
+
+def valid_token(token: str) -> bool:
+    if not PROFILE_SECRET or not token: return False
+    expires, _, sig = token.partition(".")
+    if not expires.isdigit() or int(expires) < time.time(): return False
+    expected = hmac.new(PROFILE_SECRET.encode(), expires.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(sig, expected)
+
+
+# --- SAMPLER ---
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Sampler:
+    """
+    Wall-clock sampling of every thread while one request runs: the event loop
+    thread for async routes, the threadpool worker for sync ones. Stacks are
+    folded as they are taken, so memory grows with distinct stacks, not samples.
+    """
+
+    def __init__(self, interval: float = INTERVAL_SECONDS):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        # Pool workers park inside C calls (SimpleQueue.get), so their leaf frame looks busy.
+        # A thread still sitting exactly where it was when we started hasn't done any work for us.
+        parked = {ident: (id(f), f.f_lasti) for ident, f in sys._current_frames().items()}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me or parked.get(ident) == (id(frame), frame.f_lasti): continue
+                if os.path.basename(frame.f_code.co_filename) in _IDLE_FILES: continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+# --- OUTPUT ---
+def collapsed(profile: dict) -> str:
+    """Brendan Gregg's folded format: 'frame;frame;frame count' per line (flamegraph.pl, speedscope)."""
+    return "".join(f"{stack} {count}\n" for stack, count in profile["stacks"].most_common())
+
+
+def speedscope(profile: dict) -> dict:
+    """speedscope.app 'sampled' profile, weights in milliseconds."""
+    frames, index = [], {}
+    samples, weights = [], []
+    for stack, count in profile["stacks"].most_common():
+        ids = []
+        for name in stack.split(";"):
+            if name not in index:
+                index[name] = len(frames)
+                frames.append({"name": name})
+            ids.append(index[name])
+        samples.append(ids)
+        weights.append(round(count * profile["interval_ms"], 3))
+    name = f"{profile['method']} {profile['route']} #{profile['id']}"
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "cookmate",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled", "name": name, "unit": "milliseconds",
+            "startValue": 0, "endValue": round(sum(weights), 3),
+            "samples": samples, "weights": weights,
+        }],
+    }
+
+
+def summary(profile: dict) -> dict:
+    return {k: v for k, v in profile.items() if k != "stacks"}
+
+
+def _write(profile: dict) -> None:
+    if not PROFILE_DIR: return
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        slug = profile["route"].strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+        path = os.path.join(PROFILE_DIR, f"{profile['started'].strftime('%Y%m%dT%H%M%S')}-{profile['id']}-{profile['method']}-{slug}.collapsed")
+        with open(path, "w") as f:
+            f.write(collapsed(profile))
+        profile["file"] = path
+    except OSError as e:
+        logger.error(f"Profile Write Failed: {e}")
+
+
+# --- MIDDLEWARE ---
+class ProfilingMiddleware:
+    """
+    Profiles a request when it carries a valid X-Profile-Token or wins the
+    PROFILE_SAMPLE_RATE draw. Others pay one header lookup and a random().
+    The response gets X-Profile-Id; fetch it from /admin/profiles/{id}.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http": return await self.app(scope, receive, send)
+        token = Headers(scope=scope).get(TOKEN_HEADER)
+        trigger = "token" if token and valid_token(token) else (
+            "sample" if SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE else None)
+        if not trigger or not _busy.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+
+        profile_id = next(_ids)
+        sampler = Sampler()
+        started, t0 = datetime.utcnow(), time.perf_counter()
+
+        def finish():
+            if sampler.stopped: return
+            sampler.stop()
+            _busy.release()
+            # Starlette's router fills in the matched route: tag with the template, not the raw path
+            route = getattr(scope.get("route"), "path", None) or scope["path"]
+            profile = {
+                "id": profile_id, "method": scope["method"], "route": route, "trigger": trigger,
+                "started": started, "duration_ms": round((time.perf_counter() - t0) * 1000, 1),
+                "samples": sampler.samples, "interval_ms": INTERVAL_SECONDS * 1000, "stacks": sampler.stacks,
+            }
+            _write(profile)
+            recent.append(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("x-profile-id", str(profile_id))
+            await send(message)
+            # Stop with the last body chunk: background tasks that run afterwards aren't this request's time
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                finish()
+
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish()
+
+
+def get(profile_id: int):
+    return next((p for p in recent if p["id"] == profile_id), None)
@@ -0,0 +1,184 @@
+import os
+import re
+import math
+from datetime import datetime
+
+from services import catalog
+
+# --- CONFIGURATION ---
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "450"))
+# Of the tokens left after the template, the most the expiring list and diet list may take;
+# the pantry gets the rest. Allergies are never cut: they are always sent in full.
+EXPIRING_SHARE = 0.4
+PREFERENCE_SHARE = 0.15
+
+# --- LOCAL TOKENIZER ---
+# tiktoken when it's installed, otherwise a rough word-piece estimate (no extra dependency).
+try:
+    import tiktoken
+    _ENCODER = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _ENCODER = None
+
+_PIECE_RE = re.compile(r"[A-Za-z]{1,4}|\d{1,3}|[^\sA-Za-z\d]")
+
+
+def count_tokens(text: str) -> int:
+    if _ENCODER: return len(_ENCODER.encode(text))
+    return len(_PIECE_RE.findall(text))
+
+
+# --- PANTRY RANKING ---
+PERSONA_FOCUS = {
+    "gym_bro": {"categories": {"Protein", "Dairy", "Pulses"}, "keywords": {"chicken", "egg", "paneer", "whey", "tofu", "soya", "dal", "oats"}},
+    "hosteler": {"categories": {"Grains", "Bakery"}, "keywords": {"noodle", "bread", "egg", "rice", "maggi", "poha", "potato"}},
+    "indian_mom": {"categories": {"Pulses", "Vegetables", "Spices"}, "keywords": {"dal", "atta", "ghee", "rice", "sabzi", "paneer"}},
+    "master_chef": {"categories": {"Protein", "Vegetables", "Dairy"}, "keywords": {"butter", "cream", "garlic", "herb", "wine"}},
+}
+
+
+def _as_item(item) -> dict:
+    return item if isinstance(item, dict) else {"name": item}
+
+
+def score_item(item: dict, persona: str, expiring: set, now: datetime) -> float:
+    """Higher = more worth a place in the prompt."""
+    score = 0.0
+    name = item["name"]
+
+    # 1. Expiry urgency dominates: food about to go off should be cooked first
+    expiry = item.get("expiry_date")
+    if name.lower() in expiring:
+        score += 4.0
+    elif expiry:
+        days_left = (expiry - now).total_seconds() / 86400
+        if days_left <= 1: score += 4.0
+        elif days_left <= 3: score += 2.5
+        elif days_left <= 7: score += 1.0
+
+    # 2. Plenty in stock is a better base than the last spoonful
+    qty = item.get("quantity")
+    if qty: score += min(1.5, math.log1p(qty) / 2)
+
+    # 3. Persona relevance
+    focus = PERSONA_FOCUS.get(persona)
+    if focus:
+        category = item.get("category")
+        if not category or category == "General":
+            product = catalog.resolve(name)
+            category = product.category if product else None
+        if category in focus["categories"]: score += 1.0
+        lowered = name.lower()
+        if any(k in lowered for k in focus["keywords"]): score += 1.0
+    return score
+
+
+def rank_pantry(ingredients: list, persona: str, expiring_items: list = None, now: datetime = None) -> list:
+    now = now or datetime.utcnow()
+    expiring = {e.lower() for e in (expiring_items or [])}
+    items = [_as_item(i) for i in ingredients]
+    # Stable sort keeps pantry order among equal scores
+    return sorted(items, key=lambda i: -score_item(i, persona, expiring, now))
+
+
+# --- PROMPT ASSEMBLY ---
+RECIPE_TEMPLATE = """
+Generate a {meal_type} recipe.
+- Inventory: {inventory}
+{constraints}- Goal: {dietary_goal}
+- Scale: {portion_multiplier}x portion.
+- Macros: grams for ONE standard (1x) portion, not the scaled amount.
+- Effort: {effort_level}
+
+RETURN JSON EXACTLY LIKE THIS:
+{{
+    "title": "Dish Name",
+    "chef_comment": "Intro",
+    "ingredients": [{{"name": "Item", "qty": "Amount"}}],
+    "macros": {{"protein": 0, "carbs": 0, "fats": 0}},
+    "effort_level": "{effort_level}",
+    "steps": [
+        {{
+            "step_number": 1,
+            "instruction": "Do X",
+            "duration_seconds": 60,
+            "requires_visual_check": false
+        }}
+    ]
+}}
+"""
+
+
+def _more(shown: list, total: int) -> str:
+    return f" (+{total - len(shown)} more)" if total > len(shown) else ""
+
+
+def _constraint_lines(allergies: list, expiring_items: list, preferences: list, spend_headroom: float = None,
+                      expiring_total: int = 0, preferences_total: int = 0) -> str:
+    lines = []
+    if allergies: lines.append(f"- NEVER use (allergy): {', '.join(allergies)}")
+    if expiring_items: lines.append(f"- Use first (expiring): {', '.join(expiring_items)}{_more(expiring_items, expiring_total)}")
+    if preferences: lines.append(f"- Diet: {', '.join(preferences)}{_more(preferences, preferences_total)}")
+    if spend_headroom is not None:
+        if spend_headroom <= 0: lines.append("- Budget: weekly grocery budget spent, use inventory only")
+        else: lines.append(f"- Budget: {spend_headroom:.0f} left this week, keep extra purchases cheap")
+    return "".join(line + "\n" for line in lines)
+
+
+def _fit(names: list, budget: int) -> list:
+    """Leading names whose ", "-joined list costs at most `budget` tokens."""
+    used = []
+    for name in names:
+        # ", " costs one token on top of the name itself
+        cost = count_tokens(name) + (1 if used else 0)
+        if cost > budget: break
+        used.append(name)
+        budget -= cost
+    return used
+
+
+def build_recipe_prompt(ingredients: list, expiring_items: list, preferences: list, dietary_goal: str,
+                        allergies: list, meal_type: str, portion_multiplier: float, effort_level: str,
+                        persona: str, budget: int = PROMPT_TOKEN_BUDGET, spend_headroom: float = None):
+    """
+    Returns (prompt, stats). The expiring and diet lists are cut to their share of
+    `budget` (with a "+N more"), then pantry items are ranked and added best-first
+    until the whole prompt would exceed it. Only a long allergy list can push it over.
+    stats: {"tokens", "baseline_tokens", "saved_tokens", "items_used", "items_total", "expiring_used"}
+    """
+    expiring_items = list(expiring_items or [])
+    preferences = list(preferences or [])
+    fields = dict(
+        meal_type=meal_type, dietary_goal=dietary_goal, portion_multiplier=round(portion_multiplier or 1.0, 2),
+        effort_level=effort_level, constraints=_constraint_lines(allergies or [], [], [], spend_headroom),
+    )
+    spare = budget - count_tokens(RECIPE_TEMPLATE.format(inventory="", **fields))
+    # Header, newline and "(+N more)" come out of each list's share too
+    expiring_used = _fit(expiring_items, int(spare * EXPIRING_SHARE) - 12)
+    preferences_used = _fit(preferences, int(spare * PREFERENCE_SHARE) - 10)
+    fields["constraints"] = _constraint_lines(allergies or [], expiring_used, preferences_used, spend_headroom,
+                                              len(expiring_items), len(preferences))
+    # Ranked, de-duplicated, allergens dropped before they cost any tokens
+    blocked = [a.lower() for a in (allergies or []) if a]
+    names, seen = [], set()
+    for item in rank_pantry(ingredients, persona, expiring_items):
+        key = item["name"].lower()
+        if key in seen or any(a in key for a in blocked): continue
+        seen.add(key)
+        names.append(item["name"])
+
+    used = _fit(names, budget - count_tokens(RECIPE_TEMPLATE.format(inventory="", **fields)))
+
+    prompt = RECIPE_TEMPLATE.format(inventory=", ".join(used) or "Basic staples", **fields)
+    tokens = count_tokens(prompt)
+    baseline = count_tokens(RECIPE_TEMPLATE.format(
+        inventory=", ".join(_as_item(i)["name"] for i in ingredients), **{**fields, "constraints": ""}
+    ))
+    return prompt, {
+        "tokens": tokens,
+        "baseline_tokens": baseline,
+        "saved_tokens": baseline - tokens,
+        "items_used": len(used),
+        "items_total": len(ingredients),
+        "expiring_used": len(expiring_used),
+    }
@@ -0,0 +1,145 @@
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+# --- UNIT TABLE ---
+# Every unit maps to (dimension, factor to the base unit of that dimension).
+# Base units: grams for mass, millilitres for volume, pieces for counts.
+UNITS = {
+    # Mass
+    "mg": ("mass", 0.001),
+    "g": ("mass", 1.0), "gm": ("mass", 1.0), "gms": ("mass", 1.0), "gr": ("mass", 1.0),
+    "gram": ("mass", 1.0), "grams": ("mass", 1.0), "gramme": ("mass", 1.0), "grammes": ("mass", 1.0),
+    "kg": ("mass", 1000.0), "kgs": ("mass", 1000.0), "kilo": ("mass", 1000.0), "kilos": ("mass", 1000.0),
+    "kilogram": ("mass", 1000.0), "kilograms": ("mass", 1000.0),
+    "oz": ("mass", 28.35), "ounce": ("mass", 28.35), "ounces": ("mass", 28.35),
+    "lb": ("mass", 453.6), "lbs": ("mass", 453.6), "pound": ("mass", 453.6), "pounds": ("mass", 453.6),
+    # Volume
+    "ml": ("volume", 1.0), "mls": ("volume", 1.0),
+    "millilitre": ("volume", 1.0), "millilitres": ("volume", 1.0),
+    "milliliter": ("volume", 1.0), "milliliters": ("volume", 1.0),
+    "l": ("volume", 1000.0), "ltr": ("volume", 1000.0), "ltrs": ("volume", 1000.0), "lt": ("volume", 1000.0),
+    "litre": ("volume", 1000.0), "litres": ("volume", 1000.0),
+    "liter": ("volume", 1000.0), "liters": ("volume", 1000.0),
+    "cup": ("volume", 240.0), "cups": ("volume", 240.0),
+    "tbsp": ("volume", 15.0), "tbs": ("volume", 15.0), "tbl": ("volume", 15.0),
+    "tablespoon": ("volume", 15.0), "tablespoons": ("volume", 15.0),
+    "tsp": ("volume", 5.0), "teaspoon": ("volume", 5.0), "teaspoons": ("volume", 5.0),
+    "spoon": ("volume", 10.0), "spoons": ("volume", 10.0),
+    "pinch": ("volume", 0.3), "pinches": ("volume", 0.3),
+    # Counts
+    "pc": ("count", 1.0), "pcs": ("count", 1.0), "piece": ("count", 1.0), "pieces": ("count", 1.0),
+    "unit": ("count", 1.0), "units": ("count", 1.0), "no": ("count", 1.0), "nos": ("count", 1.0),
+    "dozen": ("count", 12.0),
+}
+
+VULGAR_FRACTIONS = {"½": 0.5, "⅓": 1 / 3, "⅔": 2 / 3, "¼": 0.25, "¾": 0.75, "⅛": 0.125}
+
+# --- PRECOMPILED PARSERS ---
+_FRAC = "".join(VULGAR_FRACTIONS)
+_AMOUNT = rf"(?:\d+\s+\d+/\d+|\d+/\d+|\d*\.?\d+\s*[{_FRAC}]?|[{_FRAC}])"
+# "200g Paneer", "1 tbsp oil", "½ cup of milk", "2 eggs"
+_LEADING_RE = re.compile(rf"^\s*(?P<amount>{_AMOUNT})\s*(?P<unit>[a-zµ]+)?\.?(?:\s+of)?\s*(?P<name>.*?)\s*$", re.I)
+# "Milk 500ML", "AMUL BUTTER 100 G"
+_TRAILING_RE = re.compile(rf"^\s*(?P<name>.*?)\s*(?P<amount>{_AMOUNT})\s*(?P<unit>[a-zµ]+)?\.?\s*$", re.I)
+
+
+class Quantity(NamedTuple):
+    amount: float
+    unit: Optional[str]  # Canonical key of UNITS, None for bare counts ("2 eggs")
+    name: str
+
+
+def _to_float(text: str) -> float:
+    text = text.strip()
+    total = 0.0
+    if text and text[-1] in VULGAR_FRACTIONS:
+        total += VULGAR_FRACTIONS[text[-1]]
+        text = text[:-1].strip()
+    for part in text.split():
+        if "/" in part:
+            num, den = part.split("/")
+            total += int(num) / int(den) if int(den) else 0.0
+        else:
+            total += float(part)
+    return total
+
+
+def normalize_unit(unit: Optional[str]) -> Optional[str]:
+    """Returns the UNITS key for a free-text unit ('Litre' -> 'litre'), or None."""
+    if not unit: return None
+    key = unit.strip().lower().rstrip(".")
+    return key if key in UNITS else None
+
+
+@lru_cache(maxsize=4096)
+def parse_quantity(text: str) -> Optional[Quantity]:
+    """
+    Parses '200g', '1 tbsp Oil', '½ cup milk' or 'Milk 500ML'.
+    Returns None when the string carries no amount at all.
+    """
+    for regex in (_LEADING_RE, _TRAILING_RE):
+        match = regex.match(text)
+        if not match: continue
+        try:
+            amount = _to_float(match.group("amount"))
+        except ValueError:
+            continue
+        unit_text = match.group("unit")
+        name = match.group("name")
+        unit = normalize_unit(unit_text)
+        if unit_text and not unit:
+            # Not a unit, just the first word of the name ("2 eggs")
+            name = f"{unit_text} {name}".strip() if regex is _LEADING_RE else f"{name} {unit_text}".strip()
+        return Quantity(amount, unit, name.strip())
+    return None
+
+
+def convert(amount: float, from_unit: Optional[str], to_unit: Optional[str]) -> Optional[float]:
+    """Converts between units of the same dimension. Bare counts convert to pieces only."""
+    src = UNITS.get(from_unit) if from_unit else ("count", 1.0)
+    dst = UNITS.get(to_unit) if to_unit else ("count", 1.0)
+    if not src or not dst or src[0] != dst[0]:
+        return None
+    return amount * src[1] / dst[1]
+
+
+def convert_units(amount: float, from_unit: Optional[str], to_unit: Optional[str]) -> Optional[float]:
+    """
+    convert() for free-text units as stored on pantry rows ('Litre', 'packet').
+    A missing unit is a bare count; a unit outside UNITS only matches itself.
+    None means the amounts can't be added up (kg vs pcs, "bunch" vs "packet").
+    """
+    src, dst = normalize_unit(from_unit), normalize_unit(to_unit)
+    if (from_unit and src is None) or (to_unit and dst is None):
+        same = (from_unit or "").strip().lower() == (to_unit or "").strip().lower()
+        return amount if same else None
+    return convert(amount, src, dst)
+
+
+# --- LOCAL DEDUCTION ENGINE ---
+def local_deductions(recipe_ingredients: list, current_inventory: list):
+    """
+    Matches recipe strings to pantry rows and works out how much to subtract,
+    expressed in each row's own unit.
+    Returns (deductions, unresolved) where unresolved is a list of
+    (ingredient, inventory_item) pairs the engine could not convert.
+    """
+    deductions, unresolved = [], []
+    for ing in recipe_ingredients:
+        clean_ing = ing.lower()
+        item = next((i for i in current_inventory if i["name"].lower() in clean_ing), None)
+        if not item: continue
+
+        parsed = parse_quantity(ing)
+        if not parsed:
+            unresolved.append((ing, item))
+            continue
+
+        # Unknown stock units ("packet") count as pieces, so "2 packets" still works
+        amount = convert(parsed.amount, parsed.unit, normalize_unit(item.get("unit")))
+        if amount is None:
+            unresolved.append((ing, item))
+            continue
+        deductions.append({"inventory_id": item["id"], "decrement_amount": round(amount, 4)})
+    return deductions, unresolved
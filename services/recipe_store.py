@@ -0,0 +1,118 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+import models
+
+# --- CONFIGURATION ---
+CACHE_SIZE = int(os.getenv("RECIPE_CACHE_SIZE", "512"))
+
+# What makes two recipes "the same"; ids and prose-only fields don't count
+_CONTENT_FIELDS = ("title", "ingredients", "steps", "macros", "effort_level")
+
+
+def content_hash(recipe: Dict) -> str:
+    """sha256 over the canonical JSON of the recipe's content (key order and whitespace don't matter)."""
+    content = {k: recipe.get(k) for k in _CONTENT_FIELDS}
+    blob = json.dumps(content, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def as_response(row: models.RecipeDB) -> Dict:
+    """RecipeDB row -> RecipeResponse-shaped dict."""
+    return {
+        "id": row.id,
+        "title": row.title,
+        "ingredients": row.ingredients_json or [],
+        "steps": row.steps_json or [],
+        "macros": row.macros_json or {},
+        "chef_comment": row.chef_comment or "",
+        "effort_level": row.effort_level or "",
+    }
+
+
+# --- IN-PROCESS LRU ---
+# Content-addressed rows never change, so entries never go stale: no invalidation.
+_cache = OrderedDict()      # id -> response dict
+_ids_by_hash = {}           # content hash -> id, for the entries in _cache
+_lock = threading.Lock()    # /mentor/end reads it from the threadpool
+hits = misses = 0
+
+
+def _remember(recipe: Dict, digest: str) -> None:
+    with _lock:
+        _cache[recipe["id"]] = recipe
+        _cache.move_to_end(recipe["id"])
+        if digest: _ids_by_hash[digest] = recipe["id"]
+        while len(_cache) > CACHE_SIZE:
+            _, evicted = _cache.popitem(last=False)
+            _ids_by_hash.pop(evicted.get("content_hash"), None)
+
+
+def cached(recipe_id: int) -> Optional[Dict]:
+    global hits, misses
+    with _lock:
+        recipe = _cache.get(recipe_id)
+        if recipe is None:
+            misses += 1
+            return None
+        hits += 1
+        _cache.move_to_end(recipe_id)
+        return recipe
+
+
+# --- STORE ---
+async def save(db, recipe: Dict) -> Dict:
+    """
+    Stores a generated recipe once per content hash and returns it with `id`.
+    The same recipe generated twice (warm slot, retries, other users) maps to one row.
+    """
+    if recipe.get("id"): return recipe
+    digest = content_hash(recipe)
+    with _lock:
+        known = _ids_by_hash.get(digest)
+    if known: return {**recipe, "id": known}
+
+    existing = (await db.scalars(select(models.RecipeDB).where(models.RecipeDB.content_hash == digest))).first()
+    if not existing:
+        row = models.RecipeDB(
+            content_hash=digest,
+            title=recipe.get("title"),
+            ingredients_json=recipe.get("ingredients"),
+            steps_json=recipe.get("steps"),
+            macros_json=recipe.get("macros"),
+            chef_comment=recipe.get("chef_comment"),
+            effort_level=recipe.get("effort_level")
+        )
+        db.add(row)
+        try:
+            await db.commit()
+            existing = row
+        except IntegrityError:
+            # Same recipe saved concurrently by another request: use its row
+            await db.rollback()
+            existing = (await db.scalars(select(models.RecipeDB).where(models.RecipeDB.content_hash == digest))).one()
+    _remember({**as_response(existing), "content_hash": digest}, digest)
+    return {**recipe, "id": existing.id}
+
+
+async def get(db, recipe_id: int) -> Optional[Dict]:
+    recipe = cached(recipe_id)
+    if recipe: return recipe
+    row = await db.get(models.RecipeDB, recipe_id)
+    if not row: return None
+    recipe = {**as_response(row), "content_hash": row.content_hash}
+    _remember(recipe, row.content_hash)
+    return recipe
+
+
+def stats() -> Dict:
+    total = hits + misses
+    return {"size": len(_cache), "capacity": CACHE_SIZE, "hits": hits, "misses": misses,
+            "hit_rate": round(hits / total, 3) if total else None}
@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from starlette.datastructures import Headers
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+# Just under the mobile client's 15 s axios timeout: answer (or fall back) before it gives up
+DEFAULT_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "14"))
+# Client timeouts include the network round trip; keep this much back for it
+NETWORK_MARGIN_SECONDS = float(os.getenv("DEADLINE_NETWORK_MARGIN_SECONDS", "1"))
+MAX_DEADLINE_SECONDS = float(os.getenv("MAX_REQUEST_DEADLINE_SECONDS", "60"))
+# A client asking for ~1 s would leave the model calls a few hundred ms: not worth starting
+MIN_DEADLINE_SECONDS = float(os.getenv("MIN_REQUEST_DEADLINE_SECONDS", "3"))
+DEADLINE_HEADER = "x-request-timeout-ms"
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+# A call that ran out of request deadline only counts against the breaker if it was given at
+# least this long: a short deadline says something about the client, not the upstream
+BREAKER_MIN_TIMEOUT_SECONDS = float(os.getenv("BREAKER_MIN_TIMEOUT_SECONDS", "5"))
+# Timeouts fire at (or just around) the deadline
+DEADLINE_SLACK_SECONDS = 0.1
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+# --- REQUEST DEADLINE ---
+# Absolute time.monotonic() the current request must finish by. A ContextVar, so it
+# follows the request into asyncio.to_thread workers and tasks it creates.
+_deadline: ContextVar = ContextVar("request_deadline", default=None)
+
+
+def deadline_from_header(value: str) -> float:
+    """Seconds from the client's X-Request-Timeout-Ms, clamped; the default when missing or garbage."""
+    try:
+        seconds = float(value) / 1000.0 - NETWORK_MARGIN_SECONDS
+    except (TypeError, ValueError):
+        return DEFAULT_DEADLINE_SECONDS
+    if seconds + NETWORK_MARGIN_SECONDS <= 0: return DEFAULT_DEADLINE_SECONDS
+    return min(max(seconds, MIN_DEADLINE_SECONDS), MAX_DEADLINE_SECONDS)
+
+
+@contextmanager
+def deadline_scope(seconds: float = None):
+    """Sets the deadline for the enclosed work; None lifts it (background jobs)."""
+    token = _deadline.set(time.monotonic() + seconds if seconds is not None else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining(default: float = None) -> float:
+    """Seconds left on the current deadline, or `default` outside any request."""
+    deadline = _deadline.get()
+    if deadline is None: return default
+    return deadline - time.monotonic()
+
+
+class DeadlineMiddleware:
+    """
+    Plain ASGI (BaseHTTPMiddleware can't cancel the route) so the endpoint is
+    cancelled at the deadline and the client gets a 504. The clock stops once the
+    response has started: background tasks that run after it are not cut short.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http": return await self.app(scope, receive, send)
+        seconds = deadline_from_header(Headers(scope=scope).get(DEADLINE_HEADER))
+        started = expired = False
+
+        def expire():
+            nonlocal expired
+            expired = True
+            task.cancel()
+
+        # call_later + cancel rather than asyncio.timeout(): README promises Python 3.9+
+        task = asyncio.current_task()
+        timer = asyncio.get_running_loop().call_later(seconds, expire)
+
+        async def send_wrapper(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+                timer.cancel()
+            await send(message)
+
+        with deadline_scope(seconds):
+            try:
+                await self.app(scope, receive, send_wrapper)
+            except asyncio.CancelledError:
+                if not expired or started: raise
+                # 3.11+ counts cancellations; this one is handled
+                if hasattr(task, "uncancel"): task.uncancel()
+                logger.error(f"Deadline exceeded ({seconds:.1f} s): {scope['method']} {scope['path']}")
+                body = json.dumps({"detail": "Deadline exceeded"}).encode()
+                await send({"type": "http.response.start", "status": 504,
+                            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+                await send({"type": "http.response.body", "body": body})
+            finally:
+                timer.cancel()
+
+
+# --- CIRCUIT BREAKER ---
+class CircuitBreaker:
+    """
+    closed -> open after `failures` consecutive errors; open fast-fails until
+    `reset_seconds` pass, then half-open lets exactly one probe through.
+    A successful probe closes the circuit, a failed one re-opens it.
+    """
+
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failures
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.short_circuited = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed": return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != "closed": logger.info(f"Circuit '{self.name}' closed")
+            self.state, self.failures, self._probing = "closed", 0, False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open": logger.error(f"Circuit '{self.name}' open after {self.failures} failures")
+                self.state, self.opened_at = "open", time.monotonic()
+
+    def release(self) -> None:
+        """The call ended without saying anything about the upstream (cancelled, out of time)."""
+        with self._lock:
+            self._probing = False
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "failures": self.failures, "short_circuited": self.short_circuited}
+
+
+# One breaker per upstream operation: a broken OCR deployment shouldn't trip recipes
+breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(operation: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if operation not in breakers:
+            breakers[operation] = CircuitBreaker(operation)
+        return breakers[operation]
+
+
+def _admit(operation: str, kwargs: dict) -> CircuitBreaker:
+    circuit = breaker(operation)
+    timeout = remaining()
+    # Out of time before we started: not the upstream's fault, so not a breaker failure
+    if timeout is not None and timeout <= 0: raise DeadlineExceeded(f"deadline passed before '{operation}'")
+    if not circuit.allow(): raise CircuitOpen(f"circuit '{operation}' open")
+    # No request deadline (background jobs): keep the client's own default timeout
+    if timeout is not None: kwargs["timeout"] = timeout
+    return circuit, timeout
+
+
+def _settle(circuit: CircuitBreaker, budget: float, error: BaseException) -> None:
+    """Counts a failed call against the breaker, unless the request (not the upstream) ran out."""
+    if isinstance(error, asyncio.CancelledError): return circuit.release()
+    left = remaining()
+    if budget is not None and budget < BREAKER_MIN_TIMEOUT_SECONDS and left is not None and left <= DEADLINE_SLACK_SECONDS:
+        return circuit.release()
+    circuit.record_failure()
+
+
+def call(operation: str, fn, *args, **kwargs):
+    """
+    fn(*args, timeout=<seconds left>, **kwargs) behind the operation's breaker.
+    Raises CircuitOpen / DeadlineExceeded without calling fn; callers keep their fallbacks.
+    """
+    circuit, budget = _admit(operation, kwargs)
+    try:
+        result = fn(*args, **kwargs)
+    except BaseException as e:
+        _settle(circuit, budget, e)
+        raise
+    circuit.record_success()
+    return result
+
+
+async def call_async(operation: str, fn, *args, **kwargs):
+    """call() for coroutine functions."""
+    circuit, budget = _admit(operation, kwargs)
+    try:
+        # BaseException: a cancelled half-open probe must still release the probe slot
+        result = await fn(*args, **kwargs)
+    except BaseException as e:
+        _settle(circuit, budget, e)
+        raise
+    circuit.record_success()
+    return result
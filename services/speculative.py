@@ -0,0 +1,160 @@
+import os
+import time
+import asyncio
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func
+
+import models
+from database import AsyncSessionLocal
+from services import ai_chef, budget, profiles, resilience
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+# Meal times are judged on the user's clock, not the server's UTC one
+UTC_OFFSET_HOURS = float(os.getenv("LOCAL_UTC_OFFSET_HOURS", "5.5"))
+SLOT_TTL_SECONDS = int(os.getenv("WARM_RECIPE_TTL_SECONDS", "10800"))
+DEFAULT_EFFORT = "medium"
+
+# --- STATE ---
+# One warm recipe per user, stamped with the pantry/profile version it was built from.
+# `versions` only sees this worker's writes; the slot's fingerprint is re-read from the
+# DB on take(), so a write handled by any other worker makes it stale too.
+warm_slots = {}
+versions = defaultdict(int)
+# (user_id, hour bucket) -> Counter of meal types actually requested
+meal_history = defaultdict(Counter)
+last_effort = {}
+_in_flight = set()
+# Speculation is background work: one model call at a time, never competing with itself
+_speculation_gate = None
+
+
+def _local_hour(now: datetime = None) -> int:
+    return ((now or datetime.utcnow()) + timedelta(hours=UTC_OFFSET_HOURS)).hour
+
+
+def _bucket(hour: int) -> str:
+    if 5 <= hour < 11: return "morning"
+    if 11 <= hour < 16: return "afternoon"
+    if 16 <= hour < 19: return "evening"
+    return "night"
+
+
+DEFAULT_MEAL = {"morning": "breakfast", "afternoon": "lunch", "evening": "snack", "night": "dinner"}
+
+
+def predict_meal_type(user_id: int, now: datetime = None) -> str:
+    """Most requested meal for this time of day, falling back to the clock."""
+    bucket = _bucket(_local_hour(now))
+    seen = meal_history.get((user_id, bucket))
+    if seen: return seen.most_common(1)[0][0]
+    return DEFAULT_MEAL[bucket]
+
+
+def note_request(user_id: int, meal_type: str, effort_level: str, now: datetime = None):
+    meal_history[(user_id, _bucket(_local_hour(now)))][meal_type.lower()] += 1
+    last_effort[user_id] = effort_level.lower()
+
+
+def invalidate(user_id: int):
+    """Pantry or profile changed: any warm recipe is stale."""
+    versions[user_id] += 1
+    warm_slots.pop(user_id, None)
+
+
+async def fingerprint(db, user_id: int) -> tuple:
+    """The recipe inputs as of now, whichever worker wrote them: pantry rows, their last change, the profile version."""
+    rows, changed = (await db.execute(
+        select(func.count(models.InventoryDB.id), func.max(models.InventoryDB.updated_at))
+        .where(models.InventoryDB.user_id == user_id)
+    )).one()
+    profile = await db.scalar(
+        select(func.max(models.ProfileInvalidationDB.id)).where(models.ProfileInvalidationDB.user_id == user_id)
+    )
+    return rows, changed, profile
+
+
+async def take(db, user_id: int, meal_type: str, effort_level: str):
+    """Returns and consumes the warm recipe when it matches the request and its inputs are unchanged, else None."""
+    slot = warm_slots.get(user_id)
+    if not slot: return None
+    if slot["version"] != versions[user_id] or time.monotonic() - slot["created"] > SLOT_TTL_SECONDS:
+        warm_slots.pop(user_id, None)
+        return None
+    if slot["meal_type"] != meal_type.lower() or slot["effort_level"] != effort_level.lower():
+        return None
+    # Consumed before the check: a concurrent take() can't serve it a second time
+    warm_slots.pop(user_id, None)
+    if await fingerprint(db, user_id) != slot["fingerprint"]: return None
+    return slot["recipe"]
+
+
+# --- SHARED INPUTS ---
+async def load_recipe_inputs(db, user_id: int):
+    """(profile, ask_chef_json kwargs minus meal_type/effort) from the profile cache and one pantry query."""
+    user = await profiles.get(db, user_id)
+    if not user: return None, None
+    rows = (await db.execute(
+        select(
+            models.InventoryDB.name, models.InventoryDB.quantity,
+            models.InventoryDB.category, models.InventoryDB.expiry_date
+        ).where(
+            models.InventoryDB.user_id == user_id,
+            models.InventoryDB.is_exhausted == False
+        ).order_by(models.InventoryDB.id)
+    )).all()
+    # Rich rows let the prompt builder rank by expiry, stock and persona
+    soon = datetime.utcnow() + timedelta(days=2)
+    today = datetime.utcnow().date()
+    spend = budget.summarize((await db.scalars(budget.summary_query(user_id, today))).all(), user["weekly_budget"], today)
+    return user, dict(
+        ingredients=[r._asdict() for r in rows],
+        expiring_items=[r.name for r in rows if r.expiry_date and r.expiry_date <= soon],
+        preferences=user["dietary_preferences"],
+        dietary_goal=user["health_goal"],
+        allergies=user["allergies"],
+        portion_multiplier=user["portion_multiplier"],
+        persona=user["persona"],
+        spend_headroom=spend["headroom"],
+    )
+
+
+# --- BACKGROUND PRE-GENERATION ---
+async def pregenerate(user_id: int):
+    """Low-priority task: warm the slot for the user's likely next meal."""
+    if user_id in _in_flight: return
+    meal_type = predict_meal_type(user_id)
+    effort = last_effort.get(user_id, DEFAULT_EFFORT)
+    slot = warm_slots.get(user_id)
+    if slot and slot["version"] == versions[user_id] and slot["meal_type"] == meal_type and slot["effort_level"] == effort:
+        return
+
+    global _speculation_gate
+    if _speculation_gate is None: _speculation_gate = asyncio.Semaphore(1)  # created on the serving loop (3.9 binds at construction)
+    _in_flight.add(user_id)
+    try:
+        async with _speculation_gate:
+            version = versions[user_id]
+            async with AsyncSessionLocal() as db:
+                # Read first: a write landing during the load makes the slot stale, never wrongly fresh
+                stamp = await fingerprint(db, user_id)
+                user, inputs = await load_recipe_inputs(db, user_id)
+            if not user: return
+            # Runs after the triggering response went out: not bound by that request's deadline
+            with resilience.deadline_scope(None):
+                recipe = await asyncio.to_thread(ai_chef.ask_chef_json, meal_type=meal_type, effort_level=effort, **inputs)
+            # Pantry changed while the model was thinking, or the model was down: don't keep it
+            if versions[user_id] != version: return
+            if recipe.get("title") == ai_chef.get_fallback_recipe()["title"]: return
+            warm_slots[user_id] = {
+                "meal_type": meal_type, "effort_level": effort, "version": version, "fingerprint": stamp,
+                "recipe": recipe, "created": time.monotonic(),
+            }
+    except Exception as e:
+        logger.error(f"Speculative Recipe Failed: {e}")
+    finally:
+        _in_flight.discard(user_id)
@@ -0,0 +1,175 @@
+import time
+import json
+import heapq
+import asyncio
+import logging
+import itertools
+from collections import defaultdict, deque
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+KEEPALIVE_SECONDS = 15
+# Fired events kept per session so a client coming back from the background can catch up
+REPLAY_EVENTS = 20
+
+
+# --- STEP TIMER SCHEDULER ---
+class TimerScheduler:
+    """
+    Every timer of every session lives in one min-heap of (due, seq, timer_id),
+    drained by a single asyncio task that sleeps until the earliest deadline.
+    Scheduling is a heappush, cancelling marks the entry dead (skipped when popped,
+    swept when dead entries outnumber live ones). No thread or task per timer.
+
+    Sync routes run in the threadpool: the public methods hop onto the loop with
+    call_soon_threadsafe, so heap and subscribers are only touched from one thread.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self._heap = []
+        self._seq = itertools.count()
+        self._ids = itertools.count(1)
+        self._timers = {}                      # timer_id -> timer dict
+        self._step_timer = {}                  # session_id -> timer_id of the current step's timer
+        self._session_timers = defaultdict(set)
+        self._dead = 0
+        self._wake = None
+        # SSE side
+        self._event_ids = itertools.count(1)
+        self._subscribers = defaultdict(set)   # session_id -> {asyncio.Queue}
+        self._recent = defaultdict(lambda: deque(maxlen=REPLAY_EVENTS))
+        self.fired = 0
+
+    # --- thread hop ---
+    def _call(self, fn, *args):
+        if self.loop is None or self.loop.is_closed():
+            return fn(*args)  # Not started yet (or tests): nothing else is touching the heap
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop: return fn(*args)
+        self.loop.call_soon_threadsafe(fn, *args)
+
+    # --- public API (any thread) ---
+    def start_step(self, session_id: int, step_index: int, seconds: Optional[int], instruction: str = None):
+        """The step just became current: replace the session's step timer with one for this step."""
+        self._call(self._start_step, session_id, step_index, seconds, instruction)
+
+    def add_timer(self, session_id: int, seconds: int, label: str = None):
+        """A user-requested timer ("set a timer for 5 minutes"); runs alongside the step timer."""
+        self._call(self._add, session_id, "timer_due", seconds, {"label": label})
+
+    def end_session(self, session_id: int):
+        self._call(self._end_session, session_id)
+
+    # --- loop-side internals ---
+    def _add(self, session_id: int, kind: str, seconds: int, payload: dict) -> int:
+        timer_id = next(self._ids)
+        due = time.monotonic() + seconds
+        self._timers[timer_id] = {"id": timer_id, "session_id": session_id, "kind": kind,
+                                  "due": due, "seconds": seconds, **payload}
+        self._session_timers[session_id].add(timer_id)
+        heapq.heappush(self._heap, (due, next(self._seq), timer_id))
+        # New earliest deadline: the drain loop is sleeping for too long, wake it
+        if self._wake is not None and self._heap[0][2] == timer_id:
+            self._wake.set()
+        return timer_id
+
+    def _cancel(self, timer_id: int) -> None:
+        timer = self._timers.pop(timer_id, None)
+        if not timer: return
+        self._session_timers[timer["session_id"]].discard(timer_id)
+        self._dead += 1
+        if self._dead > 64 and self._dead > len(self._heap) // 2:
+            self._heap = [entry for entry in self._heap if entry[2] in self._timers]
+            heapq.heapify(self._heap)
+            self._dead = 0
+
+    def _start_step(self, session_id, step_index, seconds, instruction):
+        previous = self._step_timer.pop(session_id, None)
+        if previous: self._cancel(previous)
+        if not seconds or seconds <= 0: return
+        self._step_timer[session_id] = self._add(
+            session_id, "step_due", seconds,
+            {"step_index": step_index, "step_number": step_index + 1, "instruction": instruction}
+        )
+
+    def _end_session(self, session_id):
+        for timer_id in list(self._session_timers.pop(session_id, ())):
+            self._cancel(timer_id)
+        self._step_timer.pop(session_id, None)
+        self._publish(session_id, {"event": "session_ended", "session_id": session_id})
+        self._recent.pop(session_id, None)
+
+    def _fire(self, timer: dict) -> None:
+        self._session_timers[timer["session_id"]].discard(timer["id"])
+        if self._step_timer.get(timer["session_id"]) == timer["id"]:
+            del self._step_timer[timer["session_id"]]
+        self.fired += 1
+        event = {"event": timer["kind"], "timer_id": timer["id"], "session_id": timer["session_id"], "seconds": timer["seconds"]}
+        for key in ("step_index", "step_number", "instruction", "label"):
+            if timer.get(key) is not None: event[key] = timer[key]
+        self._publish(timer["session_id"], event)
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        while True:
+            now = time.monotonic()
+            while self._heap and (self._heap[0][2] not in self._timers or self._heap[0][0] <= now):
+                _, _, timer_id = heapq.heappop(self._heap)
+                timer = self._timers.pop(timer_id, None)
+                if timer is None:
+                    self._dead = max(0, self._dead - 1)
+                    continue
+                self._fire(timer)
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    # --- EVENTS ---
+    def _publish(self, session_id: int, event: dict) -> None:
+        event["id"] = next(self._event_ids)
+        self._recent[session_id].append(event)
+        for queue in self._subscribers.get(session_id, ()):
+            queue.put_nowait(event)
+
+    async def events(self, session_id: int, last_event_id: int = 0):
+        """
+        Server-Sent Events for one session. Missed events (id > Last-Event-ID) are
+        replayed first, so a phone that was backgrounded still hears its timers.
+        """
+        queue = asyncio.Queue()
+        self._subscribers[session_id].add(queue)
+        try:
+            for event in list(self._recent.get(session_id, ())):
+                if event["id"] > last_event_id: yield _sse(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _sse(event)
+                if event["event"] == "session_ended": return
+        finally:
+            self._subscribers[session_id].discard(queue)
+            if not self._subscribers[session_id]: del self._subscribers[session_id]
+
+    def stats(self) -> dict:
+        return {"scheduled": len(self._timers), "heap": len(self._heap), "fired": self.fired,
+                "subscribers": sum(len(s) for s in self._subscribers.values())}
+
+
+def _sse(event: dict) -> str:
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+
+scheduler = TimerScheduler()
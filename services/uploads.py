@@ -0,0 +1,87 @@
+import os
+import base64
+import tempfile
+
+from fastapi import HTTPException, UploadFile
+
+# --- CONFIGURATION ---
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+# Multi-page receipts: each page is held to MAX_UPLOAD_BYTES, the pages together to this
+MAX_BATCH_UPLOAD_BYTES = int(os.getenv("MAX_BATCH_UPLOAD_BYTES", str(40 * 1024 * 1024)))
+MAX_BATCH_PAGES = int(os.getenv("MAX_BATCH_PAGES", "8"))
+# Uploads above this spill from RAM to a temp file
+SPOOL_MEMORY_BYTES = 1024 * 1024
+# Multiple of 3 so every chunk base64-encodes without padding
+CHUNK_BYTES = 3 * 64 * 1024
+
+
+def too_large(size: int, limit: int = MAX_UPLOAD_BYTES) -> bool:
+    return size is not None and size > limit
+
+
+async def spool_upload(file: UploadFile, limit: int = MAX_UPLOAD_BYTES):
+    """
+    Returns a rewound file object holding the upload, never the whole thing as bytes.
+    Starlette has usually spooled it already; otherwise we copy it chunk by chunk,
+    giving up with 413 as soon as it passes `limit`.
+    """
+    if file.size is not None:
+        if too_large(file.size, limit):
+            raise HTTPException(status_code=413, detail=f"Image too large (max {limit // (1024 * 1024)} MB)")
+        await file.seek(0)
+        return file.file
+
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    total = 0
+    while chunk := await file.read(CHUNK_BYTES):
+        total += len(chunk)
+        if too_large(total, limit):
+            spooled.close()
+            raise HTTPException(status_code=413, detail=f"Image too large (max {limit // (1024 * 1024)} MB)")
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+async def spool_batch(files, limit: int = MAX_UPLOAD_BYTES, total_limit: int = MAX_BATCH_UPLOAD_BYTES,
+                      max_pages: int = MAX_BATCH_PAGES):
+    """spool_upload() for every page of a batch, with 413 on too many pages, a page too large or too much in total."""
+    if len(files) > max_pages:
+        raise HTTPException(status_code=413, detail=f"Too many pages (max {max_pages})")
+    images, total = [], 0
+    for file in files:
+        image = await spool_upload(file, limit)
+        image.seek(0, os.SEEK_END)
+        total += image.tell()
+        image.seek(0)
+        if too_large(total, total_limit):
+            raise HTTPException(status_code=413, detail=f"Pages too large together (max {total_limit // (1024 * 1024)} MB)")
+        images.append(image)
+    return images
+
+
+def image_data_url(image, mime: str = "image/jpeg") -> str:
+    """
+    data: URL for bytes or a file object. File objects are base64-encoded chunk by
+    chunk into one preallocated buffer: no raw copy, no intermediate base64 copy,
+    no f-string copy.
+    """
+    prefix = f"data:{mime};base64,".encode()
+    if isinstance(image, (bytes, bytearray)):
+        return (prefix + base64.b64encode(image)).decode("ascii")
+
+    image.seek(0, os.SEEK_END)
+    size = image.tell()
+    image.seek(0)
+    out = bytearray(len(prefix) + 4 * ((size + 2) // 3))
+    out[:len(prefix)] = prefix
+    pos = len(prefix)
+    while chunk := image.read(CHUNK_BYTES):
+        # Short read mid-stream: top up to a multiple of 3 so no padding lands in the middle
+        while len(chunk) % 3 and (more := image.read(3 - len(chunk) % 3)):
+            chunk += more
+        encoded = base64.b64encode(chunk)
+        out[pos:pos + len(encoded)] = encoded
+        pos += len(encoded)
+    image.seek(0)
+    return out[:pos].decode("ascii") if pos != len(out) else out.decode("ascii")
@@ -1,4 +1,5 @@
 import os
+import asyncio
 import httpx
 import base64
 import json
@@ -6,6 +7,8 @@ import logging
 from dotenv import load_dotenv
 from pathlib import Path
 
+from services import resilience, uploads
+
 # Load .env safely
 env_path = Path(__file__).resolve().parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
@@ -39,7 +42,10 @@ async def analyze_image_stream(image_data: bytes):
     }
 
     async with httpx.AsyncClient() as client:
-        response = await client.post(api_url, headers=headers, content=image_data)
+        try:
+            response = await resilience.call_async("fridge_vision", client.post, api_url, headers=headers, content=image_data)
+        except (resilience.CircuitOpen, resilience.DeadlineExceeded):
+            return []
         
         if response.status_code != 200:
             logger.error(f"Azure Vision Error: {response.text}")
@@ -66,16 +72,19 @@ async def analyze_image_stream(image_data: bytes):
         return list(set(detected_items))
 
 # NEW: VISUAL COOKING MONITOR (The Guardian) 
-async def check_cooking_progress(image_data: bytes, current_step_instruction: str):
+async def check_cooking_progress(image_data, current_step_instruction: str):
     """
     Analyzes a photo of the cooking pot using GPT-4o.
     Detects if food is Undercooked, Perfect, or Burning based on the current step.
     """
     try:
-        base64_image = encode_image(image_data)
+        # Bytes or a spooled upload; encoded in chunks without extra copies
+        image_url = uploads.image_data_url(image_data)
         
         # Import client here to avoid circular imports at top of file
-        from services.ai_chef import client, DEPLOYMENT_NAME 
+        from services.ai_chef import client_main, chat_completion
+        if not client_main:
+            return {"status": "error", "message": "Vision system offline. Please check manually.", "correction": "None"}
 
         system_msg = "You are a Realtime Cooking Safety Assistant. Analyze the visual state of the food."
         
@@ -95,24 +104,27 @@ async def check_cooking_progress(image_data: bytes, current_step_instruction: st
         }}
         """
 
-        response = client.chat.completions.create(
-            model=DEPLOYMENT_NAME, 
+        # Sync client: run it off the event loop
+        response = await asyncio.to_thread(
+            chat_completion,
+            "guardian",
             messages=[
                 {"role": "system", "content": system_msg},
                 {
                     "role": "user", 
                     "content": [
                         {"type": "text", "text": user_msg},
-                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+                        {"type": "image_url", "image_url": {"url": image_url}}
                     ]
                 }
             ],
             max_tokens=300,
-            temperature=0.5
+            temperature=0.5,
+            response_format={"type": "json_object"}
         )
         
-        return response.choices[0].message.content
+        return json.loads(response.choices[0].message.content)
 
     except Exception as e:
         logger.error(f"Guardian Error: {e}")
-        return '{"status": "error", "message": "Vision system offline. Please check manually."}'
\ No newline at end of file
+        return {"status": "error", "message": "Vision system offline. Please check manually.", "correction": "None"}
\ No newline at end of file
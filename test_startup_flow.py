@@ -138,10 +138,23 @@ def test_full_system():
     print(f"   - Badges: {result.get('badges_earned')}")
 
     # Final Inventory Check
-    final_inv = requests.get(f"{BASE_URL}/inventory/{USER_ID}").json()
+    final_inv = requests.get(f"{BASE_URL}/inventory/{USER_ID}").json()["items"]
     chicken = next((i for i in final_inv if i['name'] == "Chicken Breast"), None)
     print(f"   - Chicken Left: {chicken['quantity']} {chicken['unit']} (Should be ~1.0 if started with 2.0)")
 
+    # ==========================================
+    # PHASE 6: DATA EXPORT (Streaming)
+    # ==========================================
+    print_step("PHASE 6", "Exporting User Data")
+
+    with requests.get(f"{BASE_URL}/users/{USER_ID}/export/all", stream=True) as resp:
+        records = [json.loads(line) for line in resp.iter_lines() if line]
+    types = sorted({r["type"] for r in records})
+    print(f"✅ Export: {len(records)} records ({', '.join(types)})")
+
+    resp = requests.get(f"{BASE_URL}/users/{USER_ID}/export/sessions?format=csv")
+    print(f"   - Sessions CSV: {len(resp.text.splitlines()) - 1} rows")
+
 if __name__ == "__main__":
     try:
         # Check if Pillow is installed for image creation
@@ -0,0 +1,10 @@
+"""Tests run against a scratch SQLite database, never ./cookmate_startup.db."""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path: sys.path.insert(0, ROOT)
+
+# Before anything imports database.py, which binds the engine at import time
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='cookmate-tests-'), 'test.db')}")
@@ -0,0 +1,76 @@
+import pytest
+
+from services import catalog
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Tomatoes", "Tomato"),
+    ("TOMATOES 1KG", "Tomato"),
+    ("Onions", "Onion"),
+    ("Green Chillies", "Green Chilli"),
+    ("AMUL TAAZA MILK 500ML", "Milk"),
+    ("eggs", "Eggs"),
+    ("tea", "Tea"),
+    ("Buttermilk", "Buttermilk"),
+    # Symmetric match: a longer name is a different product, not its first word
+    ("Milk Chocolate", None),
+    ("Peanut Butter", None),
+    ("Garlic Bread", None),
+    ("Rice Bran Oil", None),
+])
+def test_resolve(text, expected):
+    product = catalog.resolve(text)
+    assert (product.name if product else None) == expected
+
+
+FORMS = ["Ketchup", "Puree", "Sauce", "Soup", "Paste", "Powder", "Masala", "Curry", "Mix", "Dip"]
+
+
+@pytest.fixture(scope="module")
+def big_catalog():
+    """
+    Seed products plus 300 brand lines on most (names ending in "es" are rare):
+    every trigram of "tomato" has a longer posting list than the plural's "es ",
+    the shape that made pruning by list length drop Tomato for "Tomatoes".
+    """
+    index = catalog.TrigramIndex(catalog.SEED_PRODUCTS)
+    n = 0
+    for name, _, _ in catalog.SEED_PRODUCTS:
+        for i in range(30 if name.endswith("es") else 300):
+            form = "Pickles" if n % 100 == 0 else FORMS[n % len(FORMS)]
+            index.add(f"Brand{i} {name} {form}", "pcs", "Packaged")
+            n += 1
+    return index
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Tomatoes", "Tomato"), ("Potatoes", "Potato"), ("Onions", "Onion"), ("Lemons", "Lemon"),
+    ("Green Chillies", "Green Chilli"), ("Sunflower Oils", "Sunflower Oil"), ("Masoor Dals", "Masoor Dal"),
+    ("Milks", "Milk"), ("Breads", "Bread"), ("Eggs", "Eggs"), ("Chana Dal", "Chana Dal"),
+    ("Tomato Ketchup", None), ("Milk Chocolate", None),
+])
+def test_lookup_at_scale(big_catalog, text, expected):
+    product = big_catalog.lookup(text)
+    assert (product.name if product else None) == expected
+
+
+def test_registered_product_is_found():
+    index = catalog.TrigramIndex(catalog.SEED_PRODUCTS)
+    assert index.lookup("Jaggery Blocks") is None
+    index.add("Jaggery Block", "g", "Spices")
+    assert index.lookup("Jaggery Blocks").name == "Jaggery Block"
+
+
+@pytest.mark.parametrize("item, expected", [
+    # Pack size in the name multiplies a count of packs...
+    ({"name": "AMUL TAAZA MILK 500ML", "quantity": 2, "unit": "pcs"}, ("Milk", 1.0, "liter")),
+    # ...but not an amount that already has a real unit
+    ({"name": "AMUL TAAZA MILK 500ML", "quantity": 500, "unit": "ml"}, ("Milk", 0.5, "liter")),
+    ({"name": "Tomatoes", "quantity": 500, "unit": "g"}, ("Tomato", 0.5, "kg")),
+    # Units that don't convert are kept as scanned
+    ({"name": "Tomatoes", "quantity": 6, "unit": "pcs"}, ("Tomato", 6, "pcs")),
+    ({"name": "Dragon Fruit", "quantity": 2, "unit": "pcs"}, ("Dragon Fruit", 2, "pcs")),
+])
+def test_canonicalize_item(item, expected):
+    result = catalog.canonicalize_item(item)
+    assert (result["name"], result["quantity"], result["unit"]) == expected
@@ -0,0 +1,95 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+import models
+from database import SessionLocal, engine
+from services import gamification
+
+TODAY = datetime(2026, 3, 10, 19, 30)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def tables():
+    models.Base.metadata.create_all(bind=engine)
+
+
+def _user(current_streak: int = 0, last_cooked_on=None) -> int:
+    db = SessionLocal()
+    try:
+        user = models.UserDB(username=f"cook-{uuid.uuid4().hex[:8]}", xp_points=0,
+                             current_streak=current_streak, last_cooked_on=last_cooked_on)
+        db.add(user)
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def _record(user_id: int, *days_ago: int) -> None:
+    db = SessionLocal()
+    try:
+        for ago in days_ago:
+            gamification.record_session_completed(db, user_id, TODAY - timedelta(days=ago),
+                                                  {"protein": 10.0, "carbs": 20.0, "fats": 5.0})
+        db.commit()
+    finally:
+        db.close()
+
+
+def _state(user_id: int):
+    db = SessionLocal()
+    try:
+        user = db.get(models.UserDB, user_id)
+        badges = [b.badge_name for b in db.query(models.UserBadgeDB).filter(models.UserBadgeDB.user_id == user_id)]
+        pending = db.query(models.GamificationEventDB).filter(
+            models.GamificationEventDB.user_id == user_id, models.GamificationEventDB.applied_at == None
+        ).count()
+        return user.xp_points, user.current_streak, user.last_cooked_on, badges, pending
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("last_cooked_ago, streak, days_ago, want_streak, want_badges", [
+    (None, 0, [0], 1, []),
+    (None, 0, [2, 1, 0], 3, ["Streak Master"]),
+    (None, 0, [0, 0, 0], 1, []),             # same day three times: one streak day
+    (1, 2, [0], 3, ["Streak Master"]),       # continues yesterday's streak
+    (3, 5, [0], 1, []),                      # gap: starts over
+    (0, 2, [0], 2, []),                      # already counted today
+    (0, 2, [1], 2, []),                      # late event for an older day is a no-op
+])
+def test_aggregator_folds_events(last_cooked_ago, streak, days_ago, want_streak, want_badges):
+    last = (TODAY - timedelta(days=last_cooked_ago)).date() if last_cooked_ago is not None else None
+    user_id = _user(current_streak=streak, last_cooked_on=last)
+    _record(user_id, *days_ago)
+
+    assert gamification.flush_all() >= len(days_ago)
+    xp, got_streak, last_cooked_on, badges, pending = _state(user_id)
+    assert xp == gamification.XP_PER_SESSION * len(days_ago)
+    assert got_streak == want_streak
+    assert last_cooked_on == max([last] * (last is not None) + [(TODAY - timedelta(days=d)).date() for d in days_ago])
+    assert badges == want_badges
+    assert pending == 0
+
+
+def test_flush_applies_each_event_once():
+    user_id = _user()
+    _record(user_id, 0)
+    gamification.flush_all()
+    assert gamification.flush_all() == 0
+    assert _state(user_id)[0] == gamification.XP_PER_SESSION
+
+
+def test_projection_matches_aggregator():
+    user_id = _user(current_streak=2, last_cooked_on=(TODAY - timedelta(days=1)).date())
+    db = SessionLocal()
+    try:
+        projected = gamification.project_progress(db.get(models.UserDB, user_id), TODAY)
+    finally:
+        db.close()
+    _record(user_id, 0)
+    gamification.flush_all()
+    xp, streak, _, badges, _ = _state(user_id)
+    assert projected == {"xp": xp, "streak": streak, "badges": badges}
@@ -0,0 +1,91 @@
+import uuid
+
+import pytest
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
+from fastapi.testclient import TestClient
+
+import models
+from database import engine
+from services import idempotency
+
+calls = []
+app = FastAPI()
+app.add_middleware(idempotency.IdempotencyMiddleware)
+
+
+@app.post("/orders")
+async def create_order(request: Request):
+    calls.append(await request.json())
+    return {"order": len(calls), "user_id": request.query_params.get("user_id")}
+
+
+@app.post("/fail")
+async def fail():
+    calls.append("fail")
+    raise HTTPException(status_code=503, detail="upstream down")
+
+
+@app.post("/upload")
+async def upload(file: UploadFile = File(...)):
+    calls.append((file.filename, len(await file.read())))
+    return {"upload": len(calls)}
+
+
+@pytest.fixture(scope="module")
+def client():
+    models.Base.metadata.create_all(bind=engine)
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture
+def key():
+    calls.clear()
+    return {"Idempotency-Key": uuid.uuid4().hex}
+
+
+def test_retry_replays_without_running_again(client, key):
+    first = client.post("/orders?user_id=1", json={"item": "rice"}, headers=key)
+    retry = client.post("/orders?user_id=1", json={"item": "rice"}, headers=key)
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/orders?user_id=1", {"item": "dal"}),   # same key, different body
+    ("/orders?user_id=2", {"item": "rice"}),  # same key, different query string
+])
+def test_key_reused_for_a_different_request_is_rejected(client, key, path, body):
+    client.post("/orders?user_id=1", json={"item": "rice"}, headers=key)
+    response = client.post(path, json=body, headers=key)
+    assert response.status_code == 422
+    assert response.json()["detail"] == idempotency.MISMATCH_DETAIL
+    assert len(calls) == 1
+
+
+def test_multipart_retry_with_a_new_boundary_replays(client, key):
+    files = {"file": ("bill.jpg", b"\xff\xd8" + b"x" * 200_000, "image/jpeg")}
+    first = client.post("/upload", files=files, headers=key)
+    retry = client.post("/upload", files=files, headers=key)  # httpx picks a fresh boundary each time
+    assert retry.json() == first.json() == {"upload": 1}
+    assert retry.headers["idempotent-replayed"] == "true"
+    other = client.post("/upload", files={"file": ("bill.jpg", b"another bill", "image/jpeg")}, headers=key)
+    assert other.status_code == 422
+
+
+def test_error_gives_the_key_back(client, key):
+    assert client.post("/fail", headers=key).status_code == 503
+    assert client.post("/fail", headers=key).status_code == 503
+    assert calls == ["fail", "fail"]
+
+
+def test_requests_without_a_key_always_run(client, key):
+    client.post("/orders", json={"item": "rice"})
+    client.post("/orders", json={"item": "rice"})
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("value", ["", "k" * (idempotency.MAX_KEY_LENGTH + 1)])
+def test_bad_key_is_rejected(client, value):
+    assert client.post("/orders", json={}, headers={"Idempotency-Key": value}).status_code == 400
@@ -0,0 +1,59 @@
+import pytest
+
+from services import intents
+
+
+def classify(message: str):
+    return intents.ROUTER.classify(intents.tokenize(message))[0]
+
+
+@pytest.mark.parametrize("message, expected", [
+    # Navigation: whole commands and imperatives
+    ("next", "next_step"), ("Done!", "next_step"), ("I'm done", "next_step"), ("ok next", "next_step"),
+    ("next step please", "next_step"), ("what's next", "next_step"), ("done with this step", "next_step"),
+    ("finished", "next_step"), ("yes, done", "next_step"),
+    ("back", "previous_step"), ("ok go back please", "previous_step"), ("go back a step", "previous_step"),
+    ("previous step", "previous_step"), ("say that again", "repeat_step"),
+    # ...but the same words in questions and asides go to the model
+    ("Is this done?", None), ("how do I know it is done", None), ("next time I will use less salt", None),
+    ("no I mean the next one", None), ("I want to go back to the store later", None),
+    ("put it back in the pan", None), ("I'm done with salt", None), ("not done yet", None),
+    ("I have no idea what to do", None),
+    # Everything else
+    ("set a timer for 5 minutes", "set_timer"), ("how long does this take", "step_duration"),
+    ("how much salt", "quantity"), ("I don't have butter", "substitute"), ("I have no cream", "substitute"),
+    ("the pan is on fire", "safety"), ("why is my paneer rubbery?", None),
+])
+def test_classify(message, expected):
+    assert classify(message) == expected
+
+
+@pytest.mark.parametrize("message, advice", [
+    ("my pan is burning", "food"),
+    ("the oil is smoking", "food"),
+    ("my kadai is on fire", "fire"),
+    ("I burned my hand", "skin"),
+    ("burnt myself on the steam", "skin"),
+    ("I cut my finger", "cut"),
+    ("it's burning", "food"),
+])
+def test_safety_advice(message, advice):
+    assert intents.route(message) == intents.Routed("safety", intents.SAFETY[advice])
+
+
+def test_navigation_moves_the_session():
+    session = {"steps": ["Heat oil.", "Add 1 tsp salt and fry 5 minutes."], "current_step_index": 0}
+    assert intents.route("next", session).reply == "Add 1 tsp salt and fry 5 minutes."
+    assert intents.route("Is this done?", session) is None
+    assert session["current_step_index"] == 1
+    assert intents.route("how much salt", session).reply == "1 tsp salt."
+    assert intents.route("back", session).reply == "Heat oil."
+    assert intents.route("back", session).reply == "You're on the first step. Heat oil."
+
+
+@pytest.mark.parametrize("text, seconds", [
+    ("fry for 5 minutes", 300), ("simmer 8-10 mins", 600), ("rest half an hour", 1800),
+    ("bake for two hours", 7200), ("stir well", None),
+])
+def test_parse_duration(text, seconds):
+    assert intents.parse_duration(text) == seconds
@@ -0,0 +1,74 @@
+import pytest
+
+from services import quantity
+from services.quantity import Quantity
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("200g Paneer", Quantity(200.0, "g", "Paneer")),
+    ("1 tbsp Oil", Quantity(1.0, "tbsp", "Oil")),
+    ("½ cup milk", Quantity(0.5, "cup", "milk")),
+    ("1 1/2 cups rice", Quantity(1.5, "cups", "rice")),
+    ("1½ cups flour", Quantity(1.5, "cups", "flour")),
+    ("3/4 tsp salt", Quantity(0.75, "tsp", "salt")),
+    ("0.5 kg Chicken Breast", Quantity(0.5, "kg", "Chicken Breast")),
+    ("Milk 500ML", Quantity(500.0, "ml", "Milk")),
+    ("AMUL BUTTER 100 G", Quantity(100.0, "g", "AMUL BUTTER")),
+    # A word after the number that isn't a unit is part of the name
+    ("2 eggs", Quantity(2.0, None, "eggs")),
+    ("1 dozen eggs", Quantity(1.0, "dozen", "eggs")),
+    ("salt to taste", None),
+    ("Eggs", None),
+])
+def test_parse_quantity(text, expected):
+    assert quantity.parse_quantity(text) == expected
+
+
+@pytest.mark.parametrize("amount, src, dst, expected", [
+    (500, "g", "kg", 0.5),
+    (2, "tbsp", "ml", 30.0),
+    (1, "dozen", "pcs", 12.0),
+    (3, None, "pcs", 3.0),
+    (1, "kg", "liter", None),
+    (2, "g", "pcs", None),
+])
+def test_convert(amount, src, dst, expected):
+    assert quantity.convert(amount, src, dst) == expected
+
+
+@pytest.mark.parametrize("amount, src, dst, expected", [
+    (1, "Litre", "ml", 1000.0),
+    (2, "packet", "Packet", 2),   # unknown units only match themselves...
+    (2, "bunch", "packet", None),
+    (500, "g", "pcs", None),      # ...and never add up across dimensions
+    (2, None, "pcs", 2.0),
+])
+def test_convert_units(amount, src, dst, expected):
+    assert quantity.convert_units(amount, src, dst) == expected
+
+
+PANTRY = [
+    {"id": 1, "name": "Paneer", "quantity": 500, "unit": "g"},
+    {"id": 2, "name": "Olive Oil", "quantity": 1, "unit": "liter"},
+    {"id": 3, "name": "Eggs", "quantity": 12, "unit": "pcs"},
+    {"id": 4, "name": "Chicken Breast", "quantity": 2, "unit": "kg"},
+]
+
+
+def test_local_deductions():
+    # What the mobile app sends at the end of a session: "<qty> <name>"
+    lines = ["200g Paneer", "2 tbsp Olive Oil", "2 Eggs", "300 g Chicken Breast", "Paneer", "1 cup Rice"]
+    deductions, unresolved = quantity.local_deductions(lines, PANTRY)
+    assert deductions == [
+        {"inventory_id": 1, "decrement_amount": 200.0},
+        {"inventory_id": 2, "decrement_amount": 0.03},
+        {"inventory_id": 3, "decrement_amount": 2.0},
+        {"inventory_id": 4, "decrement_amount": 0.3},
+    ]
+    # No amount: left to the model. Not in the pantry: skipped.
+    assert unresolved == [("Paneer", PANTRY[0])]
+
+
+def test_unconvertible_unit_is_left_to_the_model():
+    deductions, unresolved = quantity.local_deductions(["1 cup Eggs"], PANTRY)
+    assert deductions == [] and unresolved == [("1 cup Eggs", PANTRY[2])]